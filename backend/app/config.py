@@ -1,6 +1,6 @@
 """Configuration management."""
 import os
-from typing import Literal
+from typing import List, Literal
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -8,6 +8,14 @@ class Settings(BaseSettings):
 
     # API Settings
     SECRET_AI_API_KEY: str = os.getenv("SECRET_AI_API_KEY", "")
+    SECRET_AI_BASE_URL: str = "https://secretai-rytn.scrtlabs.com:21434/v1"  # OpenAI-compatible endpoint
+    SECRET_AI_MODEL: str = "gemma3:4b"
+    # Optional pool of OpenAI-compatible endpoints, comma-separated "url" or "url|model";
+    # empty = SECRET_AI_BASE_URL only
+    SECRET_AI_ENDPOINTS: str = ""
+    LLM_ROUTING: str = "least_outstanding"     # least_outstanding or latency
+    LLM_ENDPOINT_EJECT_AFTER: int = 3          # Consecutive failures before an endpoint is skipped
+    LLM_ENDPOINT_EJECT_SECONDS: float = 30.0   # How long an ejected endpoint is skipped
 
     # Server Settings
     HOST: str = "0.0.0.0"
@@ -21,6 +29,37 @@ class Settings(BaseSettings):
 
     # Database
     DATABASE_URL: str = "sqlite+aiosqlite:///./chat_history.db"
+    HISTORY_MAX_MESSAGES: int = 50       # Messages loaded per session for a chat turn
+    HISTORY_BATCH_SIZE: int = 50         # Pending rows that trigger an immediate write
+    HISTORY_FLUSH_INTERVAL: float = 0.5  # Seconds between background writes
+
+    # Prompt context
+    CONTEXT_TOKEN_BUDGET: int = 4096   # Estimated tokens for prompt + reply per completion
+
+    # Response cache for repeated, wallet-free turns (opt-in)
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_TTL: float = 3600.0
+    RESPONSE_CACHE_MAX_ENTRIES: int = 512
+    RESPONSE_CACHE_DETERMINISTIC: bool = True  # Use temperature 0 for cacheable turns
+
+    # LLM admission control
+    LLM_MAX_CONCURRENCY: int = 8       # Completions in flight to SecretAI at once
+    LLM_MAX_QUEUE: int = 32            # Requests allowed to wait for a slot
+    LLM_QUEUE_TIMEOUT: float = 10.0    # Max seconds a request waits in the queue
+    LLM_RETRY_AFTER: int = 5           # Retry-After seconds sent when rejecting
+    CLIENT_DISCONNECT_POLL_INTERVAL: float = 0.5  # Seconds between client disconnect checks during /api/chat
+
+    # Hedged non-streaming completions (opt-in): a completion still running after the
+    # LLM_HEDGE_PERCENTILE latency gets a backup request; first response wins
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_PERCENTILE: float = 95.0
+    LLM_HEDGE_MIN_DELAY: float = 0.5     # Never hedge sooner than this (seconds)
+    LLM_HEDGE_MAX_RATE: float = 0.1      # Max hedges per completion (budget)
+    LLM_HEDGE_MIN_SAMPLES: int = 20      # Latencies needed before hedging starts
+
+    # Background initialization at startup (retried until it succeeds)
+    STARTUP_RETRY_MIN_BACKOFF: float = 1.0
+    STARTUP_RETRY_MAX_BACKOFF: float = 30.0
 
     # Secret Network
     ENABLE_SECRET_NETWORK: bool = os.getenv("ENABLE_SECRET_NETWORK", "false").lower() == "true"
@@ -38,12 +77,73 @@ class Settings(BaseSettings):
         "https://lcd.secret.adrius.starshell.net/"
     )
 
+    # SNIP-20 token symbols that we support (comma-separated)
+    SNIP20_TOKENS: str = "shd,silk,sscrt,stkd-scrt,sinj,swbtc,susdt,snobleusdc"
+    # MCP tool for server-side SNIP-20 balance queries; only used when the MCP server's
+    # tool catalog has it, otherwise the browser queries SNIP-20 balances itself
+    SNIP20_BALANCE_TOOL: str = "secret_query_contract"
+
+    # /api/wallet/balance cache (per address and viewing-key set)
+    WALLET_BALANCE_CACHE_TTL: float = 10.0
+    WALLET_BALANCE_CACHE_MAX_ENTRIES: int = 1024
+
     # MCP Server
     SECRET_MCP_URL: str = os.getenv(
         "SECRET_MCP_URL",
         "http://secret-mcp:8002"
     )
 
+    # MCP HTTP connection pool
+    MCP_MAX_CONNECTIONS: int = 50
+    MCP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    MCP_KEEPALIVE_EXPIRY: float = 30.0    # Seconds an idle connection stays open
+    MCP_HTTP2: bool = False               # Requires the optional 'h2' package (pip install httpx[http2])
+    MCP_CONNECT_TIMEOUT: float = 5.0
+    MCP_READ_TIMEOUT: float = 30.0
+    MCP_WRITE_TIMEOUT: float = 10.0
+    MCP_POOL_TIMEOUT: float = 5.0         # Max wait for a free pooled connection
+    MCP_WARMUP_CONNECTIONS: int = 4       # Connections opened during startup
+
+    # Circuit breaker: fail MCP calls fast while the server is down or too slow
+    MCP_BREAKER_ENABLED: bool = True
+    MCP_BREAKER_WINDOW: float = 30.0           # Seconds of call outcomes considered
+    MCP_BREAKER_MIN_CALLS: int = 5             # Outcomes needed in the window before it can open
+    MCP_BREAKER_FAILURE_RATE: float = 0.5      # Failure fraction that opens the circuit
+    MCP_BREAKER_SLOW_CALL_SECONDS: float = 10.0  # Calls slower than this count as failures
+    MCP_BREAKER_OPEN_SECONDS: float = 30.0     # Time open before a half-open probe
+
+    # Background refresh of the MCP tool catalog
+    MCP_TOOLS_REFRESH_INTERVAL: float = 300.0     # Seconds between refreshes (0 = load once at startup)
+    MCP_TOOLS_REFRESH_MIN_BACKOFF: float = 5.0    # First retry delay after a failed refresh
+    MCP_TOOLS_REFRESH_MAX_BACKOFF: float = 300.0  # Retry delay cap
+
+    # Tool calling protocol: "off" = USE_TOOL: text only, "on" = native OpenAI tools,
+    # "auto" = native until the endpoint rejects it for a model, then text
+    NATIVE_TOOL_CALLING: str = "off"
+
+    # Tool execution
+    TOOL_CALL_CONCURRENCY: int = 4    # Max tool calls run in parallel per LLM iteration
+    TOOL_CALL_TIMEOUT: float = 20.0   # Seconds before a single tool call is abandoned
+
+    # Tool loop tuning
+    # Tools answered straight from their result, skipping the follow-up completion (opt-in,
+    # e.g. "secret_query_block,secret_query_balance"); the reply is a fixed sentence without
+    # the personality styling, whatever the question was
+    TOOL_ANSWER_TEMPLATES: str = ""
+    TOOL_FOLLOWUP_MAX_TOKENS: int = 256       # max_tokens for completions after tool results
+    TOOL_FOLLOWUP_TEMPERATURE: float = 0.3    # temperature for completions after tool results
+
+    # MCP result cache (read-only tools only - never list transaction tools here)
+    MCP_CACHE_ENABLED: bool = True
+    MCP_CACHE_TOOLS: str = "secret_query_block,secret_query_balance"  # Comma-separated allowlist
+    MCP_CACHE_TTLS: str = "secret_query_block:3,secret_query_balance:10"  # Comma-separated tool:seconds
+    MCP_CACHE_DEFAULT_TTL: float = 10.0
+    MCP_CACHE_MAX_ENTRIES: int = 1024
+
+    # Coalesce identical concurrent MCP calls into one upstream request (read-only tools only)
+    MCP_SINGLE_FLIGHT_ENABLED: bool = True
+    MCP_SINGLE_FLIGHT_TOOLS: str = "secret_query_block,secret_query_balance"  # Comma-separated allowlist
+
     # Personality Traits
     RESPONSE_LENGTH: str = os.getenv("RESPONSE_LENGTH", "balanced")
     COMMUNICATION_STYLE: str = os.getenv("COMMUNICATION_STYLE", "casual")
@@ -53,6 +153,21 @@ class Settings(BaseSettings):
 
     # Logging
     LOG_LEVEL: str = "INFO"
+    LOG_ASYNC: bool = True          # Write log records from a background thread
+    LOG_REDACT: bool = True         # Mask wallet addresses and viewing keys
+    LOG_SAMPLE_RATE: float = 1.0    # Fraction of verbose per-request lines kept
+
+    # Request tracing
+    TRACING_ENABLED: bool = True
+    TRACING_EXPORTER: str = "memory"   # memory, file or otlp
+    TRACING_FILE: str = "./traces.jsonl"
+    TRACING_OTLP_ENDPOINT: str = "http://localhost:4318"  # OTLP/HTTP collector base URL
+    TRACING_SAMPLE_RATE: float = 1.0   # Fraction of new traces recorded
+
+    @property
+    def snip20_tokens(self) -> List[str]:
+        """Configured SNIP-20 token symbols, lower-cased."""
+        return [t.strip().lower() for t in self.SNIP20_TOKENS.split(',') if t.strip()]
 
     class Config:
         env_file = ".env"
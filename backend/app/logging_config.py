@@ -0,0 +1,101 @@
+"""Logging setup: background queue handler, sampling of per-request lines and redaction."""
+import atexit
+import logging
+import queue
+import random
+import re
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from app.config import settings
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Pass as extra= on verbose per-request lines; they are kept at LOG_SAMPLE_RATE
+SAMPLED = {"sampled": True}
+
+# Bech32 Secret Network account/contract addresses
+_ADDRESS_RE = re.compile(r"\b(secret1[02-9ac-hj-np-z]{4})[02-9ac-hj-np-z]{30,54}\b")
+# Viewing keys as issued by Keplr/SNIP-20 contracts, and key-like JSON/dict fields
+_VIEWING_KEY_RE = re.compile(r"\bapi_key_[A-Za-z0-9+/=_-]+")
+_KEY_FIELD_RE = re.compile(
+    r"""(["']?(?:viewing_key|viewing_keys|key|api_key)["']?\s*[:=]\s*)(["'])[^"']+\2""",
+    re.IGNORECASE
+)
+
+_listener: Optional[QueueListener] = None
+_TRACEBACK_FORMATTER = logging.Formatter()
+
+
+def redact(text: str) -> str:
+    """Mask wallet addresses and viewing keys in a log message."""
+    text = _ADDRESS_RE.sub(r"\1…", text)
+    text = _VIEWING_KEY_RE.sub("api_key_[redacted]", text)
+    return _KEY_FIELD_RE.sub(r"\1\2[redacted]\2", text)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of records marked with extra=SAMPLED; others always pass."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate >= 1.0 or not getattr(record, "sampled", False):
+            return True
+        return random.random() < self.rate
+
+
+class RedactingFilter(logging.Filter):
+    """Format the message and mask addresses and viewing keys, tracebacks included, before it is written."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.msg = redact(record.getMessage())
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _TRACEBACK_FORMATTER.formatException(record.exc_info)
+        if record.exc_text:
+            record.exc_text = redact(record.exc_text)
+        if record.stack_info:
+            record.stack_info = redact(record.stack_info)
+        return True
+
+
+def configure_logging():
+    """Install the root handlers according to the LOG_* settings."""
+    global _listener
+    shutdown_logging()
+
+    output = logging.StreamHandler()
+    output.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    root = logging.getLogger()
+    root.setLevel(settings.LOG_LEVEL)
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+
+    if settings.LOG_ASYNC:
+        # Request handlers only merge the message (and any traceback) into a snapshot and
+        # enqueue it; redaction, formatting and stderr writes happen on the listener thread
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        handler = QueueHandler(log_queue)
+        _listener = QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+    else:
+        handler = output
+
+    # Sample before anything is formatted; redact just before writing
+    handler.addFilter(SamplingFilter(settings.LOG_SAMPLE_RATE))
+    if settings.LOG_REDACT:
+        output.addFilter(RedactingFilter())
+    root.addHandler(handler)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -8,14 +8,14 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import settings
-from app.routes import chat, health, diagnostic, config
+from app.logging_config import configure_logging, shutdown_logging
+from app.routes import chat, health, diagnostic, config, history, metrics, wallet
+from app.services.history import history_store
 from app.services.secret_ai import secret_ai_service
+from app.services.tracing import tracer
 
 # Configure logging
-logging.basicConfig(
-    level=settings.LOG_LEVEL,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 @asynccontextmanager
@@ -23,20 +23,27 @@ async def lifespan(app: FastAPI):
     """Application lifespan manager."""
     # Startup
     logger.info("Starting SecretForge Chat Service...")
-    logger.info(f"VM Size: {settings.VM_SIZE}")
-    logger.info(f"History Enabled: {settings.ENABLE_HISTORY}")
+    logger.info("VM Size: %s", settings.VM_SIZE)
+    logger.info("History Enabled: %s", settings.ENABLE_HISTORY)
+
+    # Initialize SecretAI in the background so the server binds immediately;
+    # /api/health/ready reports when chat can be served
+    secret_ai_service.start_background_init()
 
-    # Initialize SecretAI
-    try:
-        await secret_ai_service.initialize()
-    except Exception as e:
-        logger.error(f"Failed to initialize SecretAI: {e}")
-        logger.warning("Service will start but chat will not work!")
+    if settings.ENABLE_HISTORY:
+        try:
+            await history_store.initialize()
+        except Exception as e:
+            logger.error("Failed to initialize chat history store: %s", e)
 
     yield
 
     # Shutdown
     logger.info("Shutting down SecretForge Chat Service...")
+    await secret_ai_service.close()
+    await history_store.close()
+    tracer.shutdown()
+    shutdown_logging()
 
 # Create FastAPI app
 app = FastAPI(
@@ -59,7 +66,10 @@ app.add_middleware(
 app.include_router(health.router, prefix="/api", tags=["health"])
 app.include_router(diagnostic.router, prefix="/api", tags=["diagnostic"])
 app.include_router(chat.router, prefix="/api", tags=["chat"])
+app.include_router(history.router, prefix="/api", tags=["history"])
+app.include_router(wallet.router, prefix="/api", tags=["wallet"])
 app.include_router(config.router)
+app.include_router(metrics.router, tags=["metrics"])
 
 # Mount static files
 static_dir = Path(__file__).parent / "static"
@@ -1,5 +1,5 @@
 """Pydantic models for request/response validation."""
-from typing import Dict, List, Literal, Optional
+from typing import Any, Dict, List, Literal, Optional
 from pydantic import BaseModel, Field
 
 class Message(BaseModel):
@@ -11,6 +11,7 @@ class ChatRequest(BaseModel):
     """Chat request body."""
     message: str = Field(..., min_length=1, max_length=10000)
     history: List[Message] = Field(default_factory=list, max_length=50)
+    session_id: Optional[str] = Field(None, min_length=1, max_length=128)  # Server-side history key
     stream: bool = False
     wallet_address: Optional[str] = None
     viewing_keys: Optional[Dict[str, str]] = None  # token_symbol -> viewing_key
@@ -21,6 +22,8 @@ class ChatResponse(BaseModel):
     """Chat response body."""
     response: str
     timestamp: str
+    session_id: Optional[str] = None
+    usage: Optional[Dict[str, Any]] = None  # Estimated prompt token counts for this turn
 
 class HealthResponse(BaseModel):
     """Health check response."""
@@ -29,9 +32,35 @@ class HealthResponse(BaseModel):
     secret_ai: bool = False
     secret_ai_error: Optional[str] = None
     history_enabled: bool = False
+    mcp_circuit: Optional[Dict[str, Any]] = None  # MCP circuit breaker state (Secret Network only)
+
+class ReadinessResponse(BaseModel):
+    """Readiness probe response."""
+    ready: bool
+    secret_ai: bool = False
+    initializing: bool = False
+    tools: int = 0
+    detail: Optional[str] = None
+
+class WalletBalanceRequest(BaseModel):
+    """Wallet balance request body."""
+    viewing_keys: Optional[Dict[str, str]] = None  # token_symbol -> viewing_key
+    tokens: Optional[List[str]] = None             # SNIP-20 symbols to query (default: all configured)
+    scrt: bool = True                               # Also query the SCRT balance
+
+class WalletBalanceResponse(BaseModel):
+    """SCRT and SNIP-20 balances of an address."""
+    success: bool                                   # Whether the SCRT balance was retrieved (True if not requested)
+    address: str
+    balance: Optional[Dict[str, str]] = None        # {"amount": uscrt, "denom": "uscrt"}
+    scrt: Optional[Dict[str, Any]] = None           # Same shape as ChatRequest.scrt_balance; None if not requested
+    snip20: Dict[str, Dict[str, Any]] = Field(default_factory=dict)  # Same shape as ChatRequest.snip_balances
+    snip20_supported: bool = False                  # Whether SNIP20_BALANCE_TOOL is in the MCP catalog
+    cached: bool = False
 
 class HistoryResponse(BaseModel):
     """Chat history response."""
+    session_id: str
     messages: List[Message]
     count: int
 
@@ -43,3 +72,5 @@ class DiagnosticResponse(BaseModel):
     last_error: Optional[str] = None
     model: Optional[str] = None
     base_url: Optional[str] = None
+    llm: Optional[Dict[str, Any]] = None
+    mcp: Optional[Dict[str, Any]] = None
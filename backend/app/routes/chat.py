@@ -1,70 +1,256 @@
 """Chat endpoints."""
+import asyncio
 import logging
+import time
 from datetime import datetime
-from fastapi import APIRouter, HTTPException
+from typing import Any, Awaitable, List, Optional
+import anyio
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import StreamingResponse
 
-from app.models import ChatRequest, ChatResponse
+from app.config import settings
+from app.logging_config import SAMPLED
+from app.models import ChatRequest, ChatResponse, Message
+from app.services.admission import AdmissionRejected
+from app.services import metrics
+from app.services.history import history_store
 from app.services.secret_ai import secret_ai_service
+from app.services.tracing import Span, tracer
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+
+class ClientDisconnected(Exception):
+    """The client went away before the response was ready."""
+
+
+async def _wait_for_disconnect(http_request: Request):
+    """Return once the client has disconnected."""
+    while not await http_request.is_disconnected():
+        await asyncio.sleep(settings.CLIENT_DISCONNECT_POLL_INTERVAL)
+
+
+async def _cancel_on_disconnect(http_request: Request, work: Awaitable[Any]) -> Any:
+    """
+    Await work, cancelling it (and with it any in-flight completion or tool
+    call) as soon as the client disconnects; raises ClientDisconnected then.
+    """
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(http_request))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
+            # Let the cancelled work release its LLM slot and upstream connections
+            await asyncio.wait({task})
+    if task.cancelled():
+        raise ClientDisconnected()
+    return task.result()
+
+
+def _uses_history_store(request: ChatRequest) -> bool:
+    """Whether this request's turns are kept in the server-side history store."""
+    return settings.ENABLE_HISTORY and request.session_id is not None
+
+
+# Set once the history store failed to open, so the error is logged only once
+_history_unavailable = False
+
+
+async def _load_history(request: ChatRequest) -> List[Message]:
+    """
+    The session's stored history; falls back to request.history when the
+    store can't be opened, so chat keeps working without history.
+    """
+    global _history_unavailable
+    try:
+        return await history_store.get_messages(request.session_id, limit=settings.HISTORY_MAX_MESSAGES)
+    except Exception as e:
+        if not _history_unavailable:
+            _history_unavailable = True
+            logger.error("Chat history store unavailable, continuing without history: %s", e)
+        return request.history
+
+
+def _finish_request(mode: str, status: str, started: float, span: Optional[Span] = None):
+    """Record end-to-end latency, release the in-flight gauge and end the request span."""
+    metrics.CHAT_IN_FLIGHT.dec(mode=mode)
+    metrics.CHAT_REQUEST_SECONDS.observe(time.monotonic() - started, mode=mode, status=status)
+    if span is not None:
+        span.set_attribute("status", status)
+        tracer.end_span(span)
+
+
+def _record_turn(request: ChatRequest, response: str):
+    """Queue the user message and assistant reply for the session's history."""
+    if _uses_history_store(request):
+        history_store.append(request.session_id, "user", request.message)
+        history_store.append(request.session_id, "assistant", response)
+
+
 @router.post("/chat")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     """
     Chat endpoint.
 
     Send a message and get AI response. Supports both streaming and non-streaming.
     """
+    mode = "stream" if request.stream else "simple"
+    started = time.monotonic()
+    status = "error"
+    handed_off = False  # Streaming body finishes the request metrics itself
+    metrics.CHAT_IN_FLIGHT.inc(mode=mode)
+    # Root span of this request's trace; continues the caller's trace if it sent one
+    root = tracer.start_span(
+        "chat.request",
+        {"mode": mode},
+        traceparent=http_request.headers.get("traceparent")
+    )
+
     try:
-        # Ensure SecretAI is initialized before processing request
-        if not secret_ai_service._initialized:
-            try:
-                await secret_ai_service.initialize()
-            except Exception as init_error:
-                error_msg = f"SecretAI initialization failed: {str(init_error)}"
-                if secret_ai_service._last_error:
-                    error_msg += f" (Last error: {secret_ai_service._last_error})"
-                logger.error(error_msg)
-                raise HTTPException(
-                    status_code=503,
-                    detail=error_msg
+        with tracer.use_span(root):
+            # Ensure SecretAI is initialized before processing request
+            if not secret_ai_service._initialized:
+                if secret_ai_service.initializing():
+                    status = "unavailable"
+                    # Startup initialization still running; don't hold the request on it
+                    raise HTTPException(
+                        status_code=503,
+                        detail="SecretAI is starting up",
+                        headers={"Retry-After": str(settings.LLM_RETRY_AFTER)}
+                    )
+                try:
+                    await secret_ai_service.initialize()
+                except Exception as init_error:
+                    status = "unavailable"
+                    error_msg = f"SecretAI initialization failed: {str(init_error)}"
+                    logger.error(error_msg)
+                    raise HTTPException(
+                        status_code=503,
+                        detail=error_msg,
+                        headers={"Retry-After": str(settings.LLM_RETRY_AFTER)}
+                    )
+
+            # With server-side history the client may send just a session id
+            history = request.history
+            if _uses_history_store(request) and not history:
+                history = await _load_history(request)
+
+            # Filled by the service with the estimated prompt token counts
+            usage = {}
+
+            # Check if streaming is requested
+            if request.stream:
+                stream = secret_ai_service.chat_stream(
+                    message=request.message,
+                    history=history,
+                    wallet_address=request.wallet_address,
+                    viewing_keys=request.viewing_keys,
+                    snip_balances=request.snip_balances,
+                    scrt_balance=request.scrt_balance,
+                    usage=usage
                 )
 
-        # Check if streaming is requested
-        if request.stream:
-            # Return streaming response
-            async def generate():
-                async for chunk in secret_ai_service.chat_stream(
+                # Pull the first chunk before committing to a 200 so that
+                # admission rejections still surface as a proper status code
+                try:
+                    first_chunk = await _cancel_on_disconnect(http_request, anext(stream, ""))
+                except BaseException:
+                    await stream.aclose()
+                    raise
+                metrics.STREAM_TIME_TO_FIRST_CHUNK_SECONDS.observe(time.monotonic() - started)
+
+                # Return streaming response
+                async def generate():
+                    stream_status = "error"
+                    try:
+                        # The body is sent after the handler returns, so re-enter the request span
+                        with tracer.use_span(root):
+                            chunks = [first_chunk]
+                            if first_chunk:
+                                yield first_chunk
+                            async for chunk in stream:
+                                chunks.append(chunk)
+                                yield chunk
+                            _record_turn(request, "".join(chunks))
+                            stream_status = "ok"
+                    except (asyncio.CancelledError, GeneratorExit):
+                        # Starlette cancels the body when the client disconnects
+                        stream_status = "disconnected"
+                        metrics.CHAT_DISCONNECTS_TOTAL.inc(mode=mode)
+                        raise
+                    finally:
+                        # Close the tool loop now, not at garbage collection, so the
+                        # upstream stream and LLM slot are released right away. After
+                        # a disconnect the surrounding scope is already cancelled, so
+                        # shield the close or its first await would be cancelled too
+                        with anyio.CancelScope(shield=True):
+                            await stream.aclose()
+                        _finish_request(mode, stream_status, started, root)
+
+                handed_off = True
+
+                return StreamingResponse(
+                    generate(),
+                    media_type="text/plain",
+                    headers={
+                        # Stop reverse proxies from buffering the token stream
+                        "Cache-Control": "no-cache",
+                        "X-Accel-Buffering": "no",
+                        **({"X-Prompt-Tokens": str(usage["prompt_tokens"])} if usage else {})
+                    }
+                )
+            else:
+                # Get regular response from SecretAI; abandoned if the client goes away
+                response = await _cancel_on_disconnect(http_request, secret_ai_service.chat(
                     message=request.message,
-                    history=request.history
-                ):
-                    yield chunk
-
-            return StreamingResponse(
-                generate(),
-                media_type="text/plain"
-            )
-        else:
-            # Get regular response from SecretAI
-            response = await secret_ai_service.chat(
-                message=request.message,
-                history=request.history,
-                wallet_address=request.wallet_address,
-                viewing_keys=request.viewing_keys,
-                snip_balances=request.snip_balances,
-                scrt_balance=request.scrt_balance
-            )
-
-            return ChatResponse(
-                response=response,
-                timestamp=datetime.utcnow().isoformat()
-            )
+                    history=history,
+                    wallet_address=request.wallet_address,
+                    viewing_keys=request.viewing_keys,
+                    snip_balances=request.snip_balances,
+                    scrt_balance=request.scrt_balance,
+                    usage=usage
+                ))
+
+                _record_turn(request, response)
+                status = "ok"
+
+                return ChatResponse(
+                    response=response,
+                    timestamp=datetime.utcnow().isoformat(),
+                    session_id=request.session_id,
+                    usage=usage or None
+                )
+
+    except AdmissionRejected as e:
+        status = "rejected"
+        logger.warning("Chat request rejected: %s", e.reason)
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=f"Service busy: {e.reason}",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+    except ClientDisconnected:
+        status = "disconnected"
+        metrics.CHAT_DISCONNECTS_TOTAL.inc(mode=mode)
+        logger.info("Client disconnected, chat request cancelled", extra=SAMPLED)
+        # Nobody is left to read it, but nginx's 499 keeps access logs honest
+        raise HTTPException(status_code=499, detail="Client disconnected")
+
+    except HTTPException:
+        raise
 
     except Exception as e:
-        logger.error(f"Chat error: {e}")
+        logger.error("Chat error: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Failed to get response: {str(e)}"
         )
+
+    finally:
+        if not handed_off:
+            _finish_request(mode, status, started, root)
@@ -3,6 +3,7 @@ from fastapi import APIRouter
 from pydantic import BaseModel
 
 from app.config import settings
+from app.services.secret_ai import secret_ai_service
 
 router = APIRouter(prefix="/api", tags=["config"])
 
@@ -10,6 +11,8 @@ router = APIRouter(prefix="/api", tags=["config"])
 class ConfigResponse(BaseModel):
     """Configuration response model."""
     secretNetwork: bool
+    history: bool = False
+    snip20_supported: bool = False  # SNIP20_BALANCE_TOOL is in the MCP catalog
 
 
 @router.get("/config", response_model=ConfigResponse)
@@ -21,5 +24,10 @@ async def get_config():
         Configuration including enabled features
     """
     return ConfigResponse(
-        secretNetwork=settings.ENABLE_SECRET_NETWORK
+        secretNetwork=settings.ENABLE_SECRET_NETWORK,
+        history=settings.ENABLE_HISTORY,
+        snip20_supported=(
+            settings.ENABLE_SECRET_NETWORK
+            and secret_ai_service.has_tool(settings.SNIP20_BALANCE_TOOL)
+        )
     )
@@ -1,8 +1,11 @@
 """Diagnostic endpoints."""
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query
 from app.models import DiagnosticResponse
 from app.config import settings
+from app.services.mcp_client import mcp_client
 from app.services.secret_ai import secret_ai_service
+from app.services.tracing import InMemoryExporter, tracer
+from app.services.wallet import wallet_service
 
 router = APIRouter()
 
@@ -26,5 +29,26 @@ async def diagnostic():
         secret_ai_initialized=secret_ai_service._initialized,
         last_error=secret_ai_service._last_error,
         model=secret_ai_service.model,
-        base_url=secret_ai_service.base_url
+        base_url=secret_ai_service.base_url,
+        llm={
+            "admission": secret_ai_service.admission.stats(),
+            "endpoints": secret_ai_service.get_endpoint_stats(),
+            "hedging": secret_ai_service.get_hedge_stats(),
+            "prompt_cache": secret_ai_service.get_prompt_cache_stats(),
+            "response_cache": secret_ai_service.get_response_cache_stats(),
+            "tool_calling": secret_ai_service.get_tool_calling_stats(),
+            "tool_catalog": secret_ai_service.get_tool_catalog_stats()
+        },
+        mcp={**mcp_client.get_stats(), "wallet_balances": wallet_service.get_stats()}
     )
+
+
+@router.get("/diagnostic/traces")
+async def recent_traces(limit: int = Query(20, ge=1, le=200)):
+    """Recent request traces with per-stage span timings (in-memory exporter only)."""
+    if not isinstance(tracer.exporter, InMemoryExporter):
+        raise HTTPException(
+            status_code=404,
+            detail="Recent traces are only kept with TRACING_EXPORTER=memory"
+        )
+    return {"traces": tracer.exporter.recent_traces(limit)}
@@ -1,7 +1,9 @@
 """Health check endpoints."""
 from fastapi import APIRouter
-from app.models import HealthResponse
+from fastapi.responses import JSONResponse
+from app.models import HealthResponse, ReadinessResponse
 from app.config import settings
+from app.services.mcp_client import mcp_client
 from app.services.secret_ai import secret_ai_service
 
 router = APIRouter()
@@ -19,7 +21,11 @@ async def health():
             version="1.0.0",
             secret_ai=secret_ai_ok,
             secret_ai_error=secret_ai_error,
-            history_enabled=settings.ENABLE_HISTORY
+            history_enabled=settings.ENABLE_HISTORY,
+            mcp_circuit=(
+                mcp_client.breaker.stats()
+                if settings.ENABLE_SECRET_NETWORK and mcp_client.breaker is not None else None
+            )
         )
     except Exception as e:
         return HealthResponse(
@@ -29,3 +35,28 @@ async def health():
             secret_ai_error=str(e),
             history_enabled=settings.ENABLE_HISTORY
         )
+
+
+@router.get("/health/live")
+async def live():
+    """Liveness probe: the process is up and serving requests."""
+    return {"status": "ok"}
+
+
+@router.get("/health/ready", response_model=ReadinessResponse)
+async def ready():
+    """Readiness probe: 200 once SecretAI is initialized, 503 (with Retry-After) before that."""
+    readiness = ReadinessResponse(
+        ready=secret_ai_service._initialized,
+        secret_ai=secret_ai_service._initialized,
+        initializing=secret_ai_service.initializing(),
+        tools=len(secret_ai_service._tools),
+        detail=None if secret_ai_service._initialized else secret_ai_service._last_error
+    )
+    if readiness.ready:
+        return readiness
+    return JSONResponse(
+        status_code=503,
+        content=readiness.model_dump(),
+        headers={"Retry-After": str(settings.LLM_RETRY_AFTER)}
+    )
@@ -0,0 +1,29 @@
+"""Chat history endpoints."""
+from fastapi import APIRouter, HTTPException
+
+from app.config import settings
+from app.models import HistoryResponse
+from app.services.history import history_store
+
+router = APIRouter()
+
+
+def _require_history():
+    if not settings.ENABLE_HISTORY:
+        raise HTTPException(status_code=404, detail="Chat history is not enabled")
+
+
+@router.get("/history/{session_id}", response_model=HistoryResponse)
+async def get_history(session_id: str, limit: int = 50):
+    """Return the most recent messages stored for a session."""
+    _require_history()
+    messages = await history_store.get_messages(session_id, limit=max(1, min(limit, 500)))
+    return HistoryResponse(session_id=session_id, messages=messages, count=len(messages))
+
+
+@router.delete("/history/{session_id}")
+async def delete_history(session_id: str):
+    """Delete all stored messages for a session."""
+    _require_history()
+    deleted = await history_store.delete_session(session_id)
+    return {"session_id": session_id, "deleted": deleted}
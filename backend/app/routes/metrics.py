@@ -0,0 +1,36 @@
+"""Prometheus metrics endpoint."""
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.services.circuit_breaker import HALF_OPEN, OPEN
+from app.services.mcp_client import mcp_client
+from app.services.metrics import registry
+from app.services.secret_ai import secret_ai_service
+
+router = APIRouter()
+
+# LLM admission state is read at scrape time
+registry.callback_gauge(
+    "secretforge_llm_in_flight",
+    "Completions currently running against SecretAI.",
+    lambda: secret_ai_service.admission.stats()["in_flight"]
+)
+registry.callback_gauge(
+    "secretforge_llm_queue_depth",
+    "Requests waiting for an LLM completion slot.",
+    lambda: secret_ai_service.admission.stats()["queued"]
+)
+registry.callback_gauge(
+    "secretforge_mcp_circuit_state",
+    "MCP circuit breaker state: 0 closed, 1 half-open, 2 open.",
+    lambda: {OPEN: 2, HALF_OPEN: 1}.get(mcp_client.breaker.state, 0) if mcp_client.breaker else 0
+)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Expose service metrics in the Prometheus text format."""
+    return PlainTextResponse(
+        registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,61 @@
+"""Wallet balance endpoints."""
+import re
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException
+
+from app.config import settings
+from app.models import WalletBalanceRequest, WalletBalanceResponse
+from app.services.secret_ai import secret_ai_service
+from app.services.wallet import wallet_service
+
+router = APIRouter()
+
+_ADDRESS_RE = re.compile(r"^secret1[02-9ac-hj-np-z]{38,58}$")
+
+
+async def _balances(
+    address: str,
+    viewing_keys: Optional[Dict[str, str]] = None,
+    tokens: Optional[List[str]] = None,
+    scrt: bool = True
+) -> WalletBalanceResponse:
+    if not settings.ENABLE_SECRET_NETWORK:
+        raise HTTPException(status_code=404, detail="Secret Network integration is not enabled")
+    if not _ADDRESS_RE.match(address):
+        raise HTTPException(status_code=400, detail="Invalid Secret Network address")
+
+    # Without the SNIP-20 query tool the browser queries tokens itself (secretjs + Keplr)
+    snip20_supported = secret_ai_service.has_tool(settings.SNIP20_BALANCE_TOOL)
+    result = await wallet_service.get_balances(
+        address, viewing_keys, tokens, snip20=snip20_supported, scrt=scrt
+    )
+    scrt_result = result["scrt"]
+    scrt_ok = scrt_result is not None and scrt_result["success"]
+    return WalletBalanceResponse(
+        success=scrt_result is None or scrt_ok,
+        address=address,
+        balance={"amount": scrt_result["amount"], "denom": scrt_result["denom"]} if scrt_ok else None,
+        scrt=scrt_result,
+        snip20=result["snip20"],
+        snip20_supported=snip20_supported,
+        cached=result["cached"]
+    )
+
+
+@router.get("/wallet/balance/{address}", response_model=WalletBalanceResponse)
+async def get_balance(address: str):
+    """SCRT balance of an address (SNIP-20 entries report the missing viewing keys)."""
+    return await _balances(address)
+
+
+@router.post("/wallet/balance/{address}", response_model=WalletBalanceResponse)
+async def post_balance(address: str, request: WalletBalanceRequest):
+    """
+    SCRT and SNIP-20 balances of an address in one call. Viewing keys go in
+    the body rather than the URL so they don't end up in access logs.
+    SNIP-20 balances are only queried when SNIP20_BALANCE_TOOL is in the
+    MCP tool catalog (snip20_supported); with scrt=false only SNIP-20
+    balances are queried.
+    """
+    return await _balances(address, request.viewing_keys, request.tokens, request.scrt)
@@ -0,0 +1,126 @@
+"""Admission control for upstream LLM completions."""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot get an LLM slot; maps to an HTTP error with Retry-After."""
+
+    def __init__(self, reason: str, status_code: int = 503, retry_after: int = 5):
+        super().__init__(reason)
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Concurrency limiter with a bounded FIFO wait queue.
+
+    At most max_concurrent holders run at once. Up to max_queue callers may
+    wait for a slot, each for at most queue_timeout seconds; anyone beyond
+    that is rejected immediately so the caller can fail fast.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float, retry_after: int = 5):
+        """Initialize the controller."""
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+        # Counters
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold a slot for the duration of the block."""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def try_acquire(self) -> bool:
+        """Take a slot only if one is free right now, without queueing."""
+        if self._in_flight < self.max_concurrent and not self._waiters:
+            self._in_flight += 1
+            self._record_admission(0.0)
+            return True
+        return False
+
+    async def acquire(self):
+        """Wait for a slot, or raise AdmissionRejected if the queue is full or the wait times out."""
+        if self.try_acquire():
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise AdmissionRejected("LLM queue is full", retry_after=self.retry_after)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._discard(waiter)
+            if waiter.done() and not waiter.cancelled():
+                # A slot was handed over just as the wait timed out - pass it on
+                self.release()
+            self.rejected_timeout += 1
+            raise AdmissionRejected(
+                f"Timed out after {self.queue_timeout}s waiting for an LLM slot",
+                retry_after=self.retry_after
+            )
+        except asyncio.CancelledError:
+            self._discard(waiter)
+            if waiter.done() and not waiter.cancelled():
+                # A slot was handed over just as we were cancelled - pass it on
+                self.release()
+            raise
+
+        self._record_admission(time.monotonic() - started)
+
+    def release(self):
+        """Release a slot, handing it directly to the oldest live waiter if any."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._in_flight -= 1
+
+    def _discard(self, waiter: asyncio.Future):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def _record_admission(self, waited: float):
+        self.admitted += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return current load and queueing counters."""
+        return {
+            "in_flight": self._in_flight,
+            "queued": len(self._waiters),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "avg_wait_seconds": round(self._wait_total / self.admitted, 4) if self.admitted else 0.0,
+            "max_wait_seconds": round(self._wait_max, 4)
+        }
@@ -0,0 +1,78 @@
+"""In-process TTL cache with LRU eviction."""
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+def canonical_key(name: str, arguments: Optional[Dict[str, Any]] = None) -> str:
+    """Build a stable cache key from a name and its JSON arguments (key order ignored)."""
+    args = json.dumps(arguments or {}, sort_keys=True, separators=(",", ":"), default=str)
+    return f"{name}:{args}"
+
+
+class TTLCache:
+    """
+    Bounded key/value cache where every entry expires after its own TTL.
+
+    Entries are kept in least-recently-used order; once max_entries is
+    reached the oldest entry is evicted. Cached values are shared between
+    callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries: int = 1024, default_ttl: float = 10.0):
+        """Initialize an empty cache."""
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Return (found, value) for key, counting the lookup as a hit or miss."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, value
+            del self._entries[key]
+            self.expirations += 1
+
+        self.misses += 1
+        return False, None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Store value under key for ttl seconds (default_ttl if not given)."""
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Drop all entries (counters are kept)."""
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size and hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
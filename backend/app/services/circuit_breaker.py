@@ -0,0 +1,133 @@
+"""Circuit breaker for the MCP server dependency."""
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable (circuit open, retry in {retry_after:.0f}s)")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Error-rate circuit breaker with a rolling time window.
+
+    Calls that fail or take longer than slow_call_seconds count as failures.
+    Once at least min_calls outcomes are in the window and the failure rate
+    reaches failure_rate, the circuit opens and calls are rejected for
+    open_seconds. It then goes half-open: a single probe call is let
+    through, and its outcome closes the circuit or opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: float = 30.0,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 10.0,
+        open_seconds: float = 30.0
+    ):
+        """Initialize a closed circuit."""
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._outcomes: Deque[Tuple[float, bool]] = deque()  # (time, failed)
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        """Current state; an open circuit turns half-open once open_seconds have passed."""
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow_request(self) -> bool:
+        """Whether a call may go ahead now; in half-open state only one probe at a time."""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def retry_after(self) -> float:
+        """Seconds until the circuit goes half-open (0 unless open)."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    def record_success(self, duration: float = 0.0):
+        """Record a completed call; slow calls count as failures."""
+        if duration > self.slow_call_seconds:
+            self.record_failure()
+            return
+        if self._state == HALF_OPEN:
+            self._close()
+        elif self._state == CLOSED:
+            self._record(False)
+
+    def record_failure(self):
+        """Record a failed call, opening the circuit if the threshold is reached."""
+        if self._state == HALF_OPEN:
+            self._open()
+            return
+        if self._state == OPEN:
+            return
+        self._record(True)
+        failures = sum(1 for _, failed in self._outcomes if failed)
+        if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate:
+            self._open()
+
+    def release_probe(self):
+        """Give up a half-open probe without an outcome (e.g. the call was cancelled)."""
+        self._probe_in_flight = False
+
+    def _record(self, failed: bool):
+        now = time.monotonic()
+        self._outcomes.append((now, failed))
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._outcomes.popleft()
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+        self._outcomes.clear()
+        self.opened += 1
+
+    def _close(self):
+        self._state = CLOSED
+        self._probe_in_flight = False
+        self._outcomes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return state and counters for health and diagnostic endpoints."""
+        failures = sum(1 for _, failed in self._outcomes if failed)
+        return {
+            "state": self.state,
+            "retry_after": round(self.retry_after(), 1),
+            "window_calls": len(self._outcomes),
+            "window_failures": failures,
+            "opened": self.opened,
+            "rejected": self.rejected
+        }
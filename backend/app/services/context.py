@@ -0,0 +1,135 @@
+"""Token-budget-aware assembly of the prompt sent to the LLM."""
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.models import Message
+
+# Rough characters-per-token ratio for English text with Gemma/Llama tokenizers
+CHARS_PER_TOKEN = 4
+# Role and separator tokens added by the chat template for every message
+MESSAGE_OVERHEAD_TOKENS = 4
+# Don't bother keeping a truncated message shorter than this
+MIN_TRUNCATED_TOKENS = 32
+# Cap on the note that replaces dropped turns
+SUMMARY_MAX_TOKENS = 96
+SUMMARY_SNIPPET_CHARS = 80
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate for text (no tokenizer round-trip)."""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def message_tokens(content: str) -> int:
+    """Estimated tokens for one chat message including template overhead."""
+    return estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+
+class ContextBuilder:
+    """
+    Packs the system prompt, the newest history that fits and the user
+    message into a token budget.
+
+    History is taken newest-first until the budget runs out; the first
+    message that doesn't fit is truncated (keeping its end) if enough room
+    is left, and anything older is replaced by a short note listing the
+    dropped user questions. The note is appended to the system message
+    rather than sent as a second one, which some OpenAI-compatible servers
+    reject or ignore; the prompt's prefix stays intact for prefix caching.
+    """
+
+    def __init__(self, budget: int, reserved_completion: int):
+        """Initialize with a total context budget and the tokens kept free for the reply."""
+        self.budget = budget
+        self.reserved_completion = reserved_completion
+
+    def build(
+        self,
+        system_prompt: str,
+        history: Optional[List[Message]],
+        message: str
+    ) -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
+        """Return (messages, usage) where usage reports the estimated token counts."""
+        history = history or []
+        system_tokens = message_tokens(system_prompt)
+        user_tokens = message_tokens(message)
+        remaining = self.budget - self.reserved_completion - system_tokens - user_tokens
+
+        # If the history won't fit whole, hold back room for the note about dropped turns
+        summary_reserve = 0
+        if sum(message_tokens(m.content) for m in history) > remaining:
+            summary_reserve = max(0, min(SUMMARY_MAX_TOKENS, remaining // 4))
+            remaining -= summary_reserve
+
+        kept: List[Dict[str, str]] = []
+        history_tokens = 0
+        truncated = 0
+        index = len(history) - 1
+
+        while index >= 0 and remaining > 0:
+            msg = history[index]
+            cost = message_tokens(msg.content)
+            if cost <= remaining:
+                kept.append({"role": msg.role, "content": msg.content})
+            elif remaining >= MIN_TRUNCATED_TOKENS + MESSAGE_OVERHEAD_TOKENS:
+                keep_chars = (remaining - MESSAGE_OVERHEAD_TOKENS) * CHARS_PER_TOKEN - 1
+                content = "…" + msg.content[-keep_chars:]
+                cost = message_tokens(content)
+                kept.append({"role": msg.role, "content": content})
+                truncated += 1
+            else:
+                break
+            history_tokens += cost
+            remaining -= cost
+            index -= 1
+
+        dropped = history[:index + 1]
+        kept.reverse()
+
+        system_content = system_prompt
+        summary_tokens = 0
+        if dropped:
+            summary = self._summarize(dropped, remaining + summary_reserve)
+            if summary:
+                system_content += "\n\n" + summary
+                summary_tokens = message_tokens(system_content) - system_tokens
+        messages = [{"role": "system", "content": system_content}]
+        messages.extend(kept)
+        messages.append({"role": "user", "content": message})
+
+        usage = {
+            "budget": self.budget,
+            "system_tokens": system_tokens,
+            "history_tokens": history_tokens,
+            "summary_tokens": summary_tokens,
+            "message_tokens": user_tokens,
+            "prompt_tokens": system_tokens + history_tokens + summary_tokens + user_tokens,
+            "history_messages": len(history),
+            "history_messages_used": len(kept),
+            "history_messages_truncated": truncated,
+            "history_messages_dropped": len(dropped)
+        }
+        return messages, usage
+
+    def _summarize(self, dropped: List[Message], remaining: int) -> str:
+        """Build a compact note about turns left out of the prompt, or "" if there is no room."""
+        limit = min(SUMMARY_MAX_TOKENS, remaining)
+        note = f"[{len(dropped)} earlier messages omitted to fit the context window."
+        if message_tokens(note + "]") > limit:
+            return ""
+
+        snippets = []
+        for msg in reversed(dropped):
+            if msg.role != "user":
+                continue
+            snippet = " ".join(msg.content.split())[:SUMMARY_SNIPPET_CHARS]
+            candidate = note + " Earlier user questions: " + " | ".join([snippet] + snippets) + "]"
+            if message_tokens(candidate) > limit:
+                break
+            snippets.insert(0, snippet)
+
+        if snippets:
+            return note + " Earlier user questions: " + " | ".join(snippets) + "]"
+        return note + "]"
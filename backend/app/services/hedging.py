@@ -0,0 +1,107 @@
+"""Hedged LLM completions: when to send a backup request and how many are allowed."""
+import math
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from app.services.admission import AdmissionController
+from app.services import metrics
+
+# Unused budget that may pile up for a burst of hedges
+HEDGE_BURST = 5.0
+
+
+class HedgePolicy:
+    """
+    Decides when a slow non-streaming completion gets a backup request.
+
+    The hedge delay is the given percentile of recent completion latencies,
+    never below min_delay; until min_samples latencies are known, nothing is
+    hedged. Each completion earns max_rate hedge credits (capped at
+    HEDGE_BURST) and each hedge spends one, so hedges stay below max_rate of
+    all completions. A hedge also needs a free admission slot right now, so
+    it never waits for, or queues ahead of, a real request.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        min_delay: float = 0.5,
+        max_rate: float = 0.1,
+        min_samples: int = 20,
+        window: int = 200,
+        admission: Optional[AdmissionController] = None
+    ):
+        """Initialize the policy; admission is the limiter hedges take a slot from."""
+        self.percentile = min(max(percentile, 0.0), 100.0)
+        self.min_delay = min_delay
+        self.max_rate = max(0.0, max_rate)
+        self.min_samples = max(1, min_samples)
+        self.admission = admission
+
+        self._latencies: Deque[float] = deque(maxlen=max(window, self.min_samples))
+        self._credits = 0.0
+        self.completions = 0
+        self.fired = 0
+        self.won = 0
+        self.skipped_budget = 0
+        self.skipped_admission = 0
+
+    def next_delay(self) -> Optional[float]:
+        """
+        Called once per completion: earn hedge budget and return how long to
+        wait before hedging, or None while too few latencies are known.
+        """
+        self.completions += 1
+        self._credits = min(HEDGE_BURST, self._credits + self.max_rate)
+        return self._delay()
+
+    def _delay(self) -> Optional[float]:
+        if len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        index = max(0, math.ceil(self.percentile / 100 * len(ordered)) - 1)
+        return max(self.min_delay, ordered[index])
+
+    def observe(self, latency: float):
+        """Record how long a completion took."""
+        self._latencies.append(latency)
+
+    def try_fire(self) -> bool:
+        """Spend one hedge credit and take an admission slot, if both are available."""
+        if self._credits < 1.0:
+            self.skipped_budget += 1
+            metrics.LLM_HEDGES_SKIPPED_TOTAL.inc(reason="budget")
+            return False
+        if self.admission is not None and not self.admission.try_acquire():
+            self.skipped_admission += 1
+            metrics.LLM_HEDGES_SKIPPED_TOTAL.inc(reason="admission")
+            return False
+        self._credits -= 1.0
+        self.fired += 1
+        return True
+
+    def release(self):
+        """Give back the admission slot of a finished or cancelled hedge."""
+        if self.admission is not None:
+            self.admission.release()
+
+    def record_outcome(self, won: bool):
+        """Record whether the hedge answered before the original request."""
+        if won:
+            self.won += 1
+        metrics.LLM_HEDGES_TOTAL.inc(outcome="won" if won else "lost")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the current delay and hedge counters for the diagnostic endpoint."""
+        delay = self._delay()
+        return {
+            "percentile": self.percentile,
+            "delay_seconds": round(delay, 3) if delay is not None else None,
+            "samples": len(self._latencies),
+            "completions": self.completions,
+            "fired": self.fired,
+            "won": self.won,
+            "skipped_budget": self.skipped_budget,
+            "skipped_admission": self.skipped_admission,
+            "credits": round(self._credits, 2)
+        }
@@ -0,0 +1,165 @@
+"""Session-keyed chat history store backed by SQLite."""
+import asyncio
+import logging
+import time
+from typing import List, Optional, Tuple
+
+import aiosqlite
+
+from app.config import settings
+from app.models import Message
+
+logger = logging.getLogger(__name__)
+
+_SQLITE_PREFIXES = ("sqlite+aiosqlite:///", "sqlite:///")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id);
+"""
+
+
+def sqlite_path(database_url: str) -> str:
+    """Extract the database file path from a SQLite DATABASE_URL."""
+    for prefix in _SQLITE_PREFIXES:
+        if database_url.startswith(prefix):
+            return database_url[len(prefix):]
+    raise ValueError(f"Only SQLite DATABASE_URLs are supported, got: {database_url}")
+
+
+class HistoryStore:
+    """
+    Async chat history store.
+
+    Appends are queued in memory and written in batches by a background task
+    (every flush_interval seconds, or sooner once batch_size rows are
+    pending). Reads flush pending rows first, so a session always sees its
+    own writes.
+    """
+
+    def __init__(self, database_url: str, batch_size: int = 50, flush_interval: float = 0.5):
+        """Initialize the store (no I/O until initialize())."""
+        self.database_url = database_url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._db: Optional[aiosqlite.Connection] = None
+        self._pending: List[Tuple[str, str, str, float]] = []
+        self._flush_needed = asyncio.Event()
+        self._write_lock = asyncio.Lock()
+        self._init_lock = asyncio.Lock()
+        self._writer: Optional[asyncio.Task] = None
+
+    async def initialize(self):
+        """Open the database, enable WAL and start the background writer."""
+        async with self._init_lock:
+            if self._db is not None:
+                return
+
+            path = sqlite_path(self.database_url)
+            db = await aiosqlite.connect(path)
+            await db.execute("PRAGMA journal_mode=WAL")
+            await db.execute("PRAGMA synchronous=NORMAL")
+            await db.executescript(_SCHEMA)
+            await db.commit()
+            self._db = db
+
+            self._writer = asyncio.create_task(self._write_loop())
+            logger.info("Chat history store ready at %s", path)
+
+    def append(self, session_id: str, role: str, content: str):
+        """
+        Queue a message for writing; returns immediately. Dropped while the
+        database is not open, so an unavailable store can't grow the queue.
+        """
+        if self._db is None:
+            return
+        self._pending.append((session_id, role, content, time.time()))
+        if len(self._pending) >= self.batch_size:
+            self._flush_needed.set()
+
+    async def flush(self):
+        """Write all queued messages in one transaction."""
+        async with self._write_lock:
+            if not self._pending or self._db is None:
+                return
+            batch, self._pending = self._pending, []
+            try:
+                await self._db.executemany(
+                    "INSERT INTO messages (session_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                    batch
+                )
+                await self._db.commit()
+            except Exception as e:
+                logger.error("Failed to write %d history rows: %s", len(batch), e)
+                # Keep the rows for the next attempt
+                self._pending = batch + self._pending
+                raise
+
+    async def get_messages(self, session_id: str, limit: int = 50) -> List[Message]:
+        """Return the most recent messages of a session, oldest first."""
+        await self.initialize()
+        await self.flush()
+
+        async with self._db.execute(
+            "SELECT role, content FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+            (session_id, limit)
+        ) as cursor:
+            rows = await cursor.fetchall()
+
+        return [Message(role=role, content=content) for role, content in reversed(rows)]
+
+    async def delete_session(self, session_id: str) -> int:
+        """Delete every message of a session; returns the number removed."""
+        await self.initialize()
+        await self.flush()
+
+        async with self._write_lock:
+            cursor = await self._db.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            await self._db.commit()
+            return cursor.rowcount
+
+    async def _write_loop(self):
+        """Flush queued messages periodically or when a batch fills up."""
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_needed.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_needed.clear()
+            try:
+                await self.flush()
+            except Exception:
+                # Already logged; retried on the next tick
+                pass
+
+    async def close(self):
+        """Stop the writer, flush remaining rows and close the database."""
+        if self._writer:
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+            self._writer = None
+
+        if self._db is not None:
+            try:
+                await self.flush()
+            except Exception:
+                pass
+            await self._db.close()
+            self._db = None
+
+
+# Singleton instance
+history_store = HistoryStore(
+    settings.DATABASE_URL,
+    batch_size=settings.HISTORY_BATCH_SIZE,
+    flush_interval=settings.HISTORY_FLUSH_INTERVAL
+)
@@ -0,0 +1,70 @@
+"""Single-pass detection of wallet balance queries in chat messages."""
+import logging
+import re
+from typing import List, NamedTuple, Optional
+
+from app.logging_config import SAMPLED
+
+logger = logging.getLogger(__name__)
+
+# Phrases that ask for the native SCRT balance
+_SCRT_PATTERN = (
+    r"scrt\s+(?:balance|amount|tokens?)"
+    r"|(?:my|check|how\s+much|balance\s+of|query|show)\s+scrt"
+    r"|(?:my|check|show|query)\s+(?:native\s+)?balance"  # Generic balance query
+    r"|how\s+much\s+(?:native\s+)?balance"
+)
+
+# Phrases that ask for a SNIP-20 token balance; {tokens} is the token alternation
+_SNIP20_PATTERN = (
+    r"(?P<token_before>{tokens})\s+(?:balance|amount)"
+    r"|(?:my|check|how\s+much|balance\s+of|query)\s+(?P<token_after>{tokens})"
+)
+
+
+class Intent(NamedTuple):
+    """Detected balance intent: kind is "scrt", "snip20" or None."""
+    kind: Optional[str] = None
+    token: Optional[str] = None
+
+
+class IntentMatcher:
+    """
+    Classifies a message as an SCRT balance query, a SNIP-20 balance query
+    or neither, using one precompiled regex scan.
+
+    SCRT queries take priority over SNIP-20 ones, and when several SNIP-20
+    tokens are mentioned the one listed first in snip20_tokens wins.
+    """
+
+    def __init__(self, snip20_tokens: List[str]):
+        """Compile the combined pattern for the given token symbols."""
+        self.snip20_tokens = [token.lower() for token in snip20_tokens if token]
+        self._token_rank = {token: rank for rank, token in enumerate(self.snip20_tokens)}
+
+        alternatives = [rf"\b(?P<scrt>{_SCRT_PATTERN})\b"]
+        if self.snip20_tokens:
+            # Longest first so e.g. "stkd-scrt" is preferred over a shorter symbol
+            tokens = "|".join(re.escape(token) for token in sorted(self.snip20_tokens, key=len, reverse=True))
+            alternatives.append(rf"\b(?:{_SNIP20_PATTERN.format(tokens=tokens)})\b")
+
+        # Zero-width lookahead so overlapping phrases are all seen in one scan
+        self._pattern = re.compile(rf"(?=(?:{'|'.join(alternatives)}))")
+
+    def classify(self, message: str) -> Intent:
+        """Return the balance intent expressed by message."""
+        best_token = None
+        for match in self._pattern.finditer(message.lower()):
+            if match.group("scrt") is not None:
+                logger.info("🎯 Detected SCRT balance query", extra=SAMPLED)
+                return Intent("scrt")
+
+            token = match.group("token_before") or match.group("token_after")
+            if best_token is None or self._token_rank[token] < self._token_rank[best_token]:
+                best_token = token
+
+        if best_token is not None:
+            logger.info("🎯 Detected SNIP-20 query for token: %s", best_token, extra=SAMPLED)
+            return Intent("snip20", best_token)
+
+        return Intent()
@@ -0,0 +1,298 @@
+"""Pool of OpenAI-compatible SecretAI endpoints with load balancing and failover."""
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Any, AsyncIterator, Collection, Dict, List, Optional, Set
+from urllib.parse import urlparse
+
+import anyio
+from openai import APIConnectionError, AsyncOpenAI, InternalServerError, RateLimitError
+
+if TYPE_CHECKING:
+    from app.services.hedging import HedgePolicy
+
+logger = logging.getLogger(__name__)
+
+# Errors that say nothing about the request itself, so another endpoint may succeed
+RETRYABLE_ERRORS = (APIConnectionError, InternalServerError, RateLimitError)
+
+LATENCY_EWMA_ALPHA = 0.3
+
+
+class LLMEndpoint:
+    """One upstream endpoint: its own client (and connection pool) plus passive health state."""
+
+    def __init__(self, base_url: str, model: str, client: Any, name: Optional[str] = None):
+        """Initialize an endpoint around an OpenAI-compatible client."""
+        self.base_url = base_url
+        self.model = model
+        self.client = client
+        self.name = name or urlparse(base_url).netloc or base_url
+
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency_ewma: Optional[float] = None   # Seconds to response (first chunk when streaming)
+        self.ejected_until = 0.0
+        self.last_error: Optional[str] = None
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def record_success(self, latency: float):
+        self.consecutive_failures = 0
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma += LATENCY_EWMA_ALPHA * (latency - self.latency_ewma)
+
+    def record_failure(self, error: Exception, eject_after: int, eject_seconds: float):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+        if self.consecutive_failures >= eject_after:
+            self.ejected_until = time.monotonic() + eject_seconds
+            logger.warning(
+                "Ejecting LLM endpoint %s for %.0fs after %d consecutive failures",
+                self.name, eject_seconds, self.consecutive_failures
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "name": self.name,
+            "base_url": self.base_url,
+            "model": self.model,
+            "healthy": self.healthy(now),
+            "ejected_for": round(max(0.0, self.ejected_until - now), 1),
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "latency_ewma_ms": round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None,
+            "last_error": self.last_error
+        }
+
+
+class LLMPool:
+    """
+    Routes completions across endpoints.
+
+    Each request goes to the healthy endpoint with the fewest outstanding
+    requests ("least_outstanding", ties broken by latency) or the lowest
+    outstanding-weighted latency ("latency"). Connect errors, timeouts, 5xx
+    and 429 responses fail over to the next endpoint; an endpoint that fails
+    eject_after times in a row is skipped for eject_seconds. If every
+    endpoint is ejected the least recently ejected one is tried anyway.
+    """
+
+    def __init__(
+        self,
+        endpoints: List[LLMEndpoint],
+        routing: str = "least_outstanding",
+        eject_after: int = 3,
+        eject_seconds: float = 30.0
+    ):
+        """Initialize the pool; endpoints must not be empty."""
+        if not endpoints:
+            raise ValueError("LLMPool needs at least one endpoint")
+        self.endpoints = endpoints
+        self.routing = routing
+        self.eject_after = max(1, eject_after)
+        self.eject_seconds = eject_seconds
+        self.failovers = 0
+
+    @classmethod
+    def from_config(
+        cls,
+        endpoints: str,
+        default_base_url: str,
+        default_model: str,
+        api_key: str,
+        **options: Any
+    ) -> "LLMPool":
+        """
+        Build a pool from a comma-separated endpoint list ("url" or "url|model");
+        an empty list means the single default endpoint.
+        """
+        specs = [item.strip() for item in endpoints.split(",") if item.strip()] or [default_base_url]
+        members = []
+        for spec in specs:
+            base_url, _, model = spec.partition("|")
+            client = AsyncOpenAI(
+                base_url=base_url.strip(),
+                api_key=api_key,
+                default_headers={"X-API-Key": api_key},
+                # With several endpoints, fail over instead of retrying the same one
+                **({"max_retries": 0} if len(specs) > 1 else {})
+            )
+            members.append(LLMEndpoint(base_url.strip(), model.strip() or default_model, client))
+        return cls(members, **options)
+
+    def choose_model(self) -> str:
+        """Model of the endpoint the next request would go to (to pin a chat turn to it)."""
+        return self._choose(set()).model
+
+    def _choose(self, exclude: Set[int], avoid: Collection[int] = (), model: Optional[str] = None) -> LLMEndpoint:
+        now = time.monotonic()
+        # Only endpoints serving the requested model, if any do
+        serving = [e for e in self.endpoints if e.model == model] or self.endpoints
+        candidates = [e for e in serving if id(e) not in exclude]
+        # Prefer endpoints outside avoid, but fall back to them rather than to nothing
+        candidates = [e for e in candidates if id(e) not in avoid] or candidates
+        healthy = [e for e in candidates if e.healthy(now)]
+        if not healthy:
+            return min(candidates, key=lambda e: e.ejected_until)
+
+        if self.routing == "latency":
+            # Unknown latency scores 0 so new endpoints get traffic and a measurement
+            return min(healthy, key=lambda e: (e.outstanding + 1) * (e.latency_ewma or 0.0))
+        return min(healthy, key=lambda e: (e.outstanding, e.latency_ewma or 0.0))
+
+    @staticmethod
+    def _request_for(endpoint: LLMEndpoint, request_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        return {**request_kwargs, "model": endpoint.model}
+
+    def _serving(self, request_kwargs: Dict[str, Any]) -> int:
+        """Number of endpoints a request can go to (those serving its model, else all)."""
+        model = request_kwargs.get("model")
+        return sum(1 for e in self.endpoints if e.model == model) or len(self.endpoints)
+
+    async def create(self, request_kwargs: Dict[str, Any], hedge: Optional["HedgePolicy"] = None) -> Any:
+        """
+        Run a non-streaming completion, failing over between endpoints. If
+        some endpoints serve the requested model, only those are used.
+
+        With a hedge policy, a request still running after the policy's delay
+        gets a backup request, on another endpoint when there is one; the
+        first successful response wins and the other request is cancelled.
+        """
+        if hedge is None:
+            return await self._create(request_kwargs, set())
+
+        delay = hedge.next_delay()
+        started = time.monotonic()
+        tried: Set[int] = set()
+        primary = asyncio.ensure_future(self._create(request_kwargs, tried))
+        try:
+            if delay is not None:
+                await asyncio.wait({primary}, timeout=delay)
+                if not primary.done() and hedge.try_fire():
+                    response = await self._race(primary, request_kwargs, tried, hedge)
+                    hedge.observe(time.monotonic() - started)
+                    return response
+            response = await primary
+        finally:
+            if not primary.done():
+                primary.cancel()
+        hedge.observe(time.monotonic() - started)
+        return response
+
+    async def _race(
+        self,
+        primary: "asyncio.Future[Any]",
+        request_kwargs: Dict[str, Any],
+        avoid: Set[int],
+        hedge: "HedgePolicy"
+    ) -> Any:
+        """Run a backup request against primary and return the first successful response."""
+        backup = asyncio.ensure_future(self._create(request_kwargs, set(), avoid=set(avoid)))
+        backup.add_done_callback(lambda _: hedge.release())
+        pending = {primary, backup}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # If both finished together, the original request wins
+                for task in sorted(done, key=lambda t: t is backup):
+                    if task.exception() is None:
+                        hedge.record_outcome(won=task is backup)
+                        return task.result()
+            hedge.record_outcome(won=False)
+            raise primary.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _create(self, request_kwargs: Dict[str, Any], tried: Set[int], avoid: Collection[int] = ()) -> Any:
+        while True:
+            endpoint = self._choose(tried, avoid, request_kwargs.get("model"))
+            tried.add(id(endpoint))
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            started = time.monotonic()
+            try:
+                response = await endpoint.client.chat.completions.create(**self._request_for(endpoint, request_kwargs))
+            except RETRYABLE_ERRORS as e:
+                if not self._failed(endpoint, e, tried, self._serving(request_kwargs)):
+                    raise
+                continue
+            finally:
+                endpoint.outstanding -= 1
+            endpoint.record_success(time.monotonic() - started)
+            return response
+
+    async def stream(self, request_kwargs: Dict[str, Any]) -> AsyncIterator[Any]:
+        """
+        Stream a completion's chunks. Failover happens only until the first
+        chunk arrives; after that an error is raised to the caller. The
+        upstream stream is closed when iteration ends for any reason.
+        """
+        tried: Set[int] = set()
+        while True:
+            endpoint = self._choose(tried, model=request_kwargs.get("model"))
+            tried.add(id(endpoint))
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            started = time.monotonic()
+            stream = None
+            try:
+                try:
+                    stream = await endpoint.client.chat.completions.create(**self._request_for(endpoint, request_kwargs))
+                    iterator = stream.__aiter__()
+                    first = await iterator.__anext__()
+                except StopAsyncIteration:
+                    endpoint.record_success(time.monotonic() - started)
+                    return
+                except RETRYABLE_ERRORS as e:
+                    if not self._failed(endpoint, e, tried, self._serving(request_kwargs)):
+                        raise
+                    continue
+
+                endpoint.record_success(time.monotonic() - started)
+                yield first
+                async for chunk in iterator:
+                    yield chunk
+                return
+            finally:
+                endpoint.outstanding -= 1
+                close = getattr(stream, "close", None)
+                if close is not None:
+                    # Also runs when the consumer was cancelled; shield it so the
+                    # upstream connection is still released
+                    with anyio.CancelScope(shield=True):
+                        await close()
+
+    def _failed(self, endpoint: LLMEndpoint, error: Exception, tried: Set[int], serving: int) -> bool:
+        """Record a failure; True if another of the serving endpoints is left to try."""
+        endpoint.record_failure(error, self.eject_after, self.eject_seconds)
+        if len(tried) >= serving:
+            return False
+        self.failovers += 1
+        logger.warning("LLM endpoint %s failed (%s), failing over", endpoint.name, type(error).__name__)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-endpoint routing and health state for the diagnostic endpoint."""
+        return {
+            "routing": self.routing,
+            "failovers": self.failovers,
+            "endpoints": [endpoint.stats() for endpoint in self.endpoints]
+        }
+
+    async def close(self):
+        """Close every endpoint's client."""
+        for endpoint in self.endpoints:
+            try:
+                await endpoint.client.close()
+            except Exception as e:
+                logger.error("Error closing SecretAI client for %s: %s", endpoint.name, e)
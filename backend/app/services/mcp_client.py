@@ -1,14 +1,48 @@
 """HTTP-based MCP Client for Secret Network tools."""
 import asyncio
+import importlib.util
 import json
 import logging
-from typing import Any, Dict, List, Optional
+import time
+from typing import Any, Dict, List, Optional, Set
 import httpx
 from app.config import settings
+from app.logging_config import SAMPLED
+from app.services import metrics
+from app.services.cache import TTLCache, canonical_key
+from app.services.circuit_breaker import CLOSED, HALF_OPEN, CircuitBreaker, CircuitOpenError
+from app.services.tracing import Span, tracer
 
 logger = logging.getLogger(__name__)
 
 
+def _parse_tool_list(value: str) -> Set[str]:
+    """Parse a comma-separated tool name list."""
+    return {name.strip() for name in value.split(",") if name.strip()}
+
+
+def _parse_tool_ttls(value: str) -> Dict[str, float]:
+    """Parse comma-separated tool:seconds pairs."""
+    ttls = {}
+    for item in value.split(","):
+        name, sep, seconds = item.partition(":")
+        if not sep or not name.strip():
+            continue
+        try:
+            ttls[name.strip()] = float(seconds)
+        except ValueError:
+            logger.warning("Ignoring invalid MCP cache TTL: %s", item)
+    return ttls
+
+
+class _Flight:
+    """An upstream tool call shared by every caller waiting on the same key."""
+
+    def __init__(self, task: "asyncio.Task[Any]"):
+        self.task = task
+        self.waiters = 0
+
+
 class MCPClient:
     """HTTP client for communicating with Secret Network MCP server."""
 
@@ -18,6 +52,36 @@ class MCPClient:
         self.client: Optional[httpx.AsyncClient] = None
         self._initialized = False
 
+        # Result cache for read-only tools
+        self._cache_tools = _parse_tool_list(settings.MCP_CACHE_TOOLS) if settings.MCP_CACHE_ENABLED else set()
+        self._cache_ttls = _parse_tool_ttls(settings.MCP_CACHE_TTLS)
+        self._cache = TTLCache(
+            max_entries=settings.MCP_CACHE_MAX_ENTRIES,
+            default_ttl=settings.MCP_CACHE_DEFAULT_TTL
+        )
+
+        # Single-flight: identical concurrent calls share one upstream request
+        self._single_flight_tools = (
+            _parse_tool_list(settings.MCP_SINGLE_FLIGHT_TOOLS) if settings.MCP_SINGLE_FLIGHT_ENABLED else set()
+        )
+        self._inflight: Dict[str, _Flight] = {}
+
+        # Tool names reported by the server; anything else is labelled "other" in metrics
+        self._known_tools: Set[str] = set()
+        self._flights_started = 0
+        self._flights_coalesced = 0
+
+        # Fail fast while the MCP server is down or too slow
+        self.breaker = CircuitBreaker(
+            "MCP server",
+            window=settings.MCP_BREAKER_WINDOW,
+            min_calls=settings.MCP_BREAKER_MIN_CALLS,
+            failure_rate=settings.MCP_BREAKER_FAILURE_RATE,
+            slow_call_seconds=settings.MCP_BREAKER_SLOW_CALL_SECONDS,
+            open_seconds=settings.MCP_BREAKER_OPEN_SECONDS
+        ) if settings.MCP_BREAKER_ENABLED else None
+        self._probe: Optional["asyncio.Task[None]"] = None
+
     async def initialize(self):
         """Initialize the HTTP client."""
         if self._initialized:
@@ -26,26 +90,71 @@ class MCPClient:
         try:
             logger.info("Initializing MCP HTTP client for Secret Network...")
 
-            # Create async HTTP client
-            self.client = httpx.AsyncClient(timeout=30.0)
+            # Create the pooled async HTTP client once; retries reuse it
+            if self.client is None:
+                self.client = self._create_http_client()
 
             # Test connection to MCP server
             response = await self.client.get(f"{self.base_url}/api/health")
             response.raise_for_status()
             health_data = response.json()
 
-            logger.info(f"MCP server health: {health_data}")
+            logger.info("MCP server health: %s", health_data)
+
+            await self._warm_up()
 
             self._initialized = True
             logger.info("MCP HTTP client initialized successfully")
 
         except Exception as e:
-            logger.error(f"Failed to initialize MCP HTTP client: {e}")
-            logger.warning(f"MCP server may not be running at {self.base_url}")
+            logger.error("Failed to initialize MCP HTTP client: %s", e)
+            logger.warning("MCP server may not be running at %s", self.base_url)
             raise
 
-    async def list_tools(self) -> List[Dict[str, Any]]:
-        """List available tools from the MCP server via HTTP."""
+    def _create_http_client(self) -> httpx.AsyncClient:
+        """Create the shared HTTP client with tuned pool limits and timeouts."""
+        http2 = settings.MCP_HTTP2
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("MCP_HTTP2 is enabled but the 'h2' package is not installed, using HTTP/1.1")
+            http2 = False
+
+        return httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=settings.MCP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.MCP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.MCP_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(
+                connect=settings.MCP_CONNECT_TIMEOUT,
+                read=settings.MCP_READ_TIMEOUT,
+                write=settings.MCP_WRITE_TIMEOUT,
+                pool=settings.MCP_POOL_TIMEOUT
+            )
+        )
+
+    async def _warm_up(self):
+        """Open pooled keep-alive connections ahead of the first requests."""
+        # A single HTTP/2 connection multiplexes every request
+        count = 1 if settings.MCP_HTTP2 else settings.MCP_WARMUP_CONNECTIONS
+        count = min(count, settings.MCP_MAX_KEEPALIVE_CONNECTIONS)
+        if count <= 0:
+            return
+
+        results = await asyncio.gather(
+            *(self.client.get(f"{self.base_url}/api/health") for _ in range(count)),
+            return_exceptions=True
+        )
+        failures = sum(1 for r in results if isinstance(r, Exception))
+        logger.info("Warmed up %d/%d MCP connections", count - failures, count)
+
+    async def list_tools(self, raise_on_error: bool = False) -> List[Dict[str, Any]]:
+        """
+        List available tools from the MCP server via HTTP.
+
+        Failures return an empty list, or are re-raised with raise_on_error
+        so a caller can tell "no tools" from "server unreachable".
+        """
         if not self._initialized:
             await self.initialize()
 
@@ -56,21 +165,119 @@ class MCPClient:
 
             # Extract tools array from response
             tools = data.get("tools", [])
+            self._known_tools = {
+                tool.get("name", "") if isinstance(tool, dict) else getattr(tool, "name", "")
+                for tool in tools
+            }
 
-            logger.info(f"Retrieved {len(tools)} tools from MCP server")
+            logger.info("Retrieved %d tools from MCP server", len(tools))
             return tools
 
         except Exception as e:
-            logger.error(f"Failed to list tools: {e}")
+            logger.error("Failed to list tools: %s", e)
+            if raise_on_error:
+                raise
             return []
 
     async def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Any:
-        """Call a tool on the MCP server via HTTP."""
-        if not self._initialized:
-            await self.initialize()
+        """
+        Call a tool on the MCP server via HTTP.
+
+        Results of allowlisted read-only tools are served from the TTL cache
+        when a fresh entry exists for the same tool and arguments, and
+        identical calls already in flight are joined instead of re-sent.
+        """
+        with tracer.span("mcp.call_tool", tool=tool_name) as span:
+            tool_label = self._metric_label(tool_name)
+            cacheable = tool_name in self._cache_tools
+            coalesce = tool_name in self._single_flight_tools
+            if not (cacheable or coalesce):
+                self._count_call(span, tool_label, "upstream")
+                return await self._call_upstream(tool_name, arguments)
+
+            key = canonical_key(tool_name, arguments)
+            if cacheable:
+                found, cached = self._cache.get(key)
+                if found:
+                    logger.debug("MCP cache hit for %s", tool_name)
+                    self._count_call(span, tool_label, "cache")
+                    return cached
+
+            if not coalesce:
+                self._count_call(span, tool_label, "upstream")
+                return await self._fetch(tool_name, arguments, key, cacheable)
+
+            flight = self._inflight.get(key)
+            if flight is None:
+                self._count_call(span, tool_label, "upstream")
+                task = asyncio.ensure_future(self._fetch(tool_name, arguments, key, cacheable))
+                flight = _Flight(task)
+                self._inflight[key] = flight
+                task.add_done_callback(lambda done, key=key: self._end_flight(key, done))
+                self._flights_started += 1
+            else:
+                self._flights_coalesced += 1
+                self._count_call(span, tool_label, "coalesced")
+                logger.debug("Joining in-flight call to %s", tool_name)
+
+            # Shield the shared task so one caller's cancellation doesn't fail the others
+            flight.waiters += 1
+            try:
+                return await asyncio.shield(flight.task)
+            finally:
+                flight.waiters -= 1
+                if flight.waiters == 0 and not flight.task.done():
+                    # Last waiter gave up - nobody needs the upstream result any more.
+                    # Forget the flight first so a caller arriving before the task has
+                    # finished cancelling starts a new one instead of joining it
+                    if self._inflight.get(key) is flight:
+                        del self._inflight[key]
+                    flight.task.cancel()
 
+    def _count_call(self, span: Optional[Span], tool_label: str, source: str):
+        """Count a tool call by how it was served and tag the trace span with it."""
+        metrics.MCP_CALLS_TOTAL.inc(tool=tool_label, source=source)
+        if span is not None:
+            span.set_attribute("source", source)
+
+    async def _fetch(self, tool_name: str, arguments: Dict[str, Any], key: str, cacheable: bool) -> Any:
+        """Call upstream and store the result in the cache if allowed."""
+        result = await self._call_upstream(tool_name, arguments)
+
+        # Don't keep tool-level errors around for the full TTL
+        if cacheable and not (isinstance(result, dict) and result.get("isError")):
+            self._cache.set(key, result, self._cache_ttls.get(tool_name))
+        return result
+
+    def _end_flight(self, key: str, task: "asyncio.Task[Any]"):
+        """Forget a finished flight so the next call goes upstream again."""
+        flight = self._inflight.get(key)
+        if flight is not None and flight.task is task:
+            del self._inflight[key]
+
+        # Mark the exception as retrieved; waiters (if any) re-raise it themselves
+        if not task.cancelled():
+            task.exception()
+
+    async def _call_upstream(self, tool_name: str, arguments: Dict[str, Any]) -> Any:
+        """Send a tool call to the MCP server (rejected with CircuitOpenError while the circuit is open)."""
+        # Whether this call is the half-open probe; only then may it give the probe back
+        probe = False
+        if self.breaker is not None:
+            probe = self.breaker.state == HALF_OPEN
+            if not self.breaker.allow_request():
+                metrics.MCP_CIRCUIT_REJECTIONS_TOTAL.inc()
+                raise CircuitOpenError(self.breaker.name, self.breaker.retry_after())
+
+        started = time.monotonic()
+        outcome = "error"
         try:
-            logger.info(f"Calling tool {tool_name} with args: {arguments}")
+            if not self._initialized:
+                await self.initialize()
+
+            logger.info("Calling tool %s", tool_name, extra=SAMPLED)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Tool %s args: %s", tool_name, json.dumps(arguments))
 
             # Call the tool via HTTP POST
             response = await self.client.post(
@@ -78,25 +285,124 @@ class MCPClient:
                 json={
                     "name": tool_name,
                     "arguments": arguments
-                }
+                },
+                # Let the MCP server join this request's trace
+                headers=tracer.inject_headers()
             )
             response.raise_for_status()
             result = response.json()
 
-            logger.info(f"Tool {tool_name} returned: {result}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Tool %s returned: %s", tool_name, json.dumps(result))
+            outcome = "ok"
+            self._record_outcome(True, time.monotonic() - started, probe)
             return result
 
+        except asyncio.CancelledError:
+            # Abandoned by the caller: only a call that was already too slow says anything about the server
+            self._record_outcome(None, time.monotonic() - started, probe)
+            raise
+
         except Exception as e:
-            logger.error(f"Failed to call tool {tool_name}: {e}")
+            logger.error("Failed to call tool %s: %s", tool_name, e)
+            # A 4xx means a bad request, not an unhealthy server
+            client_error = isinstance(e, httpx.HTTPStatusError) and e.response.status_code < 500
+            self._record_outcome(client_error, time.monotonic() - started, probe)
             raise
 
+        finally:
+            metrics.MCP_CALL_SECONDS.observe(
+                time.monotonic() - started,
+                tool=self._metric_label(tool_name),
+                outcome=outcome
+            )
+
+    def _record_outcome(self, healthy: Optional[bool], duration: float, probe: bool = False):
+        """
+        Feed a call outcome to the breaker; healthy=None for a call abandoned
+        by the caller. probe says whether the call was the half-open probe.
+        """
+        if self.breaker is None:
+            return
+        if healthy:
+            self.breaker.record_success(duration)
+        elif healthy is False or duration > self.breaker.slow_call_seconds:
+            self.breaker.record_failure()
+        elif probe:
+            # Another call may hold the probe by now; only give back our own
+            self.breaker.release_probe()
+
+    def tools_available(self) -> bool:
+        """
+        Whether tool calls are currently worth offering to the model.
+
+        While the circuit is half-open this starts a background health probe,
+        since with the tools hidden from the prompt no tool call would probe it.
+        """
+        if self.breaker is None:
+            return True
+        state = self.breaker.state
+        if state == HALF_OPEN and (self._probe is None or self._probe.done()):
+            try:
+                self._probe = asyncio.get_running_loop().create_task(self._probe_health())
+            except RuntimeError:
+                pass
+        return state == CLOSED
+
+    async def _probe_health(self):
+        """Half-open probe: one health check decides whether the circuit closes."""
+        probe = self.breaker.state == HALF_OPEN
+        if not self.breaker.allow_request():
+            return
+        started = time.monotonic()
+        try:
+            if self.client is None:
+                self.client = self._create_http_client()
+            response = await self.client.get(f"{self.base_url}/api/health")
+            response.raise_for_status()
+        except asyncio.CancelledError:
+            if probe:
+                self.breaker.release_probe()
+            raise
+        except Exception as e:
+            logger.warning("MCP health probe failed, circuit stays open: %s", e)
+            self.breaker.record_failure()
+            return
+        self.breaker.record_success(time.monotonic() - started)
+        if self.breaker.state == CLOSED:
+            logger.info("MCP server recovered, circuit closed")
+
+    def _metric_label(self, tool_name: str) -> str:
+        """Bound metric label cardinality to the tools the server actually offers."""
+        return tool_name if tool_name in self._known_tools else "other"
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return client statistics for the diagnostic endpoint."""
+        return {
+            "circuit": self.breaker.stats() if self.breaker is not None else None,
+            "cache": {
+                **self._cache.stats(),
+                "tools": sorted(self._cache_tools)
+            },
+            "single_flight": {
+                "in_flight": len(self._inflight),
+                "upstream_calls": self._flights_started,
+                "coalesced": self._flights_coalesced,
+                "tools": sorted(self._single_flight_tools)
+            }
+        }
+
     async def close(self):
         """Close the HTTP client."""
+        if self._probe is not None:
+            self._probe.cancel()
+            self._probe = None
+
         if self.client:
             try:
                 await self.client.aclose()
             except Exception as e:
-                logger.error(f"Error closing HTTP client: {e}")
+                logger.error("Error closing HTTP client: %s", e)
 
         self._initialized = False
         self.client = None
@@ -0,0 +1,275 @@
+"""Lightweight Prometheus-style metrics (text exposition format, no extra dependencies)."""
+import abc
+import math
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# Latency buckets in seconds, from cache hits to slow multi-tool turns
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric(abc.ABC):
+    """Base class: a named metric family with a fixed set of label names."""
+
+    type_name = ""
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return lines
+
+    @abc.abstractmethod
+    def _samples(self) -> Iterable[str]:
+        """Yield the exposition lines of every labelled value."""
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, description, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> Iterable[str]:
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, description, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str):
+        self._values[self._key(labels)] = value
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> Iterable[str]:
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class CallbackGauge(_Metric):
+    """Gauge whose unlabelled value is read from a callback at scrape time."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, description: str, callback: Callable[[], float]):
+        super().__init__(name, description)
+        self._callback = callback
+
+    def _samples(self) -> Iterable[str]:
+        yield f"{self.name} {_format_value(self._callback())}"
+
+
+class Histogram(_Metric):
+    """Cumulative bucketed distribution of observed values."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * len(self.buckets)
+            self._sums[key] = 0.0
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        self._sums[key] += value
+
+    def count(self, **labels: str) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def _samples(self) -> Iterable[str]:
+        for key, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames + ("le",), key + (_format_value(bound),))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(self._sums[key])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together for a scrape."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, description: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, description, labelnames))
+
+    def gauge(self, name: str, description: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, description, labelnames))
+
+    def callback_gauge(self, name: str, description: str, callback: Callable[[], float]) -> CallbackGauge:
+        return self.register(CallbackGauge(name, description, callback))
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, description, labelnames, buckets))
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Global registry and the service's metrics
+registry = MetricsRegistry()
+
+CHAT_REQUEST_SECONDS = registry.histogram(
+    "secretforge_chat_request_seconds",
+    "End-to-end /api/chat latency.",
+    ("mode", "status")
+)
+CHAT_IN_FLIGHT = registry.gauge(
+    "secretforge_chat_in_flight_requests",
+    "/api/chat requests currently being served.",
+    ("mode",)
+)
+CHAT_DISCONNECTS_TOTAL = registry.counter(
+    "secretforge_chat_disconnects_total",
+    "/api/chat requests cancelled because the client disconnected before the response was complete.",
+    ("mode",)
+)
+UPSTREAM_CALLS_CANCELLED_TOTAL = registry.counter(
+    "secretforge_upstream_calls_cancelled_total",
+    "In-flight LLM completions and MCP tool calls cancelled because their chat request was abandoned.",
+    ("kind",)
+)
+STREAM_TIME_TO_FIRST_CHUNK_SECONDS = registry.histogram(
+    "secretforge_stream_time_to_first_chunk_seconds",
+    "Time from request start to the first streamed chunk."
+)
+LLM_ITERATION_SECONDS = registry.histogram(
+    "secretforge_llm_iteration_seconds",
+    "Latency of one LLM completion in the tool loop (after admission).",
+    ("mode",)
+)
+LLM_HEDGES_TOTAL = registry.counter(
+    "secretforge_llm_hedges_total",
+    "Backup completions fired for slow requests, by whether they answered first (won or lost).",
+    ("outcome",)
+)
+LLM_HEDGES_SKIPPED_TOTAL = registry.counter(
+    "secretforge_llm_hedges_skipped_total",
+    "Hedges not fired for lack of hedge budget or a free LLM slot.",
+    ("reason",)
+)
+TOOL_LOOP_ITERATIONS = registry.histogram(
+    "secretforge_tool_loop_iterations",
+    "LLM completions needed per chat turn.",
+    ("mode",),
+    buckets=(1, 2, 3, 4, 5)
+)
+TOOL_LOOP_EARLY_EXITS_TOTAL = registry.counter(
+    "secretforge_tool_loop_early_exits_total",
+    "Tool loops cut short by a result template or repeated identical tool calls.",
+    ("mode", "reason")
+)
+INTENT_SHORTCUTS_TOTAL = registry.counter(
+    "secretforge_intent_shortcuts_total",
+    "Turns answered by the SCRT/SNIP-20 fast paths without the LLM.",
+    ("intent",)
+)
+MCP_CALL_SECONDS = registry.histogram(
+    "secretforge_mcp_call_seconds",
+    "Latency of upstream MCP tool calls.",
+    ("tool", "outcome")
+)
+MCP_CALLS_TOTAL = registry.counter(
+    "secretforge_mcp_calls_total",
+    "MCP tool calls by how they were served (upstream, cache or coalesced).",
+    ("tool", "source")
+)
+MCP_TOOL_REFRESHES_TOTAL = registry.counter(
+    "secretforge_mcp_tool_refreshes_total",
+    "MCP tool catalog refreshes by outcome (updated, unchanged or error).",
+    ("outcome",)
+)
+MCP_CIRCUIT_REJECTIONS_TOTAL = registry.counter(
+    "secretforge_mcp_circuit_rejections_total",
+    "MCP tool calls failed fast because the circuit breaker was open."
+)
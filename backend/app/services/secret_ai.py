@@ -1,114 +1,340 @@
 """SecretAI integration service using OpenAI-compatible endpoint."""
+import asyncio
+import hashlib
 import json
 import logging
-import re
-from typing import List, Optional, Dict, Any
-from openai import AsyncOpenAI
+import time
+from contextlib import aclosing
+from datetime import datetime, timezone
+from typing import List, Optional, Dict, Any, Set, Tuple
+from openai import BadRequestError
 
 from app.config import settings
+from app.logging_config import SAMPLED
 from app.models import Message
+from app.services.admission import AdmissionController
+from app.services.cache import TTLCache, canonical_key
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.context import ContextBuilder
+from app.services.hedging import HedgePolicy
+from app.services.intent import Intent, IntentMatcher
+from app.services.llm_pool import LLMPool
 from app.services.mcp_client import mcp_client
+from app.services.tool_templates import render_tool_answer
+from app.services.tool_parser import (
+    TOOL_CALL_MARKER,
+    ToolCallParser,
+    parse_relaxed_json,
+    parse_tool_calls,
+    validate_arguments
+)
+from app.services import metrics
+from app.services.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
 # Force rebuild - personality traits system active
 
-# SNIP-20 token symbols that we support
-SNIP20_TOKENS = ['shd', 'silk', 'sscrt', 'stkd-scrt', 'sinj', 'swbtc', 'susdt', 'snobleusdc']
+# Prompt-based tool calling protocol (marker defined in tool_parser)
+MAX_TOOL_ITERATIONS = 5
+COMPLETION_MAX_TOKENS = 512
+
+# Per-request suffix of the system prompt; kept last so the prefix stays cacheable
+WALLET_CONTEXT_TEMPLATE = "\n\nThe user has connected their Keplr wallet with address: {wallet_address}. You can help them with Secret Network transactions, balance queries, and other blockchain operations."
+# Sent when the model repeats tool calls it already has results for
+FINAL_ANSWER_PROMPT = "You already have the results of those tool calls above. Answer my question now using them, without calling any tools."
+MAX_ITERATIONS_MESSAGE = "I apologize, but I've reached the maximum number of tool calls. Please try rephrasing your question."
+
+
+def _backoff_delay(failures: int, minimum: float, maximum: float) -> float:
+    """Doubling retry delay after the given number of consecutive failures (>= 1)."""
+    return min(minimum * 2 ** min(failures - 1, 16), maximum)
+
+
+class _NativeToolsUnsupported(Exception):
+    """The endpoint rejected the tools parameter; the turn is retried with the text protocol."""
+
+
+def _partial_marker_length(text: str) -> int:
+    """Length of the longest suffix of text that is a prefix of the tool-call marker."""
+    upper_tail = text[-(len(TOOL_CALL_MARKER) - 1):].upper()
+    for length in range(len(upper_tail), 0, -1):
+        if TOOL_CALL_MARKER.startswith(upper_tail[-length:]):
+            return length
+    return 0
+
+
+def _text_before_marker(text: str) -> str:
+    """The part of a text-protocol reply shown to the user: everything before the tool-call marker."""
+    marker_pos = text.upper().find(TOOL_CALL_MARKER)
+    return text if marker_pos < 0 else text[:marker_pos]
+
+
+def _join_replies(parts: List[str]) -> str:
+    """Join the visible text of successive completions the way the streaming loop sends it."""
+    return "\n\n".join(part for part in parts if part)
+
 
 class SecretAIService:
     """Service for interacting with SecretAI via OpenAI-compatible endpoint."""
 
     def __init__(self):
         """Initialize SecretAI service."""
-        self.client: Optional[AsyncOpenAI] = None
-        self.model: str = "gemma3:4b"
-        self.base_url: str = "https://secretai-rytn.scrtlabs.com:21434/v1"
+        self.llm_pool: Optional[LLMPool] = None
+        self.model: str = settings.SECRET_AI_MODEL
+        self.base_url: str = settings.SECRET_AI_BASE_URL
         self._initialized = False
+        self._init_lock = asyncio.Lock()
+        self._init_task: Optional[asyncio.Task] = None
         self._last_error: Optional[str] = None
-        self._tools: List[Dict[str, Any]] = []
+        self._tools: List[Dict[str, Any]] = []   # Replaced wholesale on refresh, never mutated
+        self._tool_catalog_version = 0
+        self._tools_refreshed_at: Optional[float] = None
+        self._tools_refresh_error: Optional[str] = None
+        self._tools_refresher: Optional[asyncio.Task] = None
         self._personality_prompt: str = ""  # Built during initialize
+        # Keyed by (native mode, tools offered); reset on tool reload
+        self._system_prompt_prefixes: Dict[Tuple[bool, bool], str] = {}
+        self._native_unsupported_models: Set[str] = set()
+        self._response_cache = TTLCache(
+            max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+            default_ttl=settings.RESPONSE_CACHE_TTL
+        )
+        self._response_cache_latency_saved = 0.0
+        self._prompt_cache_stats = {
+            "renders": 0,
+            "hits": 0,
+            "upstream_prompt_tokens": 0,
+            "upstream_cached_tokens": 0
+        }
+        self._intents = IntentMatcher(settings.snip20_tokens)
+        self._answer_templates = {
+            name.strip() for name in settings.TOOL_ANSWER_TEMPLATES.split(",") if name.strip()
+        }
+        self._context_builder = ContextBuilder(
+            budget=settings.CONTEXT_TOKEN_BUDGET,
+            reserved_completion=COMPLETION_MAX_TOKENS
+        )
+        self.admission = AdmissionController(
+            max_concurrent=settings.LLM_MAX_CONCURRENCY,
+            max_queue=settings.LLM_MAX_QUEUE,
+            queue_timeout=settings.LLM_QUEUE_TIMEOUT,
+            retry_after=settings.LLM_RETRY_AFTER
+        )
+        self.hedge: Optional[HedgePolicy] = None
+        if settings.LLM_HEDGE_ENABLED:
+            self.hedge = HedgePolicy(
+                percentile=settings.LLM_HEDGE_PERCENTILE,
+                min_delay=settings.LLM_HEDGE_MIN_DELAY,
+                max_rate=settings.LLM_HEDGE_MAX_RATE,
+                min_samples=settings.LLM_HEDGE_MIN_SAMPLES,
+                admission=self.admission
+            )
 
     async def initialize(self):
-        """Initialize the SecretAI client."""
+        """
+        Initialize the SecretAI client.
+
+        Runs at most once at a time; callers arriving while another
+        initialization is in progress wait for it instead of repeating it.
+        An unreachable MCP server doesn't fail initialization - the tool
+        catalog is loaded by the background refresh once it comes up.
+        """
         if self._initialized:
             return
 
-        try:
-            if not settings.SECRET_AI_API_KEY:
-                raise ValueError("SECRET_AI_API_KEY environment variable not set")
-
-            logger.info(f"Initializing SecretAI OpenAI-compatible client")
-            logger.info(f"  Endpoint: {self.base_url}")
-            logger.info(f"  Model: {self.model}")
-
-            # Initialize OpenAI client with SecretAI endpoint
-            self.client = AsyncOpenAI(
-                base_url=self.base_url,
-                api_key=settings.SECRET_AI_API_KEY,
-                default_headers={
-                    "X-API-Key": settings.SECRET_AI_API_KEY
-                }
-            )
+        async with self._init_lock:
+            if self._initialized:
+                return
 
-            self._initialized = True
-            logger.info("SecretAI service initialized successfully")
+            try:
+                if not settings.SECRET_AI_API_KEY:
+                    raise ValueError("SECRET_AI_API_KEY environment variable not set")
+
+                logger.info("Initializing SecretAI OpenAI-compatible client")
+
+                # One OpenAI client (and connection pool) per SecretAI endpoint
+                self.llm_pool = LLMPool.from_config(
+                    settings.SECRET_AI_ENDPOINTS,
+                    default_base_url=self.base_url,
+                    default_model=self.model,
+                    api_key=settings.SECRET_AI_API_KEY,
+                    routing=settings.LLM_ROUTING,
+                    eject_after=settings.LLM_ENDPOINT_EJECT_AFTER,
+                    eject_seconds=settings.LLM_ENDPOINT_EJECT_SECONDS
+                )
+                for endpoint in self.llm_pool.endpoints:
+                    logger.info("  Endpoint: %s (model %s)", endpoint.base_url, endpoint.model)
+
+                # Build personality prompt from environment variables
+                self._personality_prompt = self._build_personality_prompt()
+                self._invalidate_system_prompt()
+                logger.info("Personality prompt configured")
+
+                # Initialize MCP client if Secret Network is enabled
+                if settings.ENABLE_SECRET_NETWORK:
+                    logger.info("Secret Network enabled, initializing MCP client...")
+                    # list_tools initializes the MCP client; failures are retried in the background
+                    await self._load_tools()
+                    self._start_tool_refresh()
+
+                self._initialized = True
+                self._last_error = None
+                logger.info("SecretAI service initialized successfully")
+
+            except Exception as e:
+                self._last_error = str(e)
+                logger.error("Failed to initialize SecretAI service: %s", e, exc_info=True)
+                raise
+
+    def start_background_init(self):
+        """Initialize in a background task, retrying with backoff until it succeeds."""
+        if self._initialized or self.initializing():
+            return
+        self._init_task = asyncio.create_task(self._initialize_with_retry())
 
-            # Build personality prompt from environment variables
-            self._personality_prompt = self._build_personality_prompt()
-            logger.info("Personality prompt configured")
+    def initializing(self) -> bool:
+        """Whether a background initialization is still running."""
+        return self._init_task is not None and not self._init_task.done()
 
-            # Initialize MCP client if Secret Network is enabled
-            if settings.ENABLE_SECRET_NETWORK:
-                logger.info("Secret Network enabled, initializing MCP client...")
-                await mcp_client.initialize()
-                await self._load_tools()
+    async def _initialize_with_retry(self):
+        failures = 0
+        while not self._initialized:
+            try:
+                await self.initialize()
+            except Exception:
+                failures += 1
+                delay = _backoff_delay(
+                    failures, settings.STARTUP_RETRY_MIN_BACKOFF, settings.STARTUP_RETRY_MAX_BACKOFF
+                )
+                logger.warning("SecretAI initialization attempt %d failed, retrying in %.0fs", failures, delay)
+                await asyncio.sleep(delay)
+
+    async def close(self):
+        """Stop background tasks and release HTTP connections held by the LLM and MCP clients."""
+        for task in (self._init_task, self._tools_refresher):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._init_task = None
+        self._tools_refresher = None
+
+        await mcp_client.close()
+
+        if self.llm_pool:
+            await self.llm_pool.close()
+
+        self.llm_pool = None
+        self._initialized = False
 
-        except Exception as e:
-            self._last_error = str(e)
-            logger.error(f"Failed to initialize SecretAI service: {e}", exc_info=True)
-            raise
+    async def _load_tools(self) -> bool:
+        """
+        Fetch the MCP tool catalog and swap it in.
 
-    async def _load_tools(self):
-        """Load tools from MCP and build tool descriptions for prompt."""
+        The new list is built aside and assigned in one step, so turns in
+        progress keep the catalog they started with. The cached system
+        prompt is only dropped when the catalog actually changed. Returns
+        False if the server couldn't be reached; the previous catalog is kept.
+        """
         try:
-            mcp_tools = await mcp_client.list_tools()
-            self._tools = []
-
-            for tool in mcp_tools:
-                # Handle both dict and object responses from MCP
-                if isinstance(tool, dict):
-                    tool_name = tool.get("name", "")
-                    tool_description = tool.get("description", "")
-                    tool_params = tool.get("inputSchema", {
-                        "type": "object",
-                        "properties": {},
-                        "required": []
-                    })
-                else:
-                    tool_name = tool.name
-                    tool_description = tool.description or ""
-                    tool_params = tool.inputSchema if hasattr(tool, 'inputSchema') else {
-                        "type": "object",
-                        "properties": {},
-                        "required": []
-                    }
-
-                # Store tool metadata for prompt-based calling
-                tool_info = {
-                    "name": tool_name,
-                    "description": tool_description,
-                    "parameters": tool_params
+            mcp_tools = await mcp_client.list_tools(raise_on_error=True)
+        except Exception as e:
+            self._tools_refresh_error = str(e)
+            metrics.MCP_TOOL_REFRESHES_TOTAL.inc(outcome="error")
+            logger.warning("Could not load MCP tools, keeping %d known tools: %s", len(self._tools), e)
+            return False
+
+        tools = []
+        for tool in mcp_tools:
+            # Handle both dict and object responses from MCP
+            if isinstance(tool, dict):
+                tool_name = tool.get("name", "")
+                tool_description = tool.get("description", "")
+                tool_params = tool.get("inputSchema", {
+                    "type": "object",
+                    "properties": {},
+                    "required": []
+                })
+            else:
+                tool_name = tool.name
+                tool_description = tool.description or ""
+                tool_params = tool.inputSchema if hasattr(tool, 'inputSchema') else {
+                    "type": "object",
+                    "properties": {},
+                    "required": []
                 }
-                self._tools.append(tool_info)
-                logger.info(f"Loaded tool: {tool_name}")
 
-            logger.info(f"Loaded {len(self._tools)} MCP tools")
-        except Exception as e:
-            logger.error(f"Failed to load MCP tools: {e}")
-            import traceback
-            traceback.print_exc()
-            self._tools = []
+            # Store tool metadata for prompt-based calling
+            tools.append({
+                "name": tool_name,
+                "description": tool_description,
+                "parameters": tool_params
+            })
+
+        self._tools_refreshed_at = time.time()
+        self._tools_refresh_error = None
+        if self._tool_catalog_version and tools == self._tools:
+            metrics.MCP_TOOL_REFRESHES_TOTAL.inc(outcome="unchanged")
+            logger.debug("MCP tool catalog unchanged (%d tools)", len(tools))
+            return True
+
+        self._tools = tools
+        self._tool_catalog_version += 1
+        self._invalidate_system_prompt()
+        metrics.MCP_TOOL_REFRESHES_TOTAL.inc(outcome="updated")
+        logger.info(
+            "Loaded %d MCP tools (catalog version %d): %s",
+            len(tools), self._tool_catalog_version, ", ".join(tool["name"] for tool in tools)
+        )
+        return True
+
+    def _start_tool_refresh(self):
+        if self._tools_refresher is None or self._tools_refresher.done():
+            self._tools_refresher = asyncio.create_task(self._refresh_tools_periodically())
+
+    async def _refresh_tools_periodically(self):
+        """Reload the tool catalog every MCP_TOOLS_REFRESH_INTERVAL, backing off after failures."""
+        failures = 0 if self._tools_refreshed_at else 1
+        while True:
+            delay = self._tool_refresh_delay(failures)
+            if delay is None:
+                return
+            await asyncio.sleep(delay)
+            if await self._load_tools():
+                failures = 0
+            else:
+                failures += 1
+
+    @staticmethod
+    def _tool_refresh_delay(failures: int) -> Optional[float]:
+        """Seconds until the next refresh; None when periodic refresh is disabled and nothing failed."""
+        if failures:
+            return _backoff_delay(
+                failures, settings.MCP_TOOLS_REFRESH_MIN_BACKOFF, settings.MCP_TOOLS_REFRESH_MAX_BACKOFF
+            )
+        if settings.MCP_TOOLS_REFRESH_INTERVAL <= 0:
+            return None
+        return settings.MCP_TOOLS_REFRESH_INTERVAL
+
+    def has_tool(self, name: str) -> bool:
+        """Whether the loaded MCP tool catalog contains a tool with this name."""
+        return any(tool.get("name") == name for tool in self._tools)
+
+    def get_tool_catalog_stats(self) -> Dict[str, Any]:
+        """Tool catalog version and refresh state for the diagnostic endpoint."""
+        return {
+            "version": self._tool_catalog_version,
+            "tools": len(self._tools),
+            "last_refresh": (
+                datetime.fromtimestamp(self._tools_refreshed_at, timezone.utc).isoformat()
+                if self._tools_refreshed_at else None
+            ),
+            "last_error": self._tools_refresh_error,
+            "refresh_interval": settings.MCP_TOOLS_REFRESH_INTERVAL
+        }
 
     def _build_tool_descriptions(self) -> str:
         """Build tool descriptions string for system prompt."""
@@ -171,157 +397,120 @@ class SecretAIService:
         return ""
 
     def _extract_tool_calls_from_text(self, text: str) -> List[Dict[str, Any]]:
-        """Extract tool calls from AI response text using regex pattern."""
-        # Pattern: USE_TOOL: tool_name with arguments {...}
-        pattern = r'USE_TOOL:\s*(\w+)\s+with\s+arguments\s*(\{[^}]*\})'
-        matches = re.findall(pattern, text, re.IGNORECASE)
-
-        tool_calls = []
-        for tool_name, args_str in matches:
-            try:
-                # Parse JSON arguments
-                arguments = json.loads(args_str) if args_str.strip() != '{}' else {}
-                tool_calls.append({
-                    "name": tool_name,
-                    "arguments": arguments
-                })
-            except json.JSONDecodeError:
-                logger.warning(f"Failed to parse arguments for tool {tool_name}: {args_str}")
-                # Try with empty arguments
-                tool_calls.append({
-                    "name": tool_name,
-                    "arguments": {}
-                })
-
-        return tool_calls
+        """Extract and validate the tool calls in a complete AI response."""
+        return self._validate_tool_calls(parse_tool_calls(text))
 
-    def _detect_snip20_query(self, message: str) -> Optional[str]:
-        """
-        Detect if the message is asking for a SNIP-20 token balance.
-        Returns the token symbol if detected, None otherwise.
+    def _validate_tool_calls(self, tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
-        message_lower = message.lower()
-
-        # Check for each SNIP-20 token
-        for token in SNIP20_TOKENS:
-            # Pattern: "my {token} balance", "{token} balance", "check {token}", "how much {token}"
-            patterns = [
-                rf'\b{token}\s+balance\b',
-                rf'\bmy\s+{token}\b',
-                rf'\bcheck\s+{token}\b',
-                rf'\bhow\s+much\s+{token}\b',
-                rf'\b{token}\s+amount\b',
-                rf'\bbalance\s+of\s+{token}\b',
-                rf'\bquery\s+{token}\b'
-            ]
-
-            for pattern in patterns:
-                if re.search(pattern, message_lower):
-                    logger.info(f"🎯 Detected SNIP-20 query for token: {token}")
-                    return token
-
-        return None
-
-    def _detect_scrt_query(self, message: str) -> bool:
-        """
-        Detect if the message is asking for SCRT (native token) balance.
-        Returns True if SCRT query detected, False otherwise.
-        """
-        message_lower = message.lower()
-
-        # Patterns to detect SCRT balance queries
-        patterns = [
-            r'\bscrt\s+balance\b',
-            r'\bmy\s+scrt\b',
-            r'\bcheck\s+scrt\b',
-            r'\bhow\s+much\s+scrt\b',
-            r'\bscrt\s+amount\b',
-            r'\bbalance\s+of\s+scrt\b',
-            r'\bquery\s+scrt\b',
-            r'\bshow\s+scrt\b',
-            r'\bscrt\s+(token|tokens)\b',
-            r'\b(my|check|show|query)\s+(native\s+)?balance\b',  # Generic balance query
-            r'\bhow\s+much\s+(native\s+)?balance\b'
-        ]
+        Check parsed calls against the loaded tools' input schemas.
 
-        for pattern in patterns:
-            if re.search(pattern, message_lower):
-                logger.info(f"🎯 Detected SCRT balance query")
-                return True
-
-        return False
+        Calls that fail get an "error" entry instead of being dispatched, so
+        the model sees what was wrong rather than a result for empty arguments.
+        """
+        tools = {tool["name"]: tool for tool in self._tools}
+        for call in tool_calls:
+            if "error" in call:
+                pass
+            elif call["name"] not in tools:
+                call["error"] = f"unknown tool: {call['name']}"
+            else:
+                error = validate_arguments(call["arguments"], tools[call["name"]].get("parameters"))
+                if error:
+                    call["error"] = error
+            if "error" in call:
+                logger.warning("Rejected call to tool %s: %s", call["name"], call["error"])
+        return tool_calls
 
-    async def chat(
+    def _shortcut_response(
         self,
         message: str,
-        history: List[Message] = None,
-        wallet_address: Optional[str] = None,
-        viewing_keys: Optional[Dict[str, str]] = None,
         snip_balances: Optional[Dict[str, Dict]] = None,
         scrt_balance: Optional[Dict] = None
-    ) -> str:
+    ) -> Optional[str]:
         """
-        Send a chat message and get response using prompt-based tool calling.
+        Answer balance queries directly from pre-fetched wallet data.
+        Returns the response text, or None if the LLM should handle the message.
+        """
+        with tracer.span("intent.detect") as span:
+            intent = self._intents.classify(message)
+            if intent.kind is None:
+                return None
+
+            response = self._shortcut_for_intent(intent, snip_balances, scrt_balance)
+            if span is not None:
+                span.set_attribute("intent", intent.kind)
+                span.set_attribute("shortcut", response is not None)
+            if response is not None:
+                metrics.INTENT_SHORTCUTS_TOTAL.inc(intent=intent.kind)
+            return response
+
+    def _shortcut_for_intent(
+        self,
+        intent: Intent,
+        snip_balances: Optional[Dict[str, Dict]],
+        scrt_balance: Optional[Dict]
+    ) -> Optional[str]:
+        """Build the fast-path answer for a detected balance intent, if one applies."""
+
+        # PRE-PROCESSING: Use pre-fetched SCRT balance from frontend
+        if intent.kind == "scrt":
+            if not scrt_balance:
+                # No pre-fetched balance available - inform user they need to connect wallet
+                return "To check your SCRT balance, please connect your Keplr wallet."
 
-        Args:
-            message: User message
-            history: Previous conversation history
-            wallet_address: Connected Keplr wallet address (optional)
-            viewing_keys: SNIP-20 viewing keys from Keplr (optional)
-            snip_balances: Pre-fetched SNIP-20 balances from frontend (optional)
-            scrt_balance: Pre-fetched SCRT balance from frontend (optional)
+            logger.info("✅ Using pre-fetched SCRT balance from wallet", extra=SAMPLED)
 
-        Returns:
-            AI response text
-        """
-        if not self._initialized:
-            await self.initialize()
+            if scrt_balance.get("success"):
+                formatted = scrt_balance.get("formatted", "0.000000")
 
-        try:
-            # PRE-PROCESSING: Use pre-fetched SCRT balance from frontend
-            if self._detect_scrt_query(message) and scrt_balance:
-                logger.info(f"✅ Using pre-fetched SCRT balance from wallet")
+                # Return formatted response
+                return f"Your SCRT balance is {formatted} SCRT"
+            else:
+                error = scrt_balance.get("error", "Unknown error")
+                return f"Sorry, I couldn't retrieve your SCRT balance: {error}"
 
-                if scrt_balance.get("success"):
-                    formatted = scrt_balance.get("formatted", "0.000000")
+        # PRE-PROCESSING: Use pre-fetched SNIP-20 balances from frontend
+        detected_token = intent.token
+        if detected_token and snip_balances:
+            # Check if we have a pre-fetched balance for this token
+            if detected_token.lower() in snip_balances:
+                logger.info("✅ Using pre-fetched balance for %s", detected_token.upper(), extra=SAMPLED)
+                balance_data = snip_balances[detected_token.lower()]
+
+                if balance_data.get("success"):
+                    formatted = balance_data.get("formatted", "0.00")
+                    token_symbol = balance_data.get("token", detected_token.upper())
 
                     # Return formatted response
-                    return f"Your SCRT balance is {formatted} SCRT"
+                    return f"Your {token_symbol} balance is {formatted} {token_symbol}"
                 else:
-                    error = scrt_balance.get("error", "Unknown error")
-                    return f"Sorry, I couldn't retrieve your SCRT balance: {error}"
-            elif self._detect_scrt_query(message):
-                # No pre-fetched balance available - inform user they need to connect wallet
-                return "To check your SCRT balance, please connect your Keplr wallet."
+                    error = balance_data.get("error", "Unknown error")
+                    return f"Sorry, I couldn't retrieve your {detected_token.upper()} balance: {error}"
+        elif detected_token:
+            # No pre-fetched balances available - inform user they need to check via Keplr
+            return f"To check your {detected_token.upper()} balance, please use your Keplr wallet. SNIP-20 token balances require viewing keys which can only be managed through your wallet."
+
+        return None
+
+    def _tools_offered(self) -> bool:
+        """Whether tools go into this turn's prompt: loaded, and the MCP circuit isn't open."""
+        return bool(self._tools) and mcp_client.tools_available()
+
+    def _render_system_prompt_prefix(self, native: bool = False, tools: bool = True) -> str:
+        """Render the request-independent part of the system prompt (tools section only if tools)."""
+        if tools and native:
+            # Tool names, descriptions and schemas travel in the tools parameter
+            system_prompt = """You are a helpful AI assistant with access to Secret Network blockchain tools.
+
+Important:
+- For SCRT balance queries, use secret_query_balance
+- For SNIP-20 token balances (SHD, SILK, stkd-SCRT, etc.), these are only available via the user's Keplr wallet
 
-            # PRE-PROCESSING: Use pre-fetched SNIP-20 balances from frontend
-            detected_token = self._detect_snip20_query(message)
-            if detected_token and snip_balances:
-                # Check if we have a pre-fetched balance for this token
-                if detected_token.lower() in snip_balances:
-                    logger.info(f"✅ Using pre-fetched balance for {detected_token.upper()}")
-                    balance_data = snip_balances[detected_token.lower()]
-
-                    if balance_data.get("success"):
-                        formatted = balance_data.get("formatted", "0.00")
-                        token_symbol = balance_data.get("token", detected_token.upper())
-
-                        # Return formatted response
-                        return f"Your {token_symbol} balance is {formatted} {token_symbol}"
-                    else:
-                        error = balance_data.get("error", "Unknown error")
-                        return f"Sorry, I couldn't retrieve your {detected_token.upper()} balance: {error}"
-            elif detected_token:
-                # No pre-fetched balances available - inform user they need to check via Keplr
-                return f"To check your {detected_token.upper()} balance, please use your Keplr wallet. SNIP-20 token balances require viewing keys which can only be managed through your wallet."
-
-            # Build message history in OpenAI format
-            messages = []
-
-            # Add system prompt with tool descriptions if tools available
-            if self._tools:
-                tool_descriptions = self._build_tool_descriptions()
-                system_prompt = f"""You are a helpful AI assistant with access to Secret Network blockchain tools.
+Only use tools when needed. For general questions, respond normally."""
+        # Add system prompt with tool descriptions if tools available
+        elif tools and self._tools:
+            tool_descriptions = self._build_tool_descriptions()
+            system_prompt = f"""You are a helpful AI assistant with access to Secret Network blockchain tools.
 
 Available tools:
 {tool_descriptions}
@@ -338,115 +527,757 @@ Important:
 - For SNIP-20 token balances (SHD, SILK, stkd-SCRT, etc.), these are only available via the user's Keplr wallet
 
 Only use tools when needed. For general questions, respond normally."""
+        else:
+            # For simple agents without tools, create basic system prompt with personality
+            system_prompt = "You are a helpful AI assistant."
 
-                # Enhance system prompt with wallet context
-                if wallet_address:
-                    system_prompt += f"\n\nThe user has connected their Keplr wallet with address: {wallet_address}. You can help them with Secret Network transactions, balance queries, and other blockchain operations."
+        # Add personality traits to system prompt
+        return system_prompt + self._personality_prompt
 
-                # Add personality traits to system prompt
-                system_prompt += self._personality_prompt
+    def _invalidate_system_prompt(self):
+        """Drop the rendered prompt prefixes; call whenever tools or personality change."""
+        self._system_prompt_prefixes = {}
 
-                messages.append({"role": "system", "content": system_prompt})
-            else:
-                # For simple agents without tools, create basic system prompt with personality
-                system_prompt = "You are a helpful AI assistant."
-
-                # Add personality traits to system prompt
-                system_prompt += self._personality_prompt
-
-                messages.append({"role": "system", "content": system_prompt})
-
-            # Add conversation history
-            if history:
-                for msg in history[-10:]:  # Last 10 messages
-                    messages.append({"role": msg.role, "content": msg.content})
-
-            # Add current message
-            messages.append({"role": "user", "content": message})
-
-            # Tool calling loop
-            max_iterations = 5
-            for iteration in range(max_iterations):
-                logger.info(f"Tool calling iteration {iteration + 1}/{max_iterations}")
-
-                # Prepare request kwargs (NO tools parameter)
-                request_kwargs = {
-                    "model": self.model,
-                    "messages": messages,
-                    "stream": False,
-                    "max_tokens": 512,  # Limit response length
-                    "temperature": 0.7   # Balanced creativity/focus
+    def _build_system_prompt(self, wallet_address: Optional[str] = None, native: bool = False) -> str:
+        """
+        Build the system prompt from the cached static prefix.
+
+        The prefix (instructions, tools, personality) is rendered once and
+        reused byte-for-byte, so upstream prompt/KV caching can match it;
+        the only per-request part, the wallet context, goes at the very end.
+        While the MCP circuit is open the tools section is left out, so the
+        model doesn't attempt calls that would only fail.
+        """
+        tools = self._tools_offered()
+        system_prompt = self._system_prompt_prefixes.get((native, tools))
+        if system_prompt is None:
+            system_prompt = self._render_system_prompt_prefix(native, tools)
+            self._system_prompt_prefixes[(native, tools)] = system_prompt
+            self._prompt_cache_stats["renders"] += 1
+        else:
+            self._prompt_cache_stats["hits"] += 1
+
+        # Enhance system prompt with wallet context
+        if tools and wallet_address:
+            system_prompt += WALLET_CONTEXT_TEMPLATE.format(wallet_address=wallet_address)
+
+        return system_prompt
+
+    def _record_upstream_usage(self, response: Any):
+        """
+        Track prompt tokens the upstream server reports as served from its
+        prompt cache, from a completion or the final chunk of a stream.
+        """
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        self._prompt_cache_stats["upstream_prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", 0) if details is not None else 0
+        self._prompt_cache_stats["upstream_cached_tokens"] += cached or 0
+
+    def get_prompt_cache_stats(self) -> Dict[str, Any]:
+        """Return system prompt cache counters for the diagnostic endpoint."""
+        stats = dict(self._prompt_cache_stats)
+        prompt_tokens = stats["upstream_prompt_tokens"]
+        stats["upstream_cached_ratio"] = (
+            round(stats["upstream_cached_tokens"] / prompt_tokens, 4) if prompt_tokens else 0.0
+        )
+        return stats
+
+    def _build_messages(
+        self,
+        message: str,
+        history: List[Message] = None,
+        wallet_address: Optional[str] = None,
+        native: bool = False
+    ) -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
+        """
+        Build the OpenAI-format message list: system prompt, as much recent
+        history as fits the context budget, and the user message.
+
+        Returns the messages and the estimated token usage.
+        """
+        with tracer.span("prompt.build") as span:
+            system_prompt = self._build_system_prompt(wallet_address, native)
+            messages, usage = self._context_builder.build(system_prompt, history, message)
+            if span is not None:
+                span.set_attribute("prompt_tokens", usage["prompt_tokens"])
+                span.set_attribute("history_messages_used", usage["history_messages_used"])
+
+        logger.info(
+            "Context: ~%d prompt tokens (system %d, history %d, %d/%d messages, %d dropped)",
+            usage["prompt_tokens"], usage["system_tokens"], usage["history_tokens"],
+            usage["history_messages_used"], usage["history_messages"], usage["history_messages_dropped"],
+            extra=SAMPLED
+        )
+        return messages, usage
+
+    def _completion_kwargs(
+        self,
+        messages: List[Dict[str, Any]],
+        stream: bool,
+        temperature: float = 0.7,
+        native: bool = False,
+        max_tokens: int = COMPLETION_MAX_TOKENS,
+        allow_tools: bool = True,
+        model: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Build request kwargs for a tool-loop completion (tools parameter only
+        in native mode). model pins the request to the pool endpoints serving it.
+        """
+        request_kwargs = {
+            "model": model or self.model,
+            "messages": messages,
+            "stream": stream,
+            "max_tokens": max_tokens,   # Limit response length
+            "temperature": temperature   # 0.7 = balanced creativity/focus
+        }
+        if stream:
+            # Final chunk carries token usage, including upstream prompt cache hits
+            request_kwargs["stream_options"] = {"include_usage": True}
+        if native:
+            request_kwargs["tools"] = self._native_tool_specs()
+            if not allow_tools:
+                request_kwargs["tool_choice"] = "none"
+        return request_kwargs
+
+    @staticmethod
+    def _iteration_params(iteration: int, temperature: float) -> Tuple[float, int]:
+        """
+        (temperature, max_tokens) for a tool-loop iteration. Completions after
+        tool results mostly restate data, so they run cooler and shorter.
+        """
+        if iteration == 0:
+            return temperature, COMPLETION_MAX_TOKENS
+        return min(temperature, settings.TOOL_FOLLOWUP_TEMPERATURE), settings.TOOL_FOLLOWUP_MAX_TOKENS
+
+    @staticmethod
+    def _repeats_earlier_calls(tool_calls: List[Dict[str, Any]], seen: Set[str]) -> bool:
+        """Record this iteration's calls; True if every one was already made this turn."""
+        keys = {canonical_key(call["name"], call["arguments"]) for call in tool_calls}
+        repeated = keys <= seen
+        seen.update(keys)
+        return repeated
+
+    def _template_answer(self, tool_calls: List[Dict[str, Any]], results: List[str]) -> Optional[str]:
+        """Answer straight from templated tool results, skipping the follow-up completion."""
+        if not self._answer_templates:
+            return None
+        return render_tool_answer(tool_calls, results, self._answer_templates)
+
+    def _use_native_tools(self, model: Optional[str] = None) -> bool:
+        """Whether a turn on model (default: SECRET_AI_MODEL) should use native function calling instead of USE_TOOL: text."""
+        mode = settings.NATIVE_TOOL_CALLING.lower()
+        if mode == "off" or not self._tools_offered():
+            return False
+        return mode == "on" or (model or self.model) not in self._native_unsupported_models
+
+    def _turn_model(self) -> str:
+        """
+        Model a chat turn runs on: that of the pool endpoint the turn would
+        start on. All of the turn's completions stay on endpoints serving it.
+        """
+        if self.llm_pool is None:
+            return self.model
+        return self.llm_pool.choose_model()
+
+    def get_endpoint_stats(self) -> Dict[str, Any]:
+        """Return per-endpoint routing and health state for the diagnostic endpoint."""
+        if self.llm_pool is None:
+            return {"routing": settings.LLM_ROUTING, "failovers": 0, "endpoints": []}
+        return self.llm_pool.stats()
+
+    def get_hedge_stats(self) -> Dict[str, Any]:
+        """Return hedged-completion counters for the diagnostic endpoint."""
+        if self.hedge is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.hedge.stats()}
+
+    def get_tool_calling_stats(self) -> Dict[str, Any]:
+        """Return the tool-calling protocol state for the diagnostic endpoint."""
+        return {
+            "mode": settings.NATIVE_TOOL_CALLING.lower(),
+            "native": self._use_native_tools(),
+            "native_unsupported_models": sorted(self._native_unsupported_models)
+        }
+
+    def _native_tool_specs(self) -> List[Dict[str, Any]]:
+        """Loaded MCP tools in the OpenAI tools format."""
+        return [
+            {
+                "type": "function",
+                "function": {
+                    "name": tool["name"],
+                    "description": tool["description"],
+                    "parameters": tool["parameters"]
                 }
+            }
+            for tool in self._tools
+        ]
 
-                # Call LLM
-                response = await self.client.chat.completions.create(**request_kwargs)
-                assistant_content = response.choices[0].message.content or ""
+    def _native_fallback(self, error: BadRequestError, model: str) -> _NativeToolsUnsupported:
+        """
+        Handle a rejected native-tools request: in auto mode remember that the
+        model that rejected it doesn't support tools and signal a
+        text-protocol retry, otherwise re-raise.
+        """
+        message = str(error).lower()
+        if settings.NATIVE_TOOL_CALLING.lower() != "auto" or ("tool" not in message and "function" not in message):
+            raise error
+        logger.warning("Model %s rejected native tool calling, using the text protocol: %s", model, error)
+        self._native_unsupported_models.add(model)
+        return _NativeToolsUnsupported(str(error))
+
+    def _parse_native_tool_calls(self, raw_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Turn structured tool_calls (id, name, JSON arguments string) into validated calls."""
+        tool_calls = []
+        for index, raw in enumerate(raw_calls):
+            call = {"id": raw.get("id") or f"call_{index}", "name": raw.get("name") or "", "arguments": {}}
+            try:
+                arguments = parse_relaxed_json(raw.get("arguments") or "{}")
+                if isinstance(arguments, dict):
+                    call["arguments"] = arguments
+                else:
+                    call["error"] = "arguments must be a JSON object"
+            except ValueError as e:
+                call["error"] = str(e)
+            tool_calls.append(call)
+        return self._validate_tool_calls(tool_calls)
+
+    @staticmethod
+    def _native_assistant_message(content: str, tool_calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Assistant message echoing the model's tool calls, as the tools API expects."""
+        return {
+            "role": "assistant",
+            "content": content or None,
+            "tool_calls": [
+                {
+                    "id": call["id"],
+                    "type": "function",
+                    "function": {"name": call["name"], "arguments": json.dumps(call["arguments"])}
+                }
+                for call in tool_calls
+            ]
+        }
 
-                logger.info(f"AI response: {assistant_content[:200]}...")
+    def _response_cache_key(
+        self,
+        model: str,
+        message: str,
+        history: Optional[List[Message]],
+        wallet_address: Optional[str],
+        viewing_keys: Optional[Dict[str, str]],
+        snip_balances: Optional[Dict[str, Dict]],
+        scrt_balance: Optional[Dict]
+    ) -> Optional[str]:
+        """
+        Return the response cache key for this turn, or None if it must not be cached.
 
-                # Extract tool calls from text
-                tool_calls = self._extract_tool_calls_from_text(assistant_content)
+        Turns carrying wallet context are user-specific and never cached.
+        Answers are keyed by the model the turn runs on.
+        """
+        if not settings.RESPONSE_CACHE_ENABLED:
+            return None
+        if wallet_address or viewing_keys or snip_balances or scrt_balance:
+            return None
+
+        normalized = " ".join(message.lower().split()).rstrip(" ?!.")
+        digest = hashlib.sha256()
+        tool_names = ",".join(tool["name"] for tool in self._tools) if self._tools_offered() else ""
+        for part in (model, self._personality_prompt, tool_names, normalized):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        for msg in history or []:
+            digest.update(f"{msg.role}:{msg.content}".encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _cached_response(self, cache_key: Optional[str]) -> Optional[str]:
+        """Return a cached response for cache_key, if any."""
+        if cache_key is None:
+            return None
+        found, entry = self._response_cache.get(cache_key)
+        if not found:
+            return None
+        response, latency = entry
+        self._response_cache_latency_saved += latency
+        logger.info("Response cache hit (saved ~%.2fs)", latency, extra=SAMPLED)
+        return response
+
+    def _store_response(self, cache_key: Optional[str], response: str, started: float):
+        """Cache a final response together with the time it took to produce."""
+        if cache_key is None or not response:
+            return
+        self._response_cache.set(cache_key, (response, time.monotonic() - started))
+
+    def _turn_temperature(self, cache_key: Optional[str]) -> float:
+        """Sampling temperature for a turn; cacheable turns can be made deterministic."""
+        if cache_key is not None and settings.RESPONSE_CACHE_DETERMINISTIC:
+            return 0.0
+        return 0.7
+
+    def get_response_cache_stats(self) -> Dict[str, Any]:
+        """Return response cache counters for the diagnostic endpoint."""
+        return {
+            "enabled": settings.RESPONSE_CACHE_ENABLED,
+            **self._response_cache.stats(),
+            "latency_saved_seconds": round(self._response_cache_latency_saved, 3)
+        }
+
+    async def _create_completion(self, request_kwargs: Dict[str, Any]):
+        """
+        Run a non-streaming completion on the endpoint pool once admitted by
+        the LLM concurrency limiter, hedging slow ones if enabled.
+        """
+        async with self.admission.slot():
+            started = time.monotonic()
+            try:
+                response = await self.llm_pool.create(request_kwargs, hedge=self.hedge)
+            except asyncio.CancelledError:
+                metrics.UPSTREAM_CALLS_CANCELLED_TOTAL.inc(kind="llm")
+                raise
+            metrics.LLM_ITERATION_SECONDS.observe(time.monotonic() - started, mode="simple")
+        self._record_upstream_usage(response)
+        return response
+
+    async def _stream_completion(
+        self,
+        request_kwargs: Dict[str, Any],
+        tool_calls: Optional[Dict[int, Dict[str, str]]] = None,
+        stop: Optional[asyncio.Event] = None
+    ):
+        """
+        Stream a completion's text deltas, holding an LLM slot until the stream ends.
 
-                if tool_calls:
-                    logger.info(f"Found {len(tool_calls)} tool calls in response")
-
-                    # Add assistant message to history
-                    messages.append({
-                        "role": "assistant",
-                        "content": assistant_content
-                    })
-
-                    # Execute each tool call
-                    tool_results = []
-                    for tool_call in tool_calls:
-                        tool_name = tool_call["name"]
-                        tool_args = tool_call["arguments"]
-
-                        logger.info(f"Executing tool: {tool_name} with args: {tool_args}")
-
-                        try:
-                            # Call MCP tool
-                            tool_result = await mcp_client.call_tool(tool_name, tool_args)
-                            result_str = json.dumps(tool_result)
-                            tool_results.append(f"{tool_name}: {result_str}")
-                            logger.info(f"Tool {tool_name} result: {result_str[:200]}...")
-                        except Exception as e:
-                            logger.error(f"Tool execution failed: {e}")
-                            error_str = json.dumps({"error": str(e)})
-                            tool_results.append(f"{tool_name}: {error_str}")
-
-                    # Add tool results to messages as user message
-                    results_message = "Tool results:\n" + "\n".join(tool_results)
-                    messages.append({
-                        "role": "user",
-                        "content": results_message
-                    })
+        Structured tool-call deltas (native mode) are accumulated into
+        tool_calls, keyed by their index, when a dict is passed. Setting stop
+        ends the completion early: the next step returns without reading
+        more, which releases the slot and closes the upstream stream.
+        """
+        async with self.admission.slot(), aclosing(self.llm_pool.stream(request_kwargs)) as chunks:
+            started = time.monotonic()
+            try:
+                async for chunk in chunks:
+                    if getattr(chunk, "usage", None) is not None:
+                        self._record_upstream_usage(chunk)
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta
+                    if tool_calls is not None:
+                        for fragment in getattr(delta, "tool_calls", None) or []:
+                            call = tool_calls.setdefault(fragment.index, {"id": "", "name": "", "arguments": ""})
+                            call["id"] = fragment.id or call["id"]
+                            function = getattr(fragment, "function", None)
+                            if function is not None:
+                                call["name"] += function.name or ""
+                                call["arguments"] += function.arguments or ""
+                    text = getattr(delta, "content", None)
+                    if text:
+                        yield text
+                        if stop is not None and stop.is_set():
+                            break
+            except (asyncio.CancelledError, GeneratorExit):
+                # Consumer gone mid-completion (client disconnected)
+                metrics.UPSTREAM_CALLS_CANCELLED_TOTAL.inc(kind="llm")
+                raise
+            metrics.LLM_ITERATION_SECONDS.observe(time.monotonic() - started, mode="stream")
+
+    async def _run_tool_calls(self, tool_calls: List[Dict[str, Any]]) -> List[str]:
+        """
+        Execute tool calls via MCP and return each call's JSON result.
+
+        Calls run concurrently (bounded by TOOL_CALL_CONCURRENCY), each with its
+        own TOOL_CALL_TIMEOUT. Results keep the order the model requested them in.
+        """
+        semaphore = asyncio.Semaphore(max(1, settings.TOOL_CALL_CONCURRENCY))
+
+        async def run(tool_call: Dict[str, Any]) -> str:
+            tool_name = tool_call["name"]
+            tool_args = tool_call["arguments"]
+
+            if "error" in tool_call:
+                # Invalid call: report back to the model without touching MCP
+                return json.dumps({"error": f"Invalid tool call: {tool_call['error']}"})
+
+            async with semaphore:
+                logger.info("Executing tool: %s", tool_name, extra=SAMPLED)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Tool %s args: %s", tool_name, json.dumps(tool_args))
+
+                try:
+                    # Call MCP tool
+                    tool_result = await asyncio.wait_for(
+                        mcp_client.call_tool(tool_name, tool_args),
+                        timeout=settings.TOOL_CALL_TIMEOUT
+                    )
+                    result_str = json.dumps(tool_result)
+                    logger.debug("Tool %s result: %.200s", tool_name, result_str)
+                except asyncio.CancelledError:
+                    metrics.UPSTREAM_CALLS_CANCELLED_TOTAL.inc(kind="mcp")
+                    raise
+                except asyncio.TimeoutError:
+                    logger.error("Tool %s timed out after %ss", tool_name, settings.TOOL_CALL_TIMEOUT)
+                    result_str = json.dumps({"error": f"Tool call timed out after {settings.TOOL_CALL_TIMEOUT}s"})
+                except CircuitOpenError as e:
+                    logger.warning("Tool %s not called: %s", tool_name, e, extra=SAMPLED)
+                    result_str = json.dumps({"error": str(e)})
+                except Exception as e:
+                    logger.error("Tool %s execution failed: %s", tool_name, e)
+                    result_str = json.dumps({"error": str(e)})
+
+            return result_str
+
+        return list(await asyncio.gather(*(run(tool_call) for tool_call in tool_calls)))
+
+    async def _execute_tool_calls(self, tool_calls: List[Dict[str, Any]]) -> str:
+        """Execute tool calls and return the text-protocol results message for the LLM."""
+        return self._format_tool_results(tool_calls, await self._run_tool_calls(tool_calls))
+
+    @staticmethod
+    def _format_tool_results(tool_calls: List[Dict[str, Any]], results: List[str]) -> str:
+        return "Tool results:\n" + "\n".join(
+            f"{tool_call['name']}: {result}" for tool_call, result in zip(tool_calls, results)
+        )
+
+    async def _append_tool_results(
+        self,
+        messages: List[Dict[str, Any]],
+        assistant_content: str,
+        tool_calls: List[Dict[str, Any]],
+        native: bool
+    ) -> List[str]:
+        """Run the tool calls and record them and their results in the conversation."""
+        results = await self._run_tool_calls(tool_calls)
+        if native:
+            messages.append(self._native_assistant_message(assistant_content, tool_calls))
+            for tool_call, result in zip(tool_calls, results):
+                messages.append({"role": "tool", "tool_call_id": tool_call["id"], "content": result})
+        else:
+            messages.append({
+                "role": "assistant",
+                "content": assistant_content
+            })
+            # Add tool results to messages as user message
+            messages.append({
+                "role": "user",
+                "content": self._format_tool_results(tool_calls, results)
+            })
+        return results
+
+    async def _tool_loop(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: float,
+        native: bool,
+        turn: Dict[str, Any]
+    ) -> str:
+        """
+        Run the non-streaming tool loop over prepared messages and return the answer.
+
+        The answer is the text the streaming loop would send: any text before
+        a tool call (e.g. "Let me check that.") followed by the final reply.
+        Completions run on turn["model"]. Sets turn["used_tools"] once any tool
+        call has been executed and turn["final"] when the model answered
+        (rather than hitting the limit).
+        """
+        seen_calls: Set[str] = set()
+        force_answer = False
+        # Visible text of the completions that called tools
+        shown: List[str] = []
+
+        for iteration in range(MAX_TOOL_ITERATIONS):
+            logger.info("Tool calling iteration %d/%d", iteration + 1, MAX_TOOL_ITERATIONS, extra=SAMPLED)
+
+            with tracer.span("llm.iteration", iteration=iteration + 1, mode="simple") as span:
+                # Call LLM
+                iteration_temperature, max_tokens = self._iteration_params(iteration, temperature)
+                request_kwargs = self._completion_kwargs(
+                    messages, stream=False, temperature=iteration_temperature, native=native,
+                    max_tokens=max_tokens, allow_tools=not force_answer, model=turn["model"]
+                )
+                try:
+                    response = await self._create_completion(request_kwargs)
+                except BadRequestError as e:
+                    if not native or iteration > 0:
+                        raise
+                    raise self._native_fallback(e, turn["model"])
+                reply = response.choices[0].message
+                assistant_content = reply.content or ""
+
+                logger.debug("AI response: %.200s", assistant_content)
+
+                if native:
+                    raw_calls = [
+                        {"id": call.id, "name": call.function.name, "arguments": call.function.arguments}
+                        for call in getattr(reply, "tool_calls", None) or []
+                    ]
+                    tool_calls = self._parse_native_tool_calls(raw_calls)
+                else:
+                    # Extract tool calls from text
+                    tool_calls = self._extract_tool_calls_from_text(assistant_content)
+                if span is not None:
+                    span.set_attribute("tool_calls", len(tool_calls))
 
+                if tool_calls:
+                    logger.info("Found %d tool calls in response", len(tool_calls), extra=SAMPLED)
+                    shown.append(assistant_content if native else _text_before_marker(assistant_content))
+                    if self._repeats_earlier_calls(tool_calls, seen_calls):
+                        if force_answer:
+                            break
+                        # Same calls again - the results are already in the conversation
+                        logger.info("Model repeated earlier tool calls, asking for a final answer")
+                        metrics.TOOL_LOOP_EARLY_EXITS_TOTAL.inc(mode="simple", reason="repeated")
+                        messages.append({"role": "user", "content": FINAL_ANSWER_PROMPT})
+                        force_answer = True
+                        continue
+
+                    results = await self._append_tool_results(messages, assistant_content, tool_calls, native)
+                    turn["used_tools"] = True
+
+                    answer = self._template_answer(tool_calls, results) if iteration == 0 else None
+                    if answer is not None:
+                        metrics.TOOL_LOOP_EARLY_EXITS_TOTAL.inc(mode="simple", reason="template")
+                        metrics.TOOL_LOOP_ITERATIONS.observe(iteration + 1, mode="simple")
+                        turn["final"] = True
+                        return _join_replies(shown + [answer])
                     # Continue loop to get final response
                 else:
                     # No tool calls, return final answer
-                    logger.info("No tool calls found, returning response")
-                    return assistant_content
+                    logger.info("No tool calls found, returning response", extra=SAMPLED)
+                    metrics.TOOL_LOOP_ITERATIONS.observe(iteration + 1, mode="simple")
+                    turn["final"] = True
+                    return _join_replies(shown + [assistant_content])
+
+        # Max iterations reached
+        logger.warning("Max tool calling iterations reached")
+        metrics.TOOL_LOOP_ITERATIONS.observe(MAX_TOOL_ITERATIONS, mode="simple")
+        return _join_replies(shown + [MAX_ITERATIONS_MESSAGE])
+
+    async def chat(
+        self,
+        message: str,
+        history: List[Message] = None,
+        wallet_address: Optional[str] = None,
+        viewing_keys: Optional[Dict[str, str]] = None,
+        snip_balances: Optional[Dict[str, Dict]] = None,
+        scrt_balance: Optional[Dict] = None,
+        usage: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """
+        Send a chat message and get response, calling MCP tools as needed.
+
+        Tools are offered natively (OpenAI tools parameter) when
+        NATIVE_TOOL_CALLING allows it, otherwise via the USE_TOOL: text protocol.
+
+        Args:
+            message: User message
+            history: Previous conversation history
+            wallet_address: Connected Keplr wallet address (optional)
+            viewing_keys: SNIP-20 viewing keys from Keplr (optional)
+            snip_balances: Pre-fetched SNIP-20 balances from frontend (optional)
+            scrt_balance: Pre-fetched SCRT balance from frontend (optional)
+            usage: Dict filled with the estimated prompt token counts (optional)
+
+        Returns:
+            AI response text
+        """
+        if not self._initialized:
+            await self.initialize()
 
-            # Max iterations reached
-            logger.warning("Max tool calling iterations reached")
-            return "I apologize, but I've reached the maximum number of tool calls. Please try rephrasing your question."
+        try:
+            shortcut = self._shortcut_response(message, snip_balances, scrt_balance)
+            if shortcut is not None:
+                return shortcut
+
+            model = self._turn_model()
+            cache_key = self._response_cache_key(
+                model, message, history, wallet_address, viewing_keys, snip_balances, scrt_balance
+            )
+            cached = self._cached_response(cache_key)
+            if cached is not None:
+                return cached
+            started = time.monotonic()
+            temperature = self._turn_temperature(cache_key)
+            native = self._use_native_tools(model)
+
+            while True:
+                # Build message history in OpenAI format
+                messages, context_usage = self._build_messages(message, history, wallet_address, native)
+                if usage is not None:
+                    usage.update(context_usage)
+
+                turn = {"used_tools": False, "final": False, "model": model}
+                try:
+                    response = await self._tool_loop(messages, temperature, native, turn)
+                    break
+                except _NativeToolsUnsupported:
+                    native = False
+
+            # Answers built on live tool results are never cached
+            if turn["final"] and not turn["used_tools"]:
+                self._store_response(cache_key, response, started)
+            return response
 
         except Exception as e:
-            logger.error(f"Chat error: {e}")
+            logger.error("Chat error: %s", e)
             raise
 
+    async def _stream_tool_loop(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: float,
+        turn: Dict[str, Any],
+        native: bool = False
+    ):
+        """
+        Run the streaming tool loop over prepared messages, yielding visible text.
+
+        Completions run on turn["model"]. Sets turn["used_tools"] and
+        turn["final"] on the same outcomes as _tool_loop().
+        """
+        # Whether any visible text has been sent in an earlier iteration
+        streamed_any = False
+        seen_calls: Set[str] = set()
+        force_answer = False
+
+        for iteration in range(MAX_TOOL_ITERATIONS):
+            logger.info("Streaming tool calling iteration %d/%d", iteration + 1, MAX_TOOL_ITERATIONS, extra=SAMPLED)
+
+            with tracer.span("llm.iteration", iteration=iteration + 1, mode="stream") as span:
+                iteration_temperature, max_tokens = self._iteration_params(iteration, temperature)
+                request_kwargs = self._completion_kwargs(
+                    messages, stream=True, temperature=iteration_temperature, native=native,
+                    max_tokens=max_tokens, allow_tools=not force_answer, model=turn["model"]
+                )
+
+                assistant_content = ""
+                emitted = 0          # Length of assistant_content already yielded
+                tool_started = False
+                parser = ToolCallParser()
+                tool_calls = []
+                native_calls: Dict[int, Dict[str, str]] = {}
+                stop_reading = asyncio.Event()
+
+                try:
+                    completion = self._stream_completion(
+                        request_kwargs, native_calls if native else None, stop_reading
+                    )
+                    async with aclosing(completion):
+                        async for text in completion:
+                            assistant_content += text
+                            if native:
+                                # Tool calls arrive as structured deltas; all text is visible
+                                if streamed_any and emitted == 0:
+                                    yield "\n\n"
+                                emitted += len(text)
+                                yield text
+                                continue
+
+                            tool_calls.extend(parser.feed(text))
+                            if not tool_started:
+                                # Emitted text never holds a partial marker, so it can only start in the pending part
+                                pending = assistant_content[emitted:]
+                                marker_pos = pending.upper().find(TOOL_CALL_MARKER)
+                                if marker_pos >= 0:
+                                    tool_started = True
+                                    safe_len = marker_pos
+                                else:
+                                    safe_len = len(pending) - _partial_marker_length(pending)
+
+                                if safe_len > 0:
+                                    if streamed_any and emitted == 0:
+                                        # Separate follow-up text from what was streamed before the tool call
+                                        yield "\n\n"
+                                    emitted += safe_len
+                                    yield pending[:safe_len]
+
+                            if tool_calls:
+                                # The call is complete: dispatch it now instead of holding the
+                                # LLM slot for output the user never sees
+                                stop_reading.set()
+                except BadRequestError as e:
+                    # Only safe to switch protocols before anything was sent
+                    if not native or iteration > 0 or emitted:
+                        raise
+                    raise self._native_fallback(e, turn["model"])
+
+                streamed_any = streamed_any or emitted > 0
+
+                if native:
+                    tool_calls = self._parse_native_tool_calls([native_calls[i] for i in sorted(native_calls)])
+                elif tool_started:
+                    # A stopped completion's trailing text is not parsed for further calls
+                    remaining = [] if stop_reading.is_set() else parser.finish()
+                    tool_calls = self._validate_tool_calls(tool_calls + remaining)
+
+                if not tool_calls:
+                    # No tool calls (or a marker without a parseable call): the final answer, like chat()
+                    metrics.TOOL_LOOP_ITERATIONS.observe(iteration + 1, mode="stream")
+                    # Flush anything held back as a possible marker prefix
+                    rest = assistant_content[emitted:]
+                    if rest:
+                        yield ("\n\n" if streamed_any and emitted == 0 else "") + rest
+                    turn["final"] = True
+                    logger.info("No tool calls found, stream complete", extra=SAMPLED)
+                    return
+
+                if span is not None:
+                    span.set_attribute("tool_calls", len(tool_calls))
+
+                logger.info("Found %d tool calls in streamed response", len(tool_calls), extra=SAMPLED)
+                if self._repeats_earlier_calls(tool_calls, seen_calls):
+                    if force_answer:
+                        break
+                    logger.info("Model repeated earlier tool calls, asking for a final answer")
+                    metrics.TOOL_LOOP_EARLY_EXITS_TOTAL.inc(mode="stream", reason="repeated")
+                    messages.append({"role": "user", "content": FINAL_ANSWER_PROMPT})
+                    force_answer = True
+                    continue
+
+                results = await self._append_tool_results(messages, assistant_content, tool_calls, native)
+                turn["used_tools"] = True
+
+                answer = self._template_answer(tool_calls, results) if iteration == 0 else None
+                if answer is not None:
+                    metrics.TOOL_LOOP_EARLY_EXITS_TOTAL.inc(mode="stream", reason="template")
+                    metrics.TOOL_LOOP_ITERATIONS.observe(iteration + 1, mode="stream")
+                    turn["final"] = True
+                    yield ("\n\n" if streamed_any else "") + answer
+                    return
+
+        logger.warning("Max tool calling iterations reached")
+        metrics.TOOL_LOOP_ITERATIONS.observe(MAX_TOOL_ITERATIONS, mode="stream")
+        yield ("\n\n" if streamed_any else "") + MAX_ITERATIONS_MESSAGE
+
     async def chat_stream(
         self,
         message: str,
-        history: List[Message] = None
+        history: List[Message] = None,
+        wallet_address: Optional[str] = None,
+        viewing_keys: Optional[Dict[str, str]] = None,
+        snip_balances: Optional[Dict[str, Dict]] = None,
+        scrt_balance: Optional[Dict] = None,
+        usage: Optional[Dict[str, Any]] = None
     ):
         """
-        Stream chat message responses.
+        Stream chat message responses, running the same tool loop as chat().
+
+        Text is forwarded as soon as it arrives. In the text protocol, once a
+        completion emits the USE_TOOL: marker, the rest of that completion is
+        withheld from the client and is no longer read once the call is
+        complete; the tool call is executed and the follow-up completion is
+        streamed in turn. The streamed text matches what chat() returns.
 
         Args:
             message: User message
             history: Previous conversation history
+            wallet_address: Connected Keplr wallet address (optional)
+            viewing_keys: SNIP-20 viewing keys from Keplr (optional)
+            snip_balances: Pre-fetched SNIP-20 balances from frontend (optional)
+            scrt_balance: Pre-fetched SCRT balance from frontend (optional)
+            usage: Dict filled with the estimated prompt token counts (optional)
 
         Yields:
             Response chunks as they arrive
@@ -455,34 +1286,49 @@ Only use tools when needed. For general questions, respond normally."""
             await self.initialize()
 
         try:
-            # Build message history in OpenAI format
-            messages = []
-
-            # Add conversation history
-            if history:
-                for msg in history[-10:]:  # Last 10 messages
-                    messages.append({"role": msg.role, "content": msg.content})
-
-            # Add current message
-            messages.append({"role": "user", "content": message})
-
-            # Use OpenAI client with streaming
-            stream = await self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                stream=True
+            shortcut = self._shortcut_response(message, snip_balances, scrt_balance)
+            if shortcut is not None:
+                yield shortcut
+                return
+
+            model = self._turn_model()
+            cache_key = self._response_cache_key(
+                model, message, history, wallet_address, viewing_keys, snip_balances, scrt_balance
             )
-
-            # Stream chunks as they arrive
-            async for chunk in stream:
-                if chunk.choices and len(chunk.choices) > 0:
-                    delta = chunk.choices[0].delta
-                    if hasattr(delta, 'content') and delta.content:
-                        yield delta.content
+            cached = self._cached_response(cache_key)
+            if cached is not None:
+                yield cached
+                return
+            started = time.monotonic()
+            native = self._use_native_tools(model)
+
+            while True:
+                messages, context_usage = self._build_messages(message, history, wallet_address, native)
+                if usage is not None:
+                    usage.update(context_usage)
+
+                turn = {"used_tools": False, "final": False, "model": model}
+                chunks = []
+                try:
+                    # Closing this generator closes the tool loop and its upstream stream with it
+                    loop = self._stream_tool_loop(messages, self._turn_temperature(cache_key), turn, native)
+                    async with aclosing(loop):
+                        async for chunk in loop:
+                            if cache_key is not None:
+                                chunks.append(chunk)
+                            yield chunk
+                    break
+                except _NativeToolsUnsupported:
+                    native = False
+
+            # Same rule as chat(): only final answers not built on live tool results
+            if turn["final"] and not turn["used_tools"]:
+                self._store_response(cache_key, "".join(chunks), started)
 
         except Exception as e:
-            logger.error(f"Streaming error: {e}")
+            logger.error("Streaming error: %s", e)
             raise
 
+
 # Global service instance
 secret_ai_service = SecretAIService()
@@ -0,0 +1,28 @@
+"""SNIP-20 token contracts on Secret Network mainnet (mirrors SNIPTokenManager in static/js/wallet.js)."""
+from typing import Dict, NamedTuple
+
+
+class Snip20Token(NamedTuple):
+    """Contract metadata needed to query a SNIP-20 balance."""
+    symbol: str
+    address: str
+    code_hash: str
+    decimals: int
+
+
+_SNIP20_CODE_HASH = "638a3e1d50175fbcb8373cf801565283e3eb23d88a9b7b7f99fcc5eb1e6b561e"
+
+# Keyed by the lower-cased symbols used in SNIP20_TOKENS
+SNIP20_CONTRACTS: Dict[str, Snip20Token] = {
+    "shd": Snip20Token("SHD", "secret153wu605vvp934xhd4k9dtd640zsep5jkesstdm", _SNIP20_CODE_HASH, 8),
+    "silk": Snip20Token("SILK", "secret1fl449muk5yq8dlad7a22nje4p5d2pnsgymhjfd", _SNIP20_CODE_HASH, 6),
+    "sscrt": Snip20Token(
+        "sSCRT", "secret1k0jntykt7e4g3y88ltc60czgjuqdy4c9e8fzek",
+        "af74387e276be8874f07bec3a87023ee49b0e7ebe08178c49d0a49c3c98ed60e", 6
+    ),
+    "stkd-scrt": Snip20Token("stkd-SCRT", "secret1k6u0cy4feepm6pehnz804zmwakuwdapm69tuc4", _SNIP20_CODE_HASH, 6),
+    "sinj": Snip20Token("sINJ", "secret1cxf4xuy6tcuuykwpcvts2c7g6tghzy2xkrkkgu", _SNIP20_CODE_HASH, 18),
+    "swbtc": Snip20Token("sWBTC", "secret1g7jfnxmxkjgqdts9wlmn238mrzxz5r92zwqv4a", _SNIP20_CODE_HASH, 8),
+    "susdt": Snip20Token("sUSDT", "secret18wpjn83dayu4meu6wnn29khfkwdxs7kyrz9c8f", _SNIP20_CODE_HASH, 6),
+    "snobleusdc": Snip20Token("snobleUSDC", "secret1vkq022x0q03ung5myy5g4p3yk8y5ch3klx8dpx", _SNIP20_CODE_HASH, 6),
+}
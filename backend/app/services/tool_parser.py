@@ -0,0 +1,243 @@
+"""
+Parser for prompt-based tool calls:
+
+    USE_TOOL: tool_name with arguments {"key": "value"}
+
+Arguments are read up to the matching closing brace (so nested objects
+work) and accepted in relaxed JSON: single-quoted strings, unquoted keys,
+trailing commas and Python True/False/None. The parser can be fed a
+completion chunk by chunk and reports each call as soon as it is complete.
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+TOOL_CALL_MARKER = "USE_TOOL:"
+
+_NAME_RE = re.compile(r"\s*([A-Za-z_][\w\-]*)")  # Models often break the line after the marker
+_ARGS_INTRO_RE = re.compile(r"[ \t]*(?:with[ \t]+(?:arguments|args)[ \t]*:?)?[ \t]*", re.IGNORECASE)
+_IDENTIFIER_RE = re.compile(r"[A-Za-z_$][\w$\-.]*")
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}
+_LITERALS = {"true": "true", "false": "false", "null": "null", "True": "true", "False": "false", "None": "null"}
+
+_JSON_TYPES = {
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "object": (dict,),
+    "array": (list,),
+    "null": (type(None),),
+}
+
+
+def _find_closing_brace(text: str, start: int) -> int:
+    """Index just past the brace matching text[start] ('{'), or -1 if not closed yet."""
+    depth = 0
+    quote = None
+    escaped = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return -1
+
+
+def _read_string(text: str, start: int) -> Tuple[str, int]:
+    """Read a single- or double-quoted string starting at text[start]; return (value, end)."""
+    quote = text[start]
+    chars = []
+    i = start + 1
+    while i < len(text):
+        char = text[i]
+        if char == "\\" and i + 1 < len(text):
+            nxt = text[i + 1]
+            if nxt == "u" and i + 6 <= len(text):
+                chars.append(chr(int(text[i + 2:i + 6], 16)))
+                i += 6
+            else:
+                chars.append(_ESCAPES.get(nxt, nxt))
+                i += 2
+            continue
+        if char == quote:
+            return "".join(chars), i + 1
+        chars.append(char)
+        i += 1
+    raise ValueError("unterminated string")
+
+
+def parse_relaxed_json(raw: str) -> Any:
+    """
+    Parse JSON, falling back to a lenient reading that accepts single quotes,
+    unquoted keys and bare-word values, trailing commas and Python literals.
+    Raises ValueError if the text still can't be parsed.
+    """
+    try:
+        return json.loads(raw)
+    except ValueError:
+        pass
+
+    out = []
+    i = 0
+    while i < len(raw):
+        char = raw[i]
+        if char in "\"'":
+            value, i = _read_string(raw, i)
+            out.append(json.dumps(value))
+            continue
+        if char == ",":
+            # Drop trailing commas before a closing bracket
+            j = i + 1
+            while j < len(raw) and raw[j].isspace():
+                j += 1
+            if j < len(raw) and raw[j] in "}]":
+                i += 1
+                continue
+        # Words, but not the exponent/suffix of a number
+        match = _IDENTIFIER_RE.match(raw, i) if i == 0 or not raw[i - 1].isalnum() else None
+        if match:
+            word = match.group(0)
+            if word in _LITERALS:
+                out.append(_LITERALS[word])
+            else:
+                # Unquoted key or bare-word value (e.g. an address)
+                out.append(json.dumps(word))
+            i = match.end()
+            continue
+        out.append(char)
+        i += 1
+
+    try:
+        return json.loads("".join(out))
+    except ValueError as e:
+        raise ValueError(f"invalid arguments: {e}") from None
+
+
+def _make_call(name: str, raw: str) -> Dict[str, Any]:
+    try:
+        arguments = parse_relaxed_json(raw) if raw.strip() else {}
+    except ValueError as e:
+        return {"name": name, "arguments": {}, "error": str(e)}
+    if not isinstance(arguments, dict):
+        return {"name": name, "arguments": {}, "error": "arguments must be a JSON object"}
+    return {"name": name, "arguments": arguments}
+
+
+def _parse_call(text: str, pos: int, final: bool) -> Optional[Tuple[Dict[str, Any], int]]:
+    """
+    Parse one call whose marker ends at pos. Returns (call, end), or None if
+    more text is needed to tell (only when final is False).
+    """
+    name_match = _NAME_RE.match(text, pos)
+    if not name_match or name_match.end() == len(text):
+        if not final:
+            return None
+        if not name_match:
+            return {"name": "", "arguments": {}, "error": "missing tool name"}, pos
+        return _make_call(name_match.group(1), ""), name_match.end()
+
+    name = name_match.group(1)
+    args_start = _ARGS_INTRO_RE.match(text, name_match.end()).end()
+
+    if args_start < len(text) and text[args_start] == "{":
+        end = _find_closing_brace(text, args_start)
+        if end < 0:
+            if not final:
+                return None
+            return {"name": name, "arguments": {}, "error": "unterminated arguments"}, len(text)
+        return _make_call(name, text[args_start:end]), end
+
+    # No argument object: a bare call runs to the end of its line
+    line_end = text.find("\n", name_match.end())
+    if line_end < 0:
+        if not final:
+            return None
+        line_end = len(text)
+    return _make_call(name, ""), line_end
+
+
+class ToolCallParser:
+    """Incremental tool-call parser; feed() text as it streams in, then finish()."""
+
+    def __init__(self):
+        self._text = ""
+        self._upper = ""   # Upper-cased copy for case-insensitive marker search
+        self._pos = 0      # Everything before this has been consumed
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Add text and return the calls completed by it."""
+        self._text += text
+        self._upper += text.upper()
+        return self._drain(final=False)
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """Return any remaining calls, treating the text received so far as complete."""
+        return self._drain(final=True)
+
+    def _drain(self, final: bool) -> List[Dict[str, Any]]:
+        calls = []
+        while True:
+            start = self._upper.find(TOOL_CALL_MARKER, self._pos)
+            if start < 0:
+                # Keep enough of the tail to catch a marker split across chunks
+                self._pos = max(self._pos, len(self._text) - len(TOOL_CALL_MARKER) + 1)
+                return calls
+            parsed = _parse_call(self._text, start + len(TOOL_CALL_MARKER), final)
+            if parsed is None:
+                self._pos = start
+                return calls
+            call, self._pos = parsed
+            calls.append(call)
+
+
+def parse_tool_calls(text: str) -> List[Dict[str, Any]]:
+    """Parse every tool call in a complete completion."""
+    parser = ToolCallParser()
+    return parser.feed(text) + parser.finish()
+
+
+def validate_arguments(arguments: Dict[str, Any], schema: Optional[Dict[str, Any]]) -> Optional[str]:
+    """
+    Check arguments against a tool's JSON Schema (required keys, property
+    types, additionalProperties: false). Returns an error message or None.
+    """
+    if not schema:
+        return None
+
+    missing = [key for key in schema.get("required", []) if key not in arguments]
+    if missing:
+        return f"missing required argument(s): {', '.join(missing)}"
+
+    properties = schema.get("properties") or {}
+    for key, value in arguments.items():
+        spec = properties.get(key)
+        if spec is None:
+            if schema.get("additionalProperties") is False:
+                return f"unknown argument: {key}"
+            continue
+        expected = spec.get("type")
+        if expected is None:
+            continue
+        type_names = expected if isinstance(expected, list) else [expected]
+        allowed = tuple(t for name in type_names for t in _JSON_TYPES.get(name, (object,)))
+        # bool is an int subclass in Python but not a JSON number
+        if isinstance(value, bool) and "boolean" not in type_names:
+            return f"argument '{key}' must be {' or '.join(type_names)}"
+        if not isinstance(value, allowed):
+            return f"argument '{key}' must be {' or '.join(type_names)}"
+        if "enum" in spec and value not in spec["enum"]:
+            return f"argument '{key}' must be one of {spec['enum']}"
+    return None
@@ -0,0 +1,123 @@
+"""
+Direct answers for simple read-only tool results.
+
+When every tool call of a turn has a template here, the answer is built from
+the results instead of asking the LLM to rephrase them in a second completion.
+A template returns None when the result doesn't have the expected shape, in
+which case the normal follow-up completion runs.
+"""
+import json
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, List, Optional
+
+USCRT_PER_SCRT = Decimal(1_000_000)
+
+Template = Callable[[Dict[str, Any], Any], Optional[str]]
+
+
+def unwrap_result(result: Any) -> Any:
+    """Return the payload of an MCP result ({"content": [{"type": "text", "text": ...}]})."""
+    if isinstance(result, dict) and result.get("isError"):
+        return None
+    if isinstance(result, dict) and isinstance(result.get("content"), list):
+        texts = [item.get("text", "") for item in result["content"] if isinstance(item, dict)]
+        text = "\n".join(t for t in texts if t)
+        try:
+            return json.loads(text)
+        except ValueError:
+            return None
+    return result
+
+
+def find_value(payload: Any, key: str) -> Any:
+    """Depth-first search for the first value stored under key."""
+    if isinstance(payload, dict):
+        if key in payload:
+            return payload[key]
+        children = payload.values()
+    elif isinstance(payload, list):
+        children = payload
+    else:
+        return None
+    for child in children:
+        found = find_value(child, key)
+        if found is not None:
+            return found
+    return None
+
+
+def _block_answer(arguments: Dict[str, Any], payload: Any) -> Optional[str]:
+    height = find_value(payload, "height")
+    if height is None:
+        return None
+    answer = f"The latest Secret Network block is #{height}"
+    chain_id = find_value(payload, "chain_id")
+    if chain_id:
+        answer += f" on {chain_id}"
+    block_time = find_value(payload, "time")
+    if block_time:
+        answer += f", produced at {block_time}"
+    return answer + "."
+
+
+def uscrt_amount(payload: Any) -> Optional[str]:
+    """Raw uscrt amount in a bank balance result (empty balances count as "0"), or None."""
+    balances = find_value(payload, "balances")
+    entries = balances if isinstance(balances, list) else [payload]
+    uscrt = next(
+        (e for e in entries if isinstance(e, dict) and e.get("denom") == "uscrt" and "amount" in e),
+        None
+    )
+    if uscrt is not None:
+        return str(uscrt["amount"])
+    if isinstance(balances, list) and not balances:
+        return "0"
+    return None
+
+
+def _balance_answer(arguments: Dict[str, Any], payload: Any) -> Optional[str]:
+    amount = uscrt_amount(payload)
+    if amount is None:
+        return None
+    try:
+        scrt = Decimal(amount) / USCRT_PER_SCRT
+    except (InvalidOperation, ValueError):
+        return None
+    owner = arguments.get("address") or "the address"
+    return f"The SCRT balance of {owner} is {scrt:.6f} SCRT."
+
+
+TEMPLATES: Dict[str, Template] = {
+    "secret_query_block": _block_answer,
+    "secret_query_balance": _balance_answer,
+}
+
+
+def render_tool_answer(
+    tool_calls: List[Dict[str, Any]],
+    results: List[str],
+    enabled: Optional[set] = None
+) -> Optional[str]:
+    """
+    Answer directly from tool results, or return None if any call has no
+    (enabled) template, failed, or returned an unexpected shape.
+    """
+    if not tool_calls:
+        return None
+
+    answers = []
+    for call, result in zip(tool_calls, results):
+        template = TEMPLATES.get(call["name"])
+        if template is None or "error" in call or (enabled is not None and call["name"] not in enabled):
+            return None
+        try:
+            payload = unwrap_result(json.loads(result))
+        except ValueError:
+            return None
+        if payload is None or (isinstance(payload, dict) and "error" in payload):
+            return None
+        answer = template(call["arguments"], payload)
+        if answer is None:
+            return None
+        answers.append(answer)
+    return "\n".join(answers)
@@ -0,0 +1,344 @@
+"""
+Lightweight request tracing.
+
+Spans use W3C trace context ids and are exported either to an in-memory
+ring buffer (default), a local JSON-lines file, or an OpenTelemetry
+collector via OTLP/HTTP JSON - no OpenTelemetry SDK required.
+"""
+import abc
+import json
+import logging
+import queue
+import random
+import re
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, Optional
+
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class Span:
+    """A timed operation within a trace."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attributes",
+                 "start_ns", "end_ns", "status", "error", "sampled")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], sampled: bool,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self.sampled = sampled
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException):
+        self.status = "error"
+        self.error = f"{type(error).__name__}: {error}"
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_ns is None:
+            return None
+        return (self.end_ns - self.start_ns) / 1e6
+
+    @property
+    def traceparent(self) -> str:
+        """W3C traceparent header value for this span."""
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes
+        }
+
+
+class InMemoryExporter:
+    """Keeps the most recent finished spans for inspection via /api/diagnostic/traces."""
+
+    def __init__(self, max_spans: int = 2000):
+        self._spans: Deque[Span] = deque(maxlen=max_spans)
+
+    def export(self, span: Span):
+        self._spans.append(span)
+
+    def recent_traces(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Group buffered spans by trace, newest trace first."""
+        traces: Dict[str, List[Span]] = {}
+        for span in reversed(self._spans):
+            traces.setdefault(span.trace_id, []).append(span)
+            if len(traces) > limit:
+                traces.pop(span.trace_id)
+                break
+
+        result = []
+        for trace_id, spans in traces.items():
+            spans.sort(key=lambda s: s.start_ns)
+            root = next((s for s in spans if s.parent_id is None), spans[0])
+            result.append({
+                "trace_id": trace_id,
+                "name": root.name,
+                "duration_ms": root.duration_ms,
+                "spans": [s.to_dict() for s in spans]
+            })
+        return result
+
+    def shutdown(self):
+        pass
+
+
+class _BackgroundExporter(abc.ABC):
+    """Hands finished spans to a daemon thread so export I/O stays off the event loop."""
+
+    def __init__(self, batch_size: int = 100, flush_interval: float = 2.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.SimpleQueue[Optional[Span]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span):
+        self._queue.put(span)
+
+    def shutdown(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        batch: List[Span] = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                span = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                span = False
+            if span:
+                batch.append(span)
+            if span is None or len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                if batch:
+                    try:
+                        self._write(batch)
+                    except Exception as e:
+                        logger.warning("Dropping %d spans: %s", len(batch), e)
+                    batch = []
+                deadline = time.monotonic() + self.flush_interval
+            if span is None:
+                return
+
+    @abc.abstractmethod
+    def _write(self, spans: List[Span]):
+        """Export one batch of spans (runs on the exporter thread)."""
+
+
+class JsonFileExporter(_BackgroundExporter):
+    """Appends finished spans to a JSON-lines file."""
+
+    def __init__(self, path: str, **kwargs):
+        self.path = path
+        super().__init__(**kwargs)
+
+    def _write(self, spans: List[Span]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpHttpExporter(_BackgroundExporter):
+    """Sends spans to an OpenTelemetry collector using OTLP/HTTP with JSON encoding."""
+
+    def __init__(self, endpoint: str, service_name: str = "secretforge-chat", **kwargs):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self._client = httpx.Client(timeout=5.0)
+        super().__init__(**kwargs)
+
+    def _write(self, spans: List[Span]):
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": {"stringValue": self.service_name}}
+                ]},
+                "scopeSpans": [{
+                    "scope": {"name": "secretforge"},
+                    "spans": [self._encode(span) for span in spans]
+                }]
+            }]
+        }
+        self._client.post(self.url, json=payload).raise_for_status()
+
+    @staticmethod
+    def _encode(span: Span) -> Dict[str, Any]:
+        encoded = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns or span.start_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+            "status": {"code": 2, "message": span.error or ""} if span.status == "error" else {"code": 1}
+        }
+        if span.parent_id:
+            encoded["parentSpanId"] = span.parent_id
+        return encoded
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Parse a W3C traceparent header into trace id, parent span id and sampled flag."""
+    if not header:
+        return None
+    match = _TRACEPARENT_RE.match(header.strip().lower())
+    if not match or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return {
+        "trace_id": match.group(1),
+        "parent_id": match.group(2),
+        "sampled": bool(int(match.group(3), 16) & 1)
+    }
+
+
+class Tracer:
+    """Creates spans, tracks the active span per task and hands finished spans to the exporter."""
+
+    def __init__(self, exporter=None, sample_rate: float = 1.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def start_span(
+        self,
+        name: str,
+        attributes: Optional[Dict[str, Any]] = None,
+        traceparent: Optional[str] = None
+    ) -> Optional[Span]:
+        """
+        Start a span without activating it. The parent is the active span,
+        else the remote parent from traceparent, else a new trace is started.
+        Returns None when tracing is disabled.
+        """
+        if not self.enabled:
+            return None
+
+        parent = _current_span.get()
+        if parent is not None:
+            return Span(name, parent.trace_id, parent.span_id, parent.sampled, attributes)
+
+        remote = parse_traceparent(traceparent)
+        if remote is not None:
+            return Span(name, remote["trace_id"], remote["parent_id"], remote["sampled"], attributes)
+
+        sampled = self.sample_rate >= 1.0 or random.random() < self.sample_rate
+        return Span(name, secrets.token_hex(16), None, sampled, attributes)
+
+    def end_span(self, span: Optional[Span]):
+        """Finish a span and export it if sampled."""
+        if span is None or span.end_ns is not None:
+            return
+        span.end_ns = time.time_ns()
+        if span.sampled and self.exporter is not None:
+            try:
+                self.exporter.export(span)
+            except Exception as e:
+                logger.debug("Span export failed: %s", e)
+
+    @contextmanager
+    def use_span(self, span: Optional[Span], end_on_exit: bool = False):
+        """Make span the active span for the block."""
+        token = _current_span.set(span) if span is not None else None
+        try:
+            yield span
+        except GeneratorExit:
+            # A consumer closing a streaming generator early is not a failure
+            raise
+        except BaseException as e:
+            if span is not None:
+                span.record_error(e)
+            raise
+        finally:
+            if token is not None:
+                try:
+                    _current_span.reset(token)
+                except ValueError:
+                    # Exited from another context (e.g. generator closed elsewhere)
+                    pass
+            if end_on_exit:
+                self.end_span(span)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any):
+        """Start, activate and finish a child span around the block."""
+        span = self.start_span(name, attributes)
+        with self.use_span(span, end_on_exit=True):
+            yield span
+
+    def inject_headers(self, headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """Add the active span's traceparent to outgoing request headers."""
+        headers = dict(headers or {})
+        span = _current_span.get()
+        if span is not None:
+            headers["traceparent"] = span.traceparent
+        return headers
+
+    def shutdown(self):
+        if self.exporter is not None:
+            self.exporter.shutdown()
+
+
+def _create_exporter():
+    if not settings.TRACING_ENABLED:
+        return None
+    exporter = settings.TRACING_EXPORTER.lower()
+    if exporter == "file":
+        return JsonFileExporter(settings.TRACING_FILE)
+    if exporter == "otlp":
+        return OtlpHttpExporter(settings.TRACING_OTLP_ENDPOINT)
+    if exporter != "memory":
+        logger.warning("Unknown TRACING_EXPORTER '%s', using in-memory traces", settings.TRACING_EXPORTER)
+    return InMemoryExporter()
+
+
+# Singleton instance
+tracer = Tracer(_create_exporter(), sample_rate=settings.TRACING_SAMPLE_RATE)
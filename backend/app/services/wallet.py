@@ -0,0 +1,168 @@
+"""Batched wallet balance lookups (SCRT plus SNIP-20 tokens) through the MCP server."""
+import asyncio
+import hashlib
+import logging
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.services.cache import TTLCache
+from app.services.mcp_client import mcp_client
+from app.services.tokens import SNIP20_CONTRACTS, Snip20Token
+from app.services.tool_templates import find_value, unwrap_result, uscrt_amount
+
+logger = logging.getLogger(__name__)
+
+SCRT_DECIMALS = 6
+
+
+def format_amount(raw: str, decimals: int) -> str:
+    """Format a raw integer amount with thousands separators and 2-6 decimals."""
+    value = Decimal(raw) / (Decimal(10) ** decimals)
+    text = f"{value:,.6f}"
+    whole, fraction = text.split(".")
+    return f"{whole}.{fraction.rstrip('0').ljust(2, '0')}"
+
+
+def _error(message: str) -> Dict[str, Any]:
+    return {"success": False, "error": message}
+
+
+class WalletBalanceService:
+    """
+    Queries the SCRT balance and every configured SNIP-20 balance of an
+    address concurrently and caches the combined result briefly per
+    address (and viewing-key set), so repeated chat turns don't re-query.
+    """
+
+    def __init__(self, tokens: Optional[List[str]] = None):
+        """Initialize with the SNIP-20 symbols to report (default: SNIP20_TOKENS)."""
+        symbols = settings.snip20_tokens if tokens is None else tokens
+        self.tokens = [symbol for symbol in symbols if symbol in SNIP20_CONTRACTS]
+        self._cache = TTLCache(
+            max_entries=settings.WALLET_BALANCE_CACHE_MAX_ENTRIES,
+            default_ttl=settings.WALLET_BALANCE_CACHE_TTL
+        )
+
+    async def get_balances(
+        self,
+        address: str,
+        viewing_keys: Optional[Dict[str, str]] = None,
+        tokens: Optional[List[str]] = None,
+        snip20: bool = True,
+        scrt: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Return {"address", "scrt", "snip20", "cached"}. scrt and each snip20
+        entry carry success plus either the amounts or an error, in the shape
+        /api/chat accepts as scrt_balance / snip_balances.
+
+        tokens limits the SNIP-20 lookups to those symbols; with snip20=False
+        (no SNIP-20 query tool available) no SNIP-20 balance is queried, and
+        with scrt=False the SCRT balance is skipped (scrt is None).
+        """
+        requested = {symbol.lower() for symbol in tokens} if tokens is not None else None
+        symbols = [
+            symbol for symbol in self.tokens
+            if snip20 and (requested is None or symbol in requested)
+        ]
+        keys = {
+            symbol.lower(): key for symbol, key in (viewing_keys or {}).items()
+            if key and symbol.lower() in symbols
+        }
+        cache_key = self._cache_key(address, scrt, symbols, keys)
+        found, cached = self._cache.get(cache_key)
+        if found:
+            return {**cached, "cached": True}
+
+        queries = [
+            self._query_snip20(address, SNIP20_CONTRACTS[symbol], keys.get(symbol))
+            for symbol in symbols
+        ]
+        if scrt:
+            queries.append(self._query_scrt(address))
+        results = await asyncio.gather(*queries)
+        scrt_result = results.pop() if scrt else None
+
+        result = {
+            "address": address,
+            "scrt": scrt_result,
+            "snip20": dict(zip(symbols, results))
+        }
+        # A failed SCRT lookup is most likely transient; don't pin it for the TTL
+        if scrt_result is None or scrt_result["success"]:
+            self._cache.set(cache_key, result)
+        return {**result, "cached": False}
+
+    @staticmethod
+    def _cache_key(address: str, scrt: bool, symbols: List[str], viewing_keys: Dict[str, str]) -> str:
+        # Viewing keys are secrets; keep only a digest of them in the key
+        digest = hashlib.sha256(repr(sorted(viewing_keys.items())).encode()).hexdigest()
+        return f"{address}:{int(scrt)}:{','.join(symbols)}:{digest}"
+
+    async def _call(self, tool_name: str, arguments: Dict[str, Any]) -> Any:
+        """Call an MCP tool and return its unwrapped payload (None on a tool error)."""
+        result = await asyncio.wait_for(
+            mcp_client.call_tool(tool_name, arguments),
+            timeout=settings.TOOL_CALL_TIMEOUT
+        )
+        return unwrap_result(result)
+
+    async def _query_scrt(self, address: str) -> Dict[str, Any]:
+        try:
+            payload = await self._call("secret_query_balance", {"address": address})
+            amount = uscrt_amount(payload)
+            if amount is None:
+                return _error("Unexpected balance response")
+            return {
+                "success": True,
+                "amount": amount,
+                "formatted": f"{Decimal(amount) / (Decimal(10) ** SCRT_DECIMALS):.6f}",
+                "denom": "uscrt"
+            }
+        except asyncio.TimeoutError:
+            return _error("Balance query timed out")
+        except (InvalidOperation, ValueError) as e:
+            return _error(f"Invalid balance amount: {e}")
+        except Exception as e:
+            logger.warning("SCRT balance query failed: %s", e)
+            return _error(str(e) or type(e).__name__)
+
+    async def _query_snip20(self, address: str, token: Snip20Token, viewing_key: Optional[str]) -> Dict[str, Any]:
+        if not viewing_key:
+            return _error(f"No viewing key available for {token.symbol}")
+        try:
+            payload = await self._call(settings.SNIP20_BALANCE_TOOL, {
+                "contract_address": token.address,
+                "code_hash": token.code_hash,
+                "query": {"balance": {"address": address, "key": viewing_key}}
+            })
+            if payload is None:
+                return _error(f"{token.symbol} balance query failed")
+            if isinstance(payload, dict) and "viewing_key_error" in payload:
+                return _error("Invalid viewing key")
+            amount = find_value(payload, "amount")
+            if amount is None:
+                return _error("Unexpected balance response")
+            return {
+                "success": True,
+                "balance": str(amount),
+                "formatted": format_amount(str(amount), token.decimals),
+                "token": token.symbol,
+                "decimals": token.decimals
+            }
+        except asyncio.TimeoutError:
+            return _error("Balance query timed out")
+        except (InvalidOperation, ValueError) as e:
+            return _error(f"Invalid balance amount: {e}")
+        except Exception as e:
+            logger.warning("%s balance query failed: %s", token.symbol, e)
+            return _error(str(e) or type(e).__name__)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return cache statistics for the diagnostic endpoint."""
+        return {"cache": self._cache.stats(), "tokens": self.tokens}
+
+
+# Singleton instance
+wallet_service = WalletBalanceService()
@@ -5,7 +5,10 @@ const ChatState = {
     messages: [],
     isStreaming: false,
     walletConnected: false,
-    walletAddress: null
+    walletAddress: null,
+    sessionId: null,
+    serverHistory: false,  // Backend keeps the transcript for our session id
+    snip20Supported: false // Backend can query SNIP-20 balances through the MCP server
 };
 
 const ChatInterface = {
@@ -13,9 +16,32 @@ const ChatInterface = {
         console.log('🔮 Initializing SecretForge chat interface...');
         this.setupEventListeners();
         this.syncWalletState();
+        this.initSession();
         console.log('✅ Chat interface initialized');
     },
 
+    async initSession() {
+        // Reuse one session id per browser tab so the server can keep our history
+        ChatState.sessionId = sessionStorage.getItem('secretforge-session-id');
+        if (!ChatState.sessionId) {
+            ChatState.sessionId = (window.crypto && crypto.randomUUID)
+                ? crypto.randomUUID()
+                : `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+            sessionStorage.setItem('secretforge-session-id', ChatState.sessionId);
+        }
+
+        try {
+            const response = await fetch('/api/config');
+            if (response.ok) {
+                const config = await response.json();
+                ChatState.serverHistory = Boolean(config.history);
+                ChatState.snip20Supported = Boolean(config.snip20_supported);
+            }
+        } catch (error) {
+            console.error('Failed to load history config:', error);
+        }
+    },
+
     setupEventListeners() {
         const chatForm = document.getElementById('chat-form');
         const messageInput = document.getElementById('message-input');
@@ -60,8 +86,10 @@ const ChatInterface = {
 
             const requestBody = {
                 message: message,
-                history: ChatState.messages,
-                stream: false  // Keep streaming disabled for now - tool calling works better without it
+                // The server already has the transcript when it keeps history
+                history: ChatState.serverHistory ? [] : ChatState.messages.slice(-50),
+                session_id: ChatState.sessionId,
+                stream: true  // Tokens arrive as they are generated; tool calls run server-side
             };
 
             // Add wallet address and viewing keys if connected
@@ -100,24 +128,42 @@ const ChatInterface = {
                 // PRE-FETCH SNIP-20 BALANCES (secretGPT approach)
                 // Detect SNIP token queries in the message
                 const detectedTokens = this.detectSnipTokens(message);
-                if (detectedTokens.length > 0 && window.SNIPTokenManager) {
+                if (detectedTokens.length > 0) {
                     console.log('🎯 Detected SNIP token query for:', detectedTokens);
 
-                    const snipBalances = {};
-                    for (const token of detectedTokens) {
+                    // One (server-cached) backend call for the detected tokens, only when
+                    // the MCP server can query SNIP-20 contracts
+                    const balances = ChatState.snip20Supported
+                        ? await this.fetchWalletBalances(detectedTokens)
+                        : null;
+                    const backendSnip = balances && balances.snip20_supported ? balances.snip20 : {};
+
+                    // Browser path for the rest: gets (or creates) the Keplr viewing key and
+                    // queries via secretjs, all tokens at once
+                    const results = await Promise.all(detectedTokens.map(async (token) => {
+                        const backendResult = backendSnip[token.toLowerCase()] || null;
+                        if ((backendResult && backendResult.success) || !window.SNIPTokenManager) {
+                            return backendResult;
+                        }
                         try {
                             console.log(`💰 Pre-fetching balance for ${token}...`);
-                            const balanceResult = await window.SNIPTokenManager.querySnip20Balance(token);
-                            if (balanceResult.success) {
-                                snipBalances[token.toLowerCase()] = balanceResult;
-                                console.log(`✅ Pre-fetched ${token} balance: ${balanceResult.formatted}`);
-                            } else {
-                                console.log(`⚠️ Failed to fetch ${token} balance:`, balanceResult.error);
-                            }
+                            return await window.SNIPTokenManager.querySnip20Balance(token);
                         } catch (error) {
                             console.error(`❌ Error fetching ${token} balance:`, error);
+                            return backendResult;
                         }
-                    }
+                    }));
+
+                    const snipBalances = {};
+                    detectedTokens.forEach((token, index) => {
+                        const balanceResult = results[index];
+                        if (balanceResult && balanceResult.success) {
+                            snipBalances[token.toLowerCase()] = balanceResult;
+                            console.log(`✅ Pre-fetched ${token} balance: ${balanceResult.formatted}`);
+                        } else if (balanceResult) {
+                            console.log(`⚠️ Failed to fetch ${token} balance:`, balanceResult.error);
+                        }
+                    });
 
                     // Add pre-fetched balances to request
                     if (Object.keys(snipBalances).length > 0) {
@@ -135,12 +181,31 @@ const ChatInterface = {
 
             if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
 
-            // Get JSON response
-            const data = await response.json();
-            fullResponse = data.response;
+            // Read the streamed response and render it as it arrives
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            const messagesContainer = document.getElementById('chat-messages');
+
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+
+                fullResponse += decoder.decode(value, { stream: true });
+                if (!assistantMessageDiv) {
+                    assistantMessageDiv = this.addMessage(fullResponse, 'assistant');
+                } else {
+                    assistantMessageDiv.textContent = fullResponse;
+                    messagesContainer.scrollTop = messagesContainer.scrollHeight;
+                }
+            }
+            fullResponse += decoder.decode();
 
             // Display assistant response
-            assistantMessageDiv = this.addMessage(fullResponse, 'assistant');
+            if (!assistantMessageDiv) {
+                assistantMessageDiv = this.addMessage(fullResponse, 'assistant');
+            } else {
+                assistantMessageDiv.textContent = fullResponse;
+            }
 
             // Update chat history
             ChatState.messages.push({ role: 'user', content: message });
@@ -170,6 +235,38 @@ const ChatInterface = {
         }
     },
 
+    async fetchWalletBalances(tokens) {
+        // The given SNIP-20 balances of the connected wallet, queried concurrently by the backend.
+        // SCRT is skipped (WalletState already has it); snip20 is only filled when the response
+        // has snip20_supported
+        const knownKeys = (window.WalletState && window.WalletState.viewingKeys) || {};
+        const viewingKeys = {};
+        for (const token of tokens) {
+            if (knownKeys[token.toLowerCase()]) {
+                viewingKeys[token.toLowerCase()] = knownKeys[token.toLowerCase()];
+            }
+        }
+        try {
+            const response = await fetch(`/api/wallet/balance/${ChatState.walletAddress}`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    tokens: tokens.map(token => token.toLowerCase()),
+                    viewing_keys: viewingKeys,
+                    scrt: false
+                })
+            });
+            if (!response.ok) {
+                console.error('❌ Wallet balance request failed:', response.status);
+                return null;
+            }
+            return await response.json();
+        } catch (error) {
+            console.error('❌ Error fetching wallet balances:', error);
+            return null;
+        }
+    },
+
     detectSnipTokens(message) {
         // Detect SNIP-20 token queries in the message
         // Returns array of detected token symbols
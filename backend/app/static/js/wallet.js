@@ -434,7 +434,7 @@ const WalletInterface = {
             
             // Try backend fallback
             try {
-                const response = await fetch(`/secret_gptee/api/wallet/balance/${WalletState.address}`);
+                const response = await fetch(`/api/wallet/balance/${WalletState.address}`);
                 if (response.ok) {
                     const data = await response.json();
                     if (data.success) {
@@ -0,0 +1,113 @@
+"""
+Microbenchmark: balance-intent detection per chat message.
+
+Compares the precompiled IntentMatcher with the original per-request regex
+loops it replaced (kept below as the reference implementation).
+
+Usage (from backend/):
+    python -m benchmarks.bench_intent [--iterations N]
+"""
+import argparse
+import logging
+import re
+import timeit
+from typing import Optional, Tuple
+
+from app.config import settings
+from app.services.intent import IntentMatcher
+
+LEGACY_SNIP20_TOKENS = ['shd', 'silk', 'sscrt', 'stkd-scrt', 'sinj', 'swbtc', 'susdt', 'snobleusdc']
+
+# Representative chat traffic: mostly general questions, some balance queries
+MESSAGES = [
+    "What is Secret Network?",
+    "Explain how TEEs keep my prompts private.",
+    "What's the latest block height?",
+    "Can you summarize the difference between SNIP-20 and CW-20 tokens?",
+    "what is my scrt balance",
+    "How much SHD do I have?",
+    "check stkd-scrt balance please",
+    "show my balance",
+    "Tell me a joke about validators and slashing.",
+    "query silk",
+    "I want to send 5 SCRT to secret1qyzx2kfg4sx2q5ntnll2yzxmv5y0u8x6l0zs4l",
+    "balance of snobleusdc",
+]
+
+
+def legacy_detect_snip20_query(message: str) -> Optional[str]:
+    """Original _detect_snip20_query: 7 f-string regexes per token, rebuilt per call."""
+    message_lower = message.lower()
+    for token in LEGACY_SNIP20_TOKENS:
+        patterns = [
+            rf'\b{token}\s+balance\b',
+            rf'\bmy\s+{token}\b',
+            rf'\bcheck\s+{token}\b',
+            rf'\bhow\s+much\s+{token}\b',
+            rf'\b{token}\s+amount\b',
+            rf'\bbalance\s+of\s+{token}\b',
+            rf'\bquery\s+{token}\b'
+        ]
+        for pattern in patterns:
+            if re.search(pattern, message_lower):
+                return token
+    return None
+
+
+def legacy_detect_scrt_query(message: str) -> bool:
+    """Original _detect_scrt_query: 11 regexes per call."""
+    message_lower = message.lower()
+    patterns = [
+        r'\bscrt\s+balance\b',
+        r'\bmy\s+scrt\b',
+        r'\bcheck\s+scrt\b',
+        r'\bhow\s+much\s+scrt\b',
+        r'\bscrt\s+amount\b',
+        r'\bbalance\s+of\s+scrt\b',
+        r'\bquery\s+scrt\b',
+        r'\bshow\s+scrt\b',
+        r'\bscrt\s+(token|tokens)\b',
+        r'\b(my|check|show|query)\s+(native\s+)?balance\b',
+        r'\bhow\s+much\s+(native\s+)?balance\b'
+    ]
+    return any(re.search(pattern, message_lower) for pattern in patterns)
+
+
+def legacy_classify(message: str) -> Tuple[Optional[str], Optional[str]]:
+    """What the original chat() did per request: SCRT check (twice), then SNIP-20."""
+    if legacy_detect_scrt_query(message):
+        return "scrt", None
+    legacy_detect_scrt_query(message)
+    token = legacy_detect_snip20_query(message)
+    return ("snip20", token) if token else (None, None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000, help="passes over the message corpus")
+    args = parser.parse_args()
+
+    # Detection logs at INFO; keep it out of the measurement
+    logging.disable(logging.INFO)
+    matcher = IntentMatcher(settings.snip20_tokens)
+
+    def run_legacy():
+        for message in MESSAGES:
+            legacy_classify(message)
+
+    def run_matcher():
+        for message in MESSAGES:
+            matcher.classify(message)
+
+    calls = args.iterations * len(MESSAGES)
+    legacy = min(timeit.repeat(run_legacy, number=args.iterations, repeat=3)) / calls
+    current = min(timeit.repeat(run_matcher, number=args.iterations, repeat=3)) / calls
+
+    print(f"messages per run: {len(MESSAGES)}, iterations: {args.iterations}")
+    print(f"legacy regex loops : {legacy * 1e6:8.2f} us/message")
+    print(f"IntentMatcher      : {current * 1e6:8.2f} us/message")
+    print(f"speedup            : {legacy / current:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Load test for /api/chat: throughput, p50/p95/p99 latency and time to first byte.
+
+Runs a fixed number of requests per mode at a given concurrency:
+  simple - plain question answered by one completion
+  tool   - question that makes the model call an MCP tool, then answer
+  stream - plain question with stream=true
+
+By default the backend is expected at --url. With --local, the SecretAI
+and MCP stubs (benchmarks.stubs) and the backend itself are started in this
+process, so the numbers measure the service's own overhead on top of the
+stubs' fixed latencies.
+
+Usage (from backend/):
+    python -m benchmarks.loadtest --local [--requests 200] [--concurrency 20] [--modes simple,tool,stream]
+    python -m benchmarks.loadtest --url http://localhost:3000 --output results.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.stubs import add_stub_arguments, create_servers, stub_configs
+
+MODES = {
+    "simple": {"message": "Tell me about Secret Network.", "stream": False},
+    "tool": {"message": "What is the latest block height?", "stream": False},
+    "stream": {"message": "Tell me about Secret Network.", "stream": True},
+}
+
+
+@dataclass
+class ModeResult:
+    """Measurements for one mode."""
+
+    mode: str
+    latencies: List[float] = field(default_factory=list)
+    ttfbs: List[float] = field(default_factory=list)
+    errors: Dict[str, int] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    def summary(self) -> Dict[str, object]:
+        completed = len(self.latencies)
+        return {
+            "mode": self.mode,
+            "requests": completed + sum(self.errors.values()),
+            "errors": dict(self.errors),
+            "throughput_rps": round(completed / self.elapsed, 2) if self.elapsed else 0.0,
+            "latency_ms": {f"p{p}": round(percentile(self.latencies, p) * 1000, 1) for p in (50, 95, 99)},
+            "ttfb_ms": {f"p{p}": round(percentile(self.ttfbs, p) * 1000, 1) for p in (50, 95, 99)},
+        }
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for no samples."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+async def _one_request(client: httpx.AsyncClient, url: str, payload: Dict[str, object], result: ModeResult):
+    started = time.perf_counter()
+    ttfb: Optional[float] = None
+    try:
+        async with client.stream("POST", url, json=payload) as response:
+            async for _ in response.aiter_bytes():
+                if ttfb is None:
+                    ttfb = time.perf_counter() - started
+            if response.status_code != 200:
+                key = str(response.status_code)
+                result.errors[key] = result.errors.get(key, 0) + 1
+                return
+    except httpx.HTTPError as e:
+        key = type(e).__name__
+        result.errors[key] = result.errors.get(key, 0) + 1
+        return
+
+    latency = time.perf_counter() - started
+    result.latencies.append(latency)
+    result.ttfbs.append(ttfb if ttfb is not None else latency)
+
+
+async def run_mode(base_url: str, mode: str, requests: int, concurrency: int, warmup: int) -> ModeResult:
+    """Send `requests` requests of one mode with `concurrency` workers."""
+    url = base_url.rstrip("/") + "/api/chat"
+    payload = MODES[mode]
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=120.0, limits=limits) as client:
+        scratch = ModeResult(mode)
+        for _ in range(warmup):
+            await _one_request(client, url, payload, scratch)
+
+        result = ModeResult(mode)
+        remaining = requests
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                await _one_request(client, url, payload, result)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        result.elapsed = time.perf_counter() - started
+        return result
+
+
+def print_table(summaries: List[Dict[str, object]]):
+    header = f"{'mode':<8} {'reqs':>6} {'errors':>6} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'ttfb50':>8} {'ttfb95':>8}"
+    print(header)
+    print("-" * len(header))
+    for s in summaries:
+        lat, ttfb = s["latency_ms"], s["ttfb_ms"]
+        print(
+            f"{s['mode']:<8} {s['requests']:>6} {sum(s['errors'].values()):>6} {s['throughput_rps']:>8} "
+            f"{lat['p50']:>8} {lat['p95']:>8} {lat['p99']:>8} {ttfb['p50']:>8} {ttfb['p95']:>8}"
+        )
+    print("(latencies in ms)")
+
+
+async def _wait_until_up(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} did not come up within {timeout}s")
+            await asyncio.sleep(0.2)
+
+
+async def run(args: argparse.Namespace) -> List[Dict[str, object]]:
+    servers = []
+    base_url = args.url
+    if args.local:
+        llm_port, mcp_port, app_port = args.local_ports
+        # Must be set before the app (and its settings) are imported
+        os.environ.update({
+            "SECRET_AI_API_KEY": "stub",
+            "SECRET_AI_BASE_URL": f"http://127.0.0.1:{llm_port}/v1",
+            "SECRET_MCP_URL": f"http://127.0.0.1:{mcp_port}",
+            "ENABLE_SECRET_NETWORK": "true",
+            "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+        })
+        import uvicorn
+        from app.main import app
+
+        llm_config, mcp_config = stub_configs(args)
+        servers = create_servers(llm_config, mcp_config, llm_port=llm_port, mcp_port=mcp_port)
+        servers.append(uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=app_port, log_level="warning")))
+        base_url = f"http://127.0.0.1:{app_port}"
+
+    tasks = []
+    try:
+        if args.local:
+            # Stubs first, so the backend's startup initialization can reach them
+            tasks = [asyncio.create_task(server.serve()) for server in servers[:2]]
+            await _wait_until_up(f"http://127.0.0.1:{mcp_port}/api/health")
+            tasks.append(asyncio.create_task(servers[2].serve()))
+        await _wait_until_up(base_url.rstrip("/") + "/api/health/ready")
+        summaries = []
+        for mode in args.modes:
+            result = await run_mode(base_url, mode, args.requests, args.concurrency, args.warmup)
+            summaries.append(result.summary())
+        return summaries
+    finally:
+        for server in servers:
+            server.should_exit = True
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:3000", help="backend base URL")
+    parser.add_argument("--local", action="store_true", help="start the stubs and the backend in-process")
+    parser.add_argument("--local-ports", type=int, nargs=3, default=(8081, 8082, 3001),
+                        metavar=("LLM", "MCP", "APP"), help="ports used with --local")
+    parser.add_argument("--modes", default="simple,tool,stream", help="comma-separated modes to run")
+    parser.add_argument("--requests", type=int, default=200, help="requests per mode")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent clients")
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests per mode")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    args.modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = set(args.modes) - set(MODES)
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(sorted(unknown))}")
+
+    summaries = asyncio.run(run(args))
+    print_table(summaries)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summaries, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Deterministic local stand-ins for SecretAI and the Secret Network MCP server.
+
+The LLM stub serves an OpenAI-compatible /v1/chat/completions endpoint with
+a fixed time to first token and token rate. It answers with a USE_TOOL: call
+when the latest user message mentions one of the tool trigger words, and with
+a fixed-length text answer otherwise (including after tool results). The MCP
+stub serves /api/health, /api/mcp/tools/list and /api/mcp/tools/call with a
+fixed latency.
+
+Usage (from backend/):
+    python -m benchmarks.stubs [--llm-port 8081] [--mcp-port 8082] [--ttft 0.2] [--token-rate 50]
+
+Then point the backend at them:
+    SECRET_AI_BASE_URL=http://127.0.0.1:8081/v1 SECRET_MCP_URL=http://127.0.0.1:8082 \\
+    SECRET_AI_API_KEY=stub ENABLE_SECRET_NETWORK=true uvicorn app.main:app --port 3000
+"""
+import argparse
+import asyncio
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+TOOL_RESULTS_PREFIX = "Tool results:"
+ANSWER_WORDS = (
+    "Secret Network is a privacy-preserving blockchain where smart contracts run inside "
+    "trusted execution environments so inputs, outputs and state stay encrypted."
+).split()
+
+STUB_TOOLS = [
+    {
+        "name": "secret_query_block",
+        "description": "Get the latest block on Secret Network",
+        "inputSchema": {"type": "object", "properties": {}, "required": []}
+    },
+    {
+        "name": "secret_query_balance",
+        "description": "Get the SCRT balance of an address",
+        "inputSchema": {
+            "type": "object",
+            "properties": {"address": {"type": "string"}},
+            "required": ["address"]
+        }
+    }
+]
+
+
+@dataclass
+class LLMStubConfig:
+    """Timing and behaviour of the stub completion endpoint."""
+
+    ttft: float = 0.2                 # Seconds before the first token (prefill)
+    token_rate: float = 50.0          # Generated tokens per second
+    answer_tokens: int = 60           # Tokens in a plain text answer
+    tool_triggers: Tuple[str, ...] = ("block", "height")  # Words that make the model call a tool
+    tool_call: str = "USE_TOOL: secret_query_block with arguments {}"
+
+
+@dataclass
+class MCPStubConfig:
+    """Timing of the stub MCP server."""
+
+    latency: float = 0.05             # Seconds per tool call
+
+
+def _last_user_message(messages: List[Dict[str, Any]]) -> str:
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            return message.get("content") or ""
+    return ""
+
+
+def _reply_tokens(config: LLMStubConfig, messages: List[Dict[str, Any]]) -> List[str]:
+    """Pick the deterministic reply for a conversation and split it into tokens."""
+    last_user = _last_user_message(messages)
+    if not last_user.startswith(TOOL_RESULTS_PREFIX) and any(
+        trigger in last_user.lower() for trigger in config.tool_triggers
+    ):
+        return [config.tool_call]
+
+    words = [ANSWER_WORDS[i % len(ANSWER_WORDS)] for i in range(config.answer_tokens)]
+    return [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+
+def create_llm_stub(config: LLMStubConfig) -> FastAPI:
+    """OpenAI-compatible chat completions with fixed prefill latency and token rate."""
+    app = FastAPI(title="SecretAI stub")
+    token_delay = 1.0 / config.token_rate if config.token_rate > 0 else 0.0
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        tokens = _reply_tokens(config, messages)
+        prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4
+        model = body.get("model", "stub")
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep(config.ttft + token_delay * len(tokens))
+            return {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop"
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(tokens),
+                    "total_tokens": prompt_tokens + len(tokens)
+                }
+            }
+
+        async def events():
+            await asyncio.sleep(config.ttft)
+            for i, token in enumerate(tokens):
+                if i:
+                    await asyncio.sleep(token_delay)
+                chunk = {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            done = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+            }
+            yield f"data: {json.dumps(done)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def create_mcp_stub(config: MCPStubConfig) -> FastAPI:
+    """MCP HTTP API with canned block and balance results."""
+    app = FastAPI(title="Secret MCP stub")
+    state = {"height": 1_000_000}
+
+    @app.get("/api/health")
+    async def health():
+        return {"status": "healthy", "service": "secret-mcp-stub"}
+
+    @app.get("/api/mcp/tools/list")
+    async def list_tools():
+        return {"tools": STUB_TOOLS}
+
+    @app.post("/api/mcp/tools/call")
+    async def call_tool(request: Request):
+        body = await request.json()
+        await asyncio.sleep(config.latency)
+        name = body.get("name")
+        if name == "secret_query_block":
+            state["height"] += 1
+            result = {"height": state["height"], "chain_id": "pulsar-3"}
+        elif name == "secret_query_balance":
+            result = {"address": body.get("arguments", {}).get("address"), "amount": "1000000", "denom": "uscrt"}
+        else:
+            return {"content": [{"type": "text", "text": f"Unknown tool: {name}"}], "isError": True}
+        return {"content": [{"type": "text", "text": json.dumps(result)}], "isError": False}
+
+    return app
+
+
+def create_servers(
+    llm_config: LLMStubConfig,
+    mcp_config: MCPStubConfig,
+    host: str = "127.0.0.1",
+    llm_port: int = 8081,
+    mcp_port: int = 8082
+) -> List[uvicorn.Server]:
+    """Build (but don't start) uvicorn servers for both stubs."""
+    return [
+        uvicorn.Server(uvicorn.Config(create_llm_stub(llm_config), host=host, port=llm_port, log_level="warning")),
+        uvicorn.Server(uvicorn.Config(create_mcp_stub(mcp_config), host=host, port=mcp_port, log_level="warning"))
+    ]
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    """Stub timing options, shared with the load test."""
+    parser.add_argument("--ttft", type=float, default=0.2, help="LLM seconds before the first token")
+    parser.add_argument("--token-rate", type=float, default=50.0, help="LLM tokens per second")
+    parser.add_argument("--answer-tokens", type=int, default=60, help="tokens in a plain answer")
+    parser.add_argument("--mcp-latency", type=float, default=0.05, help="MCP seconds per tool call")
+
+
+def stub_configs(args: argparse.Namespace) -> Tuple[LLMStubConfig, MCPStubConfig]:
+    return (
+        LLMStubConfig(ttft=args.ttft, token_rate=args.token_rate, answer_tokens=args.answer_tokens),
+        MCPStubConfig(latency=args.mcp_latency)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--llm-port", type=int, default=8081)
+    parser.add_argument("--mcp-port", type=int, default=8082)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    llm_config, mcp_config = stub_configs(args)
+    servers = create_servers(llm_config, mcp_config, args.host, args.llm_port, args.mcp_port)
+    print(f"SecretAI stub: http://{args.host}:{args.llm_port}/v1")
+    print(f"MCP stub:      http://{args.host}:{args.mcp_port}")
+
+    async def serve():
+        await asyncio.gather(*(server.serve() for server in servers))
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Tests for LLM admission control."""
+import asyncio
+
+import pytest
+
+from app.services.admission import AdmissionController, AdmissionRejected
+
+
+def test_rejects_when_queue_full():
+    controller = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=5)
+
+    async def run():
+        await controller.acquire()
+        queued = asyncio.ensure_future(controller.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire()
+        controller.release()
+        await queued
+        controller.release()
+
+    asyncio.run(run())
+
+    stats = controller.stats()
+    assert stats["rejected_queue_full"] == 1
+    assert stats["admitted"] == 2
+    assert stats["in_flight"] == 0
+    assert stats["queued"] == 0
+
+
+def test_rejects_after_queue_timeout():
+    controller = AdmissionController(max_concurrent=1, max_queue=4, queue_timeout=0.05, retry_after=7)
+
+    async def run():
+        await controller.acquire()
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await controller.acquire()
+        return excinfo.value
+
+    error = asyncio.run(run())
+
+    assert error.retry_after == 7
+    assert controller.stats()["rejected_timeout"] == 1
+    assert controller.stats()["queued"] == 0
+
+
+def test_cancelled_waiter_does_not_leak_slot():
+    controller = AdmissionController(max_concurrent=1, max_queue=4, queue_timeout=5)
+
+    async def run():
+        await controller.acquire()
+        waiter = asyncio.ensure_future(controller.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+        controller.release()
+        # The slot is free again for a new caller
+        assert controller.try_acquire()
+        controller.release()
+
+    asyncio.run(run())
+
+    assert controller.stats()["in_flight"] == 0
+
+
+def test_timed_out_waiter_does_not_leak_handed_over_slot(monkeypatch):
+    controller = AdmissionController(max_concurrent=1, max_queue=4, queue_timeout=5)
+
+    async def slot_handed_over_at_timeout(waiter, timeout):
+        # The holder releases (granting this waiter the slot) just as the wait times out
+        controller.release()
+        raise asyncio.TimeoutError
+
+    async def run():
+        await controller.acquire()
+        monkeypatch.setattr("app.services.admission.asyncio.wait_for", slot_handed_over_at_timeout)
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire()
+
+    asyncio.run(run())
+
+    assert controller.stats()["in_flight"] == 0
+    assert controller.stats()["rejected_timeout"] == 1
@@ -1,7 +1,11 @@
 """Tests for chat endpoint."""
+import asyncio
+
 import pytest
 from fastapi.testclient import TestClient
+from app.config import settings
 from app.main import app
+from app.services.secret_ai import secret_ai_service
 
 client = TestClient(app)
 
@@ -15,8 +19,8 @@ def test_chat_endpoint_structure():
             "stream": False
         }
     )
-    # May fail if SecretAI is not configured, but should not be 422 (validation error)
-    assert response.status_code in [200, 500], f"Unexpected status: {response.status_code}"
+    # 503 if SecretAI is not configured, but should not be 422 (validation error)
+    assert response.status_code in [200, 500, 503], f"Unexpected status: {response.status_code}"
 
 def test_chat_invalid_request():
     """Test chat endpoint rejects invalid requests."""
@@ -45,3 +49,149 @@ def test_chat_response_structure():
         assert "timestamp" in data
         assert isinstance(data["response"], str)
         assert isinstance(data["timestamp"], str)
+
+def test_chat_unavailable_while_initializing(monkeypatch):
+    """Requests during background startup get 503 + Retry-After instead of waiting."""
+    monkeypatch.setattr(secret_ai_service, "_initialized", False)
+    monkeypatch.setattr(secret_ai_service, "initializing", lambda: True)
+
+    response = client.post("/api/chat", json={"message": "Hello"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(settings.LLM_RETRY_AFTER)
+
+def test_chat_works_without_history_when_store_is_unavailable(monkeypatch):
+    """A history store that can't open falls back to the request's history instead of a 500."""
+    from app.routes import chat as chat_routes
+
+    received = []
+
+    async def broken_get_messages(session_id, limit=50):
+        raise OSError("unable to open database file")
+
+    async def fake_chat(**kwargs):
+        received.append(kwargs["history"])
+        return "Hi there"
+
+    monkeypatch.setattr(settings, "ENABLE_HISTORY", True)
+    monkeypatch.setattr(chat_routes.history_store, "get_messages", broken_get_messages)
+    monkeypatch.setattr(secret_ai_service, "_initialized", True)
+    monkeypatch.setattr(secret_ai_service, "chat", fake_chat)
+
+    response = client.post("/api/chat", json={"message": "Hello", "session_id": "s1"})
+
+    assert response.status_code == 200
+    assert response.json()["response"] == "Hi there"
+    assert received == [[]]
+
+def test_chat_cancelled_when_client_disconnects(monkeypatch):
+    """A non-streaming turn is cancelled, not finished, once the client is gone."""
+    from app.routes import chat as chat_routes
+    from app.services import metrics
+
+    cancelled = []
+
+    async def slow_chat(**kwargs):
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def disconnected(http_request):
+        await asyncio.sleep(0.01)
+
+    monkeypatch.setattr(secret_ai_service, "_initialized", True)
+    monkeypatch.setattr(secret_ai_service, "chat", slow_chat)
+    monkeypatch.setattr(chat_routes, "_wait_for_disconnect", disconnected)
+    before = metrics.CHAT_DISCONNECTS_TOTAL.value(mode="simple")
+
+    response = client.post("/api/chat", json={"message": "Hello"})
+
+    assert response.status_code == 499
+    assert cancelled == [True]
+    assert metrics.CHAT_DISCONNECTS_TOTAL.value(mode="simple") == before + 1
+
+def test_streaming_chat_closes_stream_when_client_disconnects(monkeypatch):
+    """The token stream is still closed after a mid-stream disconnect cancels the body."""
+    import json
+    from app.services import metrics
+
+    closed = []
+
+    class HangingStream:
+        """Sends one chunk, then waits for the next one forever."""
+
+        def __init__(self):
+            self.chunks = ["Hello"]
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            if self.chunks:
+                return self.chunks.pop(0)
+            await asyncio.Event().wait()
+
+        async def aclose(self):
+            await asyncio.sleep(0)  # Like closing the upstream response
+            closed.append(True)
+
+    monkeypatch.setattr(secret_ai_service, "_initialized", True)
+    monkeypatch.setattr(secret_ai_service, "chat_stream", lambda **kwargs: HangingStream())
+    before = metrics.CHAT_DISCONNECTS_TOTAL.value(mode="stream")
+
+    async def run():
+        body = json.dumps({"message": "Hello", "stream": True}).encode()
+        first_chunk = asyncio.Event()
+        body_sent = []
+        sent = []
+
+        async def receive():
+            if body_sent:
+                await first_chunk.wait()
+                return {"type": "http.disconnect"}
+            body_sent.append(True)
+            return {"type": "http.request", "body": body}
+
+        async def send(message):
+            sent.append(message)
+            if message["type"] == "http.response.body":
+                first_chunk.set()
+
+        scope = {
+            "type": "http",
+            # Uvicorn's spec version: Starlette cancels the body on disconnect
+            "asgi": {"version": "3.0", "spec_version": "2.3"},
+            "http_version": "1.1",
+            "method": "POST",
+            "scheme": "http",
+            "path": "/api/chat",
+            "raw_path": b"/api/chat",
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"content-type", b"application/json"), (b"host", b"testserver")],
+            "client": ("testclient", 50000),
+            "server": ("testserver", 80)
+        }
+        await asyncio.wait_for(app(scope, receive, send), timeout=5)
+        return sent
+
+    sent = asyncio.run(run())
+
+    assert sent[0]["status"] == 200
+    assert sent[1]["body"] == b"Hello"
+    assert closed == [True]
+    assert metrics.CHAT_DISCONNECTS_TOTAL.value(mode="stream") == before + 1
+
+def test_cancel_on_disconnect_returns_finished_work():
+    from app.routes.chat import _cancel_on_disconnect
+
+    class ConnectedRequest:
+        async def is_disconnected(self):
+            return False
+
+    async def work():
+        return "done"
+
+    assert asyncio.run(_cancel_on_disconnect(ConnectedRequest(), work())) == "done"
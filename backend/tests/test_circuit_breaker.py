@@ -0,0 +1,66 @@
+"""Tests for the MCP circuit breaker."""
+from app.services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+def make_breaker(monkeypatch, now):
+    monkeypatch.setattr("app.services.circuit_breaker.time.monotonic", lambda: now[0])
+    return CircuitBreaker("test", window=30, min_calls=4, failure_rate=0.5, slow_call_seconds=2, open_seconds=10)
+
+
+def test_opens_at_failure_rate(monkeypatch):
+    now = [100.0]
+    breaker = make_breaker(monkeypatch, now)
+
+    breaker.record_success(0.1)
+    breaker.record_failure()
+    breaker.record_success(0.1)
+    assert breaker.state == CLOSED     # Below min_calls
+    breaker.record_failure()           # 2 of 4 failed
+
+    assert breaker.state == OPEN
+    assert breaker.allow_request() is False
+    assert breaker.stats()["rejected"] == 1
+    assert breaker.retry_after() == 10
+
+
+def test_slow_calls_count_as_failures(monkeypatch):
+    breaker = make_breaker(monkeypatch, [100.0])
+
+    for _ in range(4):
+        breaker.record_success(5.0)
+
+    assert breaker.state == OPEN
+
+
+def test_old_outcomes_leave_the_window(monkeypatch):
+    now = [100.0]
+    breaker = make_breaker(monkeypatch, now)
+    breaker.record_failure()
+    breaker.record_failure()
+
+    now[0] += 60
+    breaker.record_success(0.1)
+    breaker.record_failure()
+
+    assert breaker.state == CLOSED
+
+
+def test_half_open_allows_one_probe(monkeypatch):
+    now = [100.0]
+    breaker = make_breaker(monkeypatch, now)
+    for _ in range(4):
+        breaker.record_failure()
+
+    now[0] += 10
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request() is True
+    assert breaker.allow_request() is False   # Probe already in flight
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    now[0] += 10
+    assert breaker.allow_request() is True
+    breaker.record_success(0.1)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["opened"] == 2
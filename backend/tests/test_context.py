@@ -0,0 +1,56 @@
+"""Tests for token-budget context assembly."""
+from app.models import Message
+from app.services.context import ContextBuilder, estimate_tokens, message_tokens
+
+
+def make_history(count, size):
+    roles = ["user", "assistant"]
+    return [Message(role=roles[i % 2], content=f"{i:03d}" + "x" * (size - 3)) for i in range(count)]
+
+
+def test_everything_fits():
+    builder = ContextBuilder(budget=4096, reserved_completion=512)
+    history = make_history(4, 40)
+
+    messages, usage = builder.build("system", history, "question")
+
+    assert [m["content"] for m in messages[1:-1]] == [m.content for m in history]
+    assert usage["history_messages_used"] == 4
+    assert usage["history_messages_dropped"] == 0
+    assert usage["prompt_tokens"] == sum(message_tokens(m["content"]) for m in messages)
+
+
+def test_newest_history_is_kept_within_budget():
+    builder = ContextBuilder(budget=600, reserved_completion=200)
+    history = make_history(20, 200)   # ~54 tokens each
+
+    messages, usage = builder.build("system", history, "question")
+
+    assert usage["prompt_tokens"] <= 400
+    assert usage["history_messages_dropped"] > 0
+    # Most recent history message survives, in order, right before the question
+    assert messages[-2]["content"] == history[-1].content
+    assert messages[-1] == {"role": "user", "content": "question"}
+    # Dropped turns are replaced by a note after the (unchanged) system prompt
+    assert [m["role"] for m in messages].count("system") == 1
+    assert messages[0]["content"].startswith("system\n\n[")
+    assert "earlier messages omitted" in messages[0]["content"]
+    assert usage["prompt_tokens"] == sum(message_tokens(m["content"]) for m in messages)
+
+
+def test_long_message_is_truncated_from_the_front():
+    builder = ContextBuilder(budget=400, reserved_completion=100)
+    history = [Message(role="user", content="start " + "y" * 4000 + " end")]
+
+    messages, usage = builder.build("system", history, "question")
+
+    kept = messages[-2]["content"]
+    assert kept.startswith("…") and kept.endswith(" end")
+    assert usage["history_messages_truncated"] == 1
+    assert usage["prompt_tokens"] <= 300
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
@@ -2,6 +2,7 @@
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
+from app.services.secret_ai import secret_ai_service
 
 client = TestClient(app)
 
@@ -22,3 +23,21 @@ def test_health_check_structure():
     required_fields = ["status", "version", "secret_ai", "history_enabled"]
     for field in required_fields:
         assert field in data, f"Missing field: {field}"
+
+def test_liveness_probe():
+    response = client.get("/api/health/live")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+def test_readiness_probe(monkeypatch):
+    """Ready only once SecretAI is initialized; 503 with Retry-After before that."""
+    monkeypatch.setattr(secret_ai_service, "_initialized", False)
+    response = client.get("/api/health/ready")
+    assert response.status_code == 503
+    assert response.json()["ready"] is False
+    assert "Retry-After" in response.headers
+
+    monkeypatch.setattr(secret_ai_service, "_initialized", True)
+    response = client.get("/api/health/ready")
+    assert response.status_code == 200
+    assert response.json()["ready"] is True
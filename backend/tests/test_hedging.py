@@ -0,0 +1,57 @@
+"""Tests for the hedged-completion policy."""
+from app.services.admission import AdmissionController
+from app.services.hedging import HEDGE_BURST, HedgePolicy
+
+
+def test_no_delay_until_enough_samples():
+    policy = HedgePolicy(min_samples=3, min_delay=0.0)
+    policy.observe(1.0)
+    policy.observe(2.0)
+    assert policy.next_delay() is None
+
+    policy.observe(3.0)
+    assert policy.next_delay() == 3.0
+
+
+def test_delay_is_the_latency_percentile_with_a_floor():
+    policy = HedgePolicy(percentile=90, min_delay=0.0, min_samples=1)
+    for latency in range(1, 11):
+        policy.observe(latency / 10)
+    assert policy.next_delay() == 0.9
+
+    floored = HedgePolicy(percentile=50, min_delay=2.0, min_samples=1)
+    floored.observe(0.1)
+    assert floored.next_delay() == 2.0
+
+
+def test_budget_limits_hedge_rate():
+    policy = HedgePolicy(max_rate=0.25, min_samples=1)
+    fired = 0
+    for _ in range(40):
+        policy.next_delay()
+        fired += policy.try_fire()
+    assert fired == 10
+    assert policy.stats()["skipped_budget"] == 30
+
+
+def test_unused_budget_is_capped():
+    policy = HedgePolicy(max_rate=1.0, min_samples=1)
+    for _ in range(50):
+        policy.next_delay()
+    assert sum(policy.try_fire() for _ in range(50)) == HEDGE_BURST
+
+
+def test_hedge_needs_a_free_admission_slot():
+    admission = AdmissionController(max_concurrent=1, max_queue=0, queue_timeout=1)
+    policy = HedgePolicy(max_rate=1.0, min_samples=1, admission=admission)
+    policy.next_delay()
+
+    assert admission.try_acquire()
+    assert policy.try_fire() is False
+    assert policy.stats()["skipped_admission"] == 1
+
+    admission.release()
+    assert policy.try_fire() is True
+    assert admission.stats()["in_flight"] == 1
+    policy.release()
+    assert admission.stats()["in_flight"] == 0
@@ -0,0 +1,51 @@
+"""Tests for the chat history store."""
+import asyncio
+
+import pytest
+
+from app.services.history import HistoryStore, sqlite_path
+
+
+def test_sqlite_path():
+    assert sqlite_path("sqlite+aiosqlite:///./chat_history.db") == "./chat_history.db"
+    with pytest.raises(ValueError):
+        sqlite_path("postgresql://localhost/db")
+
+
+def test_store_round_trip(tmp_path):
+    store = HistoryStore(f"sqlite+aiosqlite:///{tmp_path / 'history.db'}", flush_interval=60)
+
+    async def run():
+        await store.initialize()
+        async with store._db.execute("PRAGMA journal_mode") as cursor:
+            journal_mode = (await cursor.fetchone())[0]
+
+        store.append("a", "user", "hi")
+        store.append("a", "assistant", "hello")
+        store.append("b", "user", "other session")
+        store.append("a", "user", "again")
+
+        # Reads see queued writes without waiting for the background flush
+        session_a = await store.get_messages("a")
+        latest = await store.get_messages("a", limit=2)
+        deleted = await store.delete_session("a")
+        after_delete = await store.get_messages("a")
+        session_b = await store.get_messages("b")
+        await store.close()
+        return journal_mode, session_a, latest, deleted, after_delete, session_b
+
+    journal_mode, session_a, latest, deleted, after_delete, session_b = asyncio.run(run())
+
+    assert journal_mode == "wal"
+    assert [m.content for m in session_a] == ["hi", "hello", "again"]
+    assert [m.content for m in latest] == ["hello", "again"]
+    assert deleted == 3
+    assert after_delete == []
+    assert [m.role for m in session_b] == ["user"]
+
+
+def test_append_is_dropped_while_the_store_is_not_open():
+    # e.g. initialize() failed at startup: nothing is buffered for a later flush
+    store = HistoryStore("sqlite+aiosqlite:///unused.db")
+    store.append("a", "user", "hi")
+    assert store._pending == []
@@ -0,0 +1,30 @@
+"""Tests for balance intent detection."""
+import pytest
+
+from app.services.intent import Intent, IntentMatcher
+from benchmarks.bench_intent import LEGACY_SNIP20_TOKENS, MESSAGES, legacy_classify
+
+EXTRA_MESSAGES = [
+    "check stkd-scrt",
+    "my sscrt balance",
+    "how much   sinj do I hold",
+    "swbtc amount",
+    "my shdx balance",
+    "my silk and my shd",
+    "scrt tokens",
+    "how much native balance",
+    "MY SUSDT",
+    "nothing to see here",
+]
+
+
+@pytest.mark.parametrize("message", MESSAGES + EXTRA_MESSAGES)
+def test_matches_legacy_detection(message):
+    matcher = IntentMatcher(LEGACY_SNIP20_TOKENS)
+    assert tuple(matcher.classify(message)) == legacy_classify(message)
+
+
+def test_token_list_is_configurable():
+    matcher = IntentMatcher(["shd", "sATOM"])
+    assert matcher.classify("check satom balance") == Intent("snip20", "satom")
+    assert matcher.classify("my silk") == Intent()
@@ -0,0 +1,359 @@
+"""Tests for SecretAI endpoint routing and failover."""
+import asyncio
+from types import SimpleNamespace
+
+import anyio
+import httpx
+import pytest
+from openai import APIConnectionError, BadRequestError, InternalServerError
+
+from app.services.admission import AdmissionController
+from app.services.hedging import HedgePolicy
+from app.services.llm_pool import LLMEndpoint, LLMPool
+
+REQUEST = httpx.Request("POST", "http://llm.test/v1/chat/completions")
+
+
+def server_error():
+    return InternalServerError("upstream failed", response=httpx.Response(502, request=REQUEST), body=None)
+
+
+def bad_request():
+    return BadRequestError("bad request", response=httpx.Response(400, request=REQUEST), body=None)
+
+
+class FakeStream:
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.chunks:
+            raise StopAsyncIteration
+        item = self.chunks.pop(0)
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeCompletions:
+    """Returns (or raises) the queued outcomes and records every request."""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def endpoint(name, outcomes, model="model-a"):
+    completions = FakeCompletions(outcomes)
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return LLMEndpoint(f"http://{name}/v1", model, client), completions
+
+
+def test_least_outstanding_routing_prefers_idle_endpoint():
+    busy, busy_calls = endpoint("busy", [])
+    idle, idle_calls = endpoint("idle", ["ok"])
+    busy.outstanding = 2
+    pool = LLMPool([busy, idle])
+
+    assert asyncio.run(pool.create({"messages": []})) == "ok"
+    assert not busy_calls.calls
+    assert len(idle_calls.calls) == 1
+    assert idle.outstanding == 0
+
+
+def test_latency_routing_prefers_faster_endpoint():
+    slow, _ = endpoint("slow", [])
+    fast, fast_calls = endpoint("fast", ["ok"])
+    slow.latency_ewma, fast.latency_ewma = 2.0, 0.5
+    pool = LLMPool([slow, fast], routing="latency")
+
+    asyncio.run(pool.create({"messages": []}))
+    assert len(fast_calls.calls) == 1
+
+
+def test_requests_go_to_endpoints_serving_their_model():
+    other, other_calls = endpoint("other", [], model="model-b")
+    busy, busy_calls = endpoint("busy", ["ok"], model="model-a")
+    busy.outstanding = 5
+    pool = LLMPool([other, busy])
+
+    assert asyncio.run(pool.create({"model": "model-a", "messages": []})) == "ok"
+    assert not other_calls.calls
+    assert busy_calls.calls[0]["model"] == "model-a"
+    assert pool.choose_model() == "model-b"
+
+
+def test_failover_stays_on_endpoints_serving_the_model():
+    first, _ = endpoint("first", [server_error()], model="model-a")
+    other, other_calls = endpoint("other", [], model="model-b")
+    pool = LLMPool([first, other])
+
+    with pytest.raises(InternalServerError):
+        asyncio.run(pool.create({"model": "model-a", "messages": []}))
+    assert not other_calls.calls
+
+
+def test_create_fails_over_on_connection_and_server_errors():
+    first, _ = endpoint("first", [APIConnectionError(request=REQUEST)])
+    second, _ = endpoint("second", [server_error()])
+    third, third_calls = endpoint("third", ["ok"], model="model-c")
+    pool = LLMPool([first, second, third])
+
+    assert asyncio.run(pool.create({"model": "ignored", "messages": []})) == "ok"
+    # Each endpoint gets its own model name
+    assert third_calls.calls[0]["model"] == "model-c"
+    assert pool.failovers == 2
+    assert first.failures == second.failures == 1
+    assert "APIConnectionError" in first.stats()["last_error"]
+
+
+def test_create_raises_when_every_endpoint_fails():
+    first, _ = endpoint("first", [server_error()])
+    second, _ = endpoint("second", [server_error()])
+    pool = LLMPool([first, second])
+
+    with pytest.raises(InternalServerError):
+        asyncio.run(pool.create({"messages": []}))
+
+
+def test_create_does_not_fail_over_on_client_errors():
+    first, _ = endpoint("first", [bad_request()])
+    second, second_calls = endpoint("second", ["ok"])
+    pool = LLMPool([first, second])
+
+    with pytest.raises(BadRequestError):
+        asyncio.run(pool.create({"messages": []}))
+    assert not second_calls.calls
+    assert pool.failovers == 0
+
+
+def test_endpoint_is_ejected_after_consecutive_failures():
+    flaky, flaky_calls = endpoint("flaky", [server_error(), server_error()])
+    steady, _ = endpoint("steady", ["ok", "ok", "ok"])
+    pool = LLMPool([flaky, steady], eject_after=2, eject_seconds=60)
+
+    async def run():
+        for _ in range(3):
+            # Keep the flaky endpoint first in line while it is healthy
+            steady.outstanding = 1
+            await pool.create({"messages": []})
+            steady.outstanding = 0
+
+    asyncio.run(run())
+    assert len(flaky_calls.calls) == 2
+    stats = pool.stats()["endpoints"][0]
+    assert stats["healthy"] is False
+    assert stats["ejected_for"] > 0
+
+
+def test_ejected_endpoints_are_still_tried_when_nothing_else_is_left():
+    only, calls = endpoint("only", ["ok"])
+    only.ejected_until = float("inf")
+    pool = LLMPool([only])
+
+    assert asyncio.run(pool.create({"messages": []})) == "ok"
+    assert len(calls.calls) == 1
+
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_stream_fails_over_before_the_first_chunk():
+    broken_stream = FakeStream([APIConnectionError(request=REQUEST)])
+    first, _ = endpoint("first", [broken_stream])
+    second, _ = endpoint("second", [FakeStream(["a", "b"])])
+    pool = LLMPool([first, second])
+
+    assert asyncio.run(collect(pool.stream({"messages": []}))) == ["a", "b"]
+    assert broken_stream.closed
+    assert pool.failovers == 1
+    assert first.outstanding == second.outstanding == 0
+
+
+def test_stream_does_not_fail_over_after_the_first_chunk():
+    stream = FakeStream(["a", APIConnectionError(request=REQUEST)])
+    first, _ = endpoint("first", [stream])
+    second, second_calls = endpoint("second", [FakeStream(["b"])])
+    pool = LLMPool([first, second])
+    received = []
+
+    async def run():
+        async for chunk in pool.stream({"messages": []}):
+            received.append(chunk)
+
+    with pytest.raises(APIConnectionError):
+        asyncio.run(run())
+    assert received == ["a"]
+    assert not second_calls.calls
+    assert stream.closed
+
+
+def test_stream_closes_upstream_when_consumer_stops_early():
+    stream = FakeStream(["a", "b", "c"])
+    only, _ = endpoint("only", [stream])
+    pool = LLMPool([only])
+
+    async def run():
+        chunks = pool.stream({"messages": []})
+        first = await chunks.__anext__()
+        await chunks.aclose()
+        return first
+
+    assert asyncio.run(run()) == "a"
+    assert stream.closed
+    assert only.outstanding == 0
+
+
+def test_stream_closes_upstream_when_consumer_is_cancelled():
+    class HangingStream(FakeStream):
+        async def __anext__(self):
+            await asyncio.Event().wait()
+
+        async def close(self):
+            await asyncio.sleep(0)  # Like releasing the connection
+            self.closed = True
+
+    stream = HangingStream([])
+    only, _ = endpoint("only", [stream])
+    pool = LLMPool([only])
+
+    async def run():
+        with anyio.move_on_after(0.01):
+            await collect(pool.stream({"messages": []}))
+
+    asyncio.run(run())
+    assert stream.closed
+    assert only.outstanding == 0
+
+
+def test_from_config_parses_endpoint_models(monkeypatch):
+    clients = []
+    monkeypatch.setattr("app.services.llm_pool.AsyncOpenAI", lambda **kwargs: clients.append(kwargs) or SimpleNamespace())
+
+    pool = LLMPool.from_config(
+        "http://a.test/v1|model-a, http://b.test/v1",
+        default_base_url="http://default.test/v1",
+        default_model="default-model",
+        api_key="key",
+        routing="latency"
+    )
+    assert [(e.base_url, e.model) for e in pool.endpoints] == [
+        ("http://a.test/v1", "model-a"),
+        ("http://b.test/v1", "default-model")
+    ]
+    assert pool.routing == "latency"
+    assert all(kwargs["max_retries"] == 0 for kwargs in clients)
+
+    single = LLMPool.from_config("", "http://default.test/v1", "default-model", "key")
+    assert [e.base_url for e in single.endpoints] == ["http://default.test/v1"]
+    assert "max_retries" not in clients[-1]
+
+
+class DelayedCompletions:
+    """Answers after a fixed delay (or raises) and records cancellations."""
+
+    def __init__(self, delay, result="ok"):
+        self.delay = delay
+        self.result = result
+        self.calls = 0
+        self.cancelled = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+def delayed_endpoint(name, delay, result="ok"):
+    completions = DelayedCompletions(delay, result)
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return LLMEndpoint(f"http://{name}/v1", "model-a", client), completions
+
+
+def warmed_policy(**options):
+    policy = HedgePolicy(min_delay=0.01, max_rate=1.0, min_samples=1, **options)
+    policy.observe(0.02)
+    return policy
+
+
+def test_hedge_to_alternate_endpoint_wins_and_cancels_original():
+    slow, slow_calls = delayed_endpoint("slow", 5.0, "slow")
+    fast, fast_calls = delayed_endpoint("fast", 0.0, "fast")
+    slow.latency_ewma, fast.latency_ewma = 0.1, 0.2  # Route the original request to slow
+    pool = LLMPool([slow, fast])
+    policy = warmed_policy()
+
+    assert asyncio.run(pool.create({"messages": []}, hedge=policy)) == "fast"
+    assert slow_calls.cancelled == 1
+    assert fast_calls.calls == 1
+    assert policy.stats()["fired"] == policy.stats()["won"] == 1
+    assert slow.outstanding == fast.outstanding == 0
+
+
+def test_no_hedge_when_the_request_is_fast():
+    only, calls = delayed_endpoint("only", 0.0)
+    pool = LLMPool([only])
+    policy = warmed_policy()
+
+    assert asyncio.run(pool.create({"messages": []}, hedge=policy)) == "ok"
+    assert calls.calls == 1
+    assert policy.stats()["fired"] == 0
+
+
+def test_hedge_on_single_endpoint_reuses_it_and_falls_back_to_original():
+    # The backup fails, so the (slow) original still answers
+    only = LLMEndpoint("http://only/v1", "model-a", None)
+    attempts = []
+
+    async def create(**kwargs):
+        attempts.append(kwargs)
+        if len(attempts) == 2:
+            raise bad_request()
+        await asyncio.sleep(0.05)
+        return "original"
+
+    only.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    pool = LLMPool([only])
+    policy = warmed_policy()
+
+    assert asyncio.run(pool.create({"messages": []}, hedge=policy)) == "original"
+    assert len(attempts) == 2
+    assert policy.stats()["won"] == 0
+
+
+def test_hedge_releases_its_admission_slot():
+    slow, _ = delayed_endpoint("slow", 5.0, "slow")
+    fast, _ = delayed_endpoint("fast", 0.0, "fast")
+    slow.latency_ewma, fast.latency_ewma = 0.1, 0.2
+    admission = AdmissionController(max_concurrent=2, max_queue=0, queue_timeout=1)
+    policy = warmed_policy(admission=admission)
+    pool = LLMPool([slow, fast])
+
+    async def run():
+        result = await pool.create({"messages": []}, hedge=policy)
+        await asyncio.sleep(0)  # Let the cancelled original finish
+        return result
+
+    assert asyncio.run(run()) == "fast"
+    assert admission.stats()["in_flight"] == 0
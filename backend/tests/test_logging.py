@@ -0,0 +1,78 @@
+"""Tests for the logging filters and queue handler."""
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler
+
+from app.logging_config import RedactingFilter, SamplingFilter, redact
+
+ADDRESS = "secret1ap26qrlp8mcq2pg6r47w43l0y8zkqm8a450s03"
+
+
+def make_record(msg, *args, **extra):
+    record = logging.LogRecord("test", logging.INFO, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_redact_masks_addresses_and_viewing_keys():
+    text = redact(f"Balance for {ADDRESS} with key api_key_AbC123+/= and {{'viewing_key': 'hunter2'}}")
+
+    assert ADDRESS not in text
+    assert "secret1ap26…" in text
+    assert "api_key_AbC123" not in text
+    assert "hunter2" not in text
+
+
+def test_redacting_filter_formats_args():
+    record = make_record("Calling tool with %s", {"address": ADDRESS})
+
+    RedactingFilter().filter(record)
+
+    assert record.args is None
+    assert ADDRESS not in record.getMessage()
+
+
+def test_sampling_filter_only_drops_marked_records():
+    sampler = SamplingFilter(0.0)
+
+    assert sampler.filter(make_record("Tool calling iteration", sampled=True)) is False
+    assert sampler.filter(make_record("Chat error")) is True
+    assert SamplingFilter(1.0).filter(make_record("Tool calling iteration", sampled=True)) is True
+
+
+def exc_info_for(message):
+    try:
+        raise ValueError(message)
+    except ValueError:
+        return sys.exc_info()
+
+
+def test_redacting_filter_masks_tracebacks():
+    record = make_record("Balance query failed")
+    record.exc_info = exc_info_for(f"no account {ADDRESS}")
+
+    RedactingFilter().filter(record)
+    text = logging.Formatter("%(message)s").format(record)
+
+    assert "ValueError" in text
+    assert ADDRESS not in text
+
+
+def test_queued_records_are_snapshots():
+    log_queue = queue.SimpleQueue()
+    handler = QueueHandler(log_queue)
+    arguments = {"address": ADDRESS}
+    record = make_record("Calling tool with %s", arguments)
+    record.exc_info = exc_info_for(f"no account {ADDRESS}")
+
+    handler.handle(record)
+    arguments["address"] = "changed after logging"
+
+    queued = log_queue.get_nowait()
+    assert queued.args is None and queued.exc_info is None
+    assert "changed after logging" not in queued.getMessage()
+    # The traceback is part of the message now, so the listener-side filter redacts it
+    RedactingFilter().filter(queued)
+    assert "ValueError" in queued.getMessage()
+    assert ADDRESS not in queued.getMessage()
@@ -0,0 +1,266 @@
+"""Tests for MCP client result caching and call coalescing."""
+import asyncio
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.services.cache import TTLCache, canonical_key
+from app.services.circuit_breaker import HALF_OPEN, CircuitBreaker, CircuitOpenError
+from app.services.mcp_client import MCPClient
+
+
+class CountingMCPClient(MCPClient):
+    """MCPClient whose upstream is replaced by a counter."""
+
+    def __init__(self):
+        super().__init__()
+        self.upstream_calls = []
+
+    async def _call_upstream(self, tool_name, arguments):
+        self.upstream_calls.append((tool_name, arguments))
+        return {"tool": tool_name, "call": len(self.upstream_calls)}
+
+
+def test_canonical_key_ignores_argument_order():
+    assert canonical_key("t", {"a": 1, "b": 2}) == canonical_key("t", {"b": 2, "a": 1})
+    assert canonical_key("t", None) == canonical_key("t", {})
+    assert canonical_key("t", {"a": 1}) != canonical_key("u", {"a": 1})
+
+
+def test_ttl_cache_expiry_and_lru(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("app.services.cache.time.monotonic", lambda: now[0])
+    cache = TTLCache(max_entries=2, default_ttl=5)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == (True, 1)   # "a" is now most recent
+    cache.set("c", 3)                     # evicts "b"
+    assert cache.get("b") == (False, None)
+
+    now[0] += 6
+    assert cache.get("a") == (False, None)
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["expirations"] == 1
+    assert stats["hits"] == 1
+
+
+def test_call_tool_caches_allowlisted_tools():
+    client = CountingMCPClient()
+    client._cache_tools = {"secret_query_balance"}
+
+    async def run():
+        first = await client.call_tool("secret_query_balance", {"address": "secret1x"})
+        second = await client.call_tool("secret_query_balance", {"address": "secret1x"})
+        await client.call_tool("secret_query_balance", {"address": "secret1y"})
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first == second
+    assert len(client.upstream_calls) == 2
+    assert client.get_stats()["cache"]["hits"] == 1
+
+
+def test_call_tool_never_caches_other_tools():
+    client = CountingMCPClient()
+    client._cache_tools = {"secret_query_balance"}
+
+    async def run():
+        await client.call_tool("secret_send_tokens", {"amount": "1"})
+        await client.call_tool("secret_send_tokens", {"amount": "1"})
+
+    asyncio.run(run())
+
+    assert len(client.upstream_calls) == 2
+
+
+class SlowMCPClient(MCPClient):
+    """MCPClient whose upstream blocks until released."""
+
+    def __init__(self, error=None):
+        super().__init__()
+        self._cache_tools = set()
+        self._single_flight_tools = {"secret_query_block"}
+        self.upstream_calls = 0
+        self.error = error
+        self.release = None
+
+    async def _call_upstream(self, tool_name, arguments):
+        self.upstream_calls += 1
+        await self.release.wait()
+        if self.error:
+            raise self.error
+        return {"height": 42}
+
+
+def test_single_flight_shares_one_upstream_call():
+    client = SlowMCPClient()
+
+    async def run():
+        client.release = asyncio.Event()
+        waiters = [asyncio.ensure_future(client.call_tool("secret_query_block", {})) for _ in range(5)]
+        await asyncio.sleep(0)
+        client.release.set()
+        return await asyncio.gather(*waiters)
+
+    results = asyncio.run(run())
+
+    assert results == [{"height": 42}] * 5
+    assert client.upstream_calls == 1
+    stats = client.get_stats()["single_flight"]
+    assert stats["coalesced"] == 4
+    assert stats["in_flight"] == 0
+
+
+def test_single_flight_propagates_errors():
+    client = SlowMCPClient(error=RuntimeError("lcd down"))
+
+    async def run():
+        client.release = asyncio.Event()
+        waiters = [asyncio.ensure_future(client.call_tool("secret_query_block", {})) for _ in range(3)]
+        await asyncio.sleep(0)
+        client.release.set()
+        return await asyncio.gather(*waiters, return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert client.upstream_calls == 1
+
+
+def test_single_flight_survives_waiter_cancellation():
+    client = SlowMCPClient()
+
+    async def run():
+        client.release = asyncio.Event()
+        leader = asyncio.ensure_future(client.call_tool("secret_query_block", {}))
+        follower = asyncio.ensure_future(client.call_tool("secret_query_block", {}))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        client.release.set()
+        return leader, await follower
+
+    leader, result = asyncio.run(run())
+
+    assert leader.cancelled()
+    assert result == {"height": 42}
+    assert client.upstream_calls == 1
+
+
+def test_single_flight_cancels_upstream_without_waiters():
+    client = SlowMCPClient()
+
+    async def run():
+        client.release = asyncio.Event()
+        only = asyncio.ensure_future(client.call_tool("secret_query_block", {}))
+        await asyncio.sleep(0)
+        flight = next(iter(client._inflight.values()))
+        only.cancel()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return flight.task
+
+    task = asyncio.run(run())
+
+    assert task.cancelled()
+    assert client._inflight == {}
+
+
+def test_single_flight_caller_after_last_waiter_left_starts_new_call():
+    client = SlowMCPClient()
+
+    async def run():
+        client.release = asyncio.Event()
+        first = asyncio.ensure_future(client.call_tool("secret_query_block", {}))
+        await asyncio.sleep(0)
+        first.cancel()
+        # Let the first caller leave, but not the cancelled flight finish
+        while not first.done():
+            await asyncio.sleep(0)
+        second = asyncio.ensure_future(client.call_tool("secret_query_block", {}))
+        await asyncio.sleep(0)
+        client.release.set()
+        return first, await second
+
+    first, result = asyncio.run(run())
+
+    assert first.cancelled()
+    assert result == {"height": 42}
+    assert client.upstream_calls == 2
+
+
+def test_http_client_uses_tuned_pool(monkeypatch):
+    monkeypatch.setattr("app.services.mcp_client.settings.MCP_HTTP2", True)
+    monkeypatch.setattr("app.services.mcp_client.importlib.util.find_spec", lambda name: None)
+    client = MCPClient()
+
+    async def run():
+        http_client = client._create_http_client()
+        try:
+            return http_client.timeout
+        finally:
+            await http_client.aclose()
+
+    timeout = asyncio.run(run())
+
+    assert timeout.connect == settings.MCP_CONNECT_TIMEOUT
+    assert timeout.pool == settings.MCP_POOL_TIMEOUT
+
+
+def test_circuit_opens_and_fails_fast(monkeypatch):
+    """After repeated upstream failures calls are rejected without touching the server."""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(502)
+
+    client = MCPClient()
+    client._initialized = True
+    client.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    client.breaker = CircuitBreaker("MCP server", min_calls=3, failure_rate=0.5, open_seconds=30)
+
+    async def run():
+        for _ in range(3):
+            with pytest.raises(httpx.HTTPStatusError):
+                await client._call_upstream("secret_query_block", {})
+        assert client.tools_available() is False
+        with pytest.raises(CircuitOpenError):
+            await client._call_upstream("secret_query_block", {})
+        await client.close()
+
+    asyncio.run(run())
+    assert len(requests) == 3
+
+
+def test_cancelled_call_does_not_release_another_calls_probe():
+    """A call admitted while closed must not free the half-open probe some other call holds."""
+    started = asyncio.Event()
+
+    async def handler(request):
+        started.set()
+        await asyncio.Event().wait()
+
+    client = MCPClient()
+    client._initialized = True
+    client.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    client.breaker = CircuitBreaker("MCP server")
+
+    async def run():
+        call = asyncio.create_task(client._call_upstream("secret_query_block", {}))
+        await started.wait()
+        # Meanwhile the circuit opened, went half-open and another call took the probe
+        client.breaker._state = HALF_OPEN
+        assert client.breaker.allow_request() is True
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        second_probe = client.breaker.allow_request()
+        await client.close()
+        return second_probe
+
+    assert asyncio.run(run()) is False
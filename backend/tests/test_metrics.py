@@ -0,0 +1,42 @@
+"""Tests for the metrics endpoint."""
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.metrics import MetricsRegistry, _Metric
+
+client = TestClient(app)
+
+
+def test_metrics_endpoint():
+    """Metrics are exposed in the Prometheus text format."""
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert "# TYPE secretforge_chat_request_seconds histogram" in body
+    assert "# TYPE secretforge_llm_queue_depth gauge" in body
+
+
+def test_histogram_rendering():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("test_seconds", "Test latency.", ("tool",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, tool="a")
+    histogram.observe(0.5, tool="a")
+    histogram.observe(5, tool="a")
+
+    lines = registry.render().splitlines()
+
+    assert 'test_seconds_bucket{tool="a",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{tool="a",le="1"} 2' in lines
+    assert 'test_seconds_bucket{tool="a",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{tool="a"} 3' in lines
+    assert 'test_seconds_sum{tool="a"} 5.55' in lines
+
+
+def test_metric_types_must_render_samples():
+    class Incomplete(_Metric):
+        type_name = "gauge"
+
+    with pytest.raises(TypeError):
+        Incomplete("secretforge_incomplete", "No samples")
@@ -0,0 +1,682 @@
+"""Tests for the SecretAI tool-calling loop."""
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import BadRequestError
+
+from app.services import secret_ai as secret_ai_module
+from app.services.llm_pool import LLMEndpoint, LLMPool
+from app.services.secret_ai import SecretAIService
+
+
+class FakeCompletions:
+    """Replays scripted completions, streamed as fixed-size chunks."""
+
+    def __init__(self, replies, chunk_size=3):
+        self.replies = list(replies)
+        self.chunk_size = chunk_size
+        self.calls = []
+        self.streamed_chunks = 0
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        text = self.replies.pop(0)
+        if not kwargs.get("stream"):
+            message = SimpleNamespace(content=text)
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+        return self._stream(text)
+
+    async def _stream(self, text):
+        for i in range(0, len(text), self.chunk_size):
+            delta = SimpleNamespace(content=text[i:i + self.chunk_size])
+            self.streamed_chunks += 1
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+class FakeMCPClient:
+    """Records tool calls and returns canned results."""
+
+    def __init__(self):
+        self.calls = []
+        self.available = True
+
+    def tools_available(self):
+        return self.available
+
+    async def call_tool(self, tool_name, arguments):
+        self.calls.append((tool_name, arguments))
+        return {"height": 42}
+
+
+def make_service(replies, monkeypatch):
+    service = SecretAIService()
+    service._initialized = True
+    service._tools = [{"name": "secret_query_block", "description": "Latest block", "parameters": {}}]
+    service._answer_templates = set()   # Exercise the full loop unless a test opts in
+    completions = FakeCompletions(replies)
+    service.llm_pool = fake_pool(completions)
+    fake_mcp = FakeMCPClient()
+    monkeypatch.setattr(secret_ai_module, "mcp_client", fake_mcp)
+    return service, completions, fake_mcp
+
+
+def fake_pool(completions):
+    """Single-endpoint pool around a fake completions API."""
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return LLMPool([LLMEndpoint("http://llm.test/v1", secret_ai_module.settings.SECRET_AI_MODEL, client)])
+
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_chat_stream_runs_tool_loop(monkeypatch):
+    """Streaming hides the tool call, runs it and streams the follow-up."""
+    service, completions, fake_mcp = make_service([
+        "Let me check. USE_TOOL: secret_query_block with arguments {}",
+        "The latest block is 42.",
+    ], monkeypatch)
+
+    chunks = asyncio.run(collect(service.chat_stream("latest block?")))
+    text = "".join(chunks)
+
+    assert "USE_TOOL" not in text
+    assert text == "Let me check. \n\nThe latest block is 42."
+    assert fake_mcp.calls == [("secret_query_block", {})]
+    assert len(completions.calls) == 2
+    assert completions.calls[0]["messages"][0]["role"] == "system"
+    assert "Tool results:" in completions.calls[1]["messages"][-1]["content"]
+
+
+def test_chat_stream_stops_reading_once_the_tool_call_is_complete(monkeypatch):
+    """The rest of a tool-calling completion is not read: the tool runs right away."""
+    tool_reply = "USE_TOOL: secret_query_block with arguments {}"
+    service, completions, fake_mcp = make_service([
+        tool_reply + "\nI will now explain at length what this block means" * 20,
+        "The latest block is 42.",
+    ], monkeypatch)
+
+    text = "".join(asyncio.run(collect(service.chat_stream("latest block?"))))
+
+    assert text == "The latest block is 42."
+    assert fake_mcp.calls == [("secret_query_block", {})]
+    # Just the tool call and the follow-up, not the hundreds of chunks after the call
+    assert completions.streamed_chunks <= (len(tool_reply) + len(text)) // completions.chunk_size + 2
+    assert "explain" not in completions.calls[1]["messages"][-2]["content"]
+    assert service.admission.stats()["in_flight"] == 0
+
+
+@pytest.mark.parametrize("replies", [
+    ["Let me check. USE_TOOL: secret_query_block with arguments {}", "The latest block is 42."],
+    ["USE_TOOL: secret_query_block with arguments {}", "The latest block is 42."],
+    ["Checking. USE_TOOL: secret_query_block with arguments {}", "USE"],
+    [
+        "One moment. USE_TOOL: secret_query_block with arguments {}",
+        "Again. USE_TOOL: secret_query_block with arguments {}",
+        "The latest block is 42.",
+    ],
+    ["Let me check. USE_TOOL: secret_query_block with arguments {}"] * 3,
+])
+def test_stream_and_non_stream_give_the_same_answer(monkeypatch, replies):
+    service, _, _ = make_service(replies, monkeypatch)
+    answer = asyncio.run(service.chat("latest block?"))
+
+    service, _, _ = make_service(replies, monkeypatch)
+    streamed = "".join(asyncio.run(collect(service.chat_stream("latest block?"))))
+
+    assert streamed == answer
+
+
+def test_invalid_tool_call_is_not_dispatched(monkeypatch):
+    """Arguments failing the tool's schema are reported back instead of calling MCP."""
+    service, completions, fake_mcp = make_service([
+        "USE_TOOL: secret_query_balance with arguments {}",
+        "USE_TOOL: secret_query_balance with arguments {address: 'secret1abc'}",
+        "You have 1 SCRT.",
+    ], monkeypatch)
+    service._tools.append({
+        "name": "secret_query_balance",
+        "description": "SCRT balance",
+        "parameters": {"type": "object", "properties": {"address": {"type": "string"}}, "required": ["address"]}
+    })
+
+    response = asyncio.run(service.chat("balance of secret1abc?"))
+
+    assert response == "You have 1 SCRT."
+    assert fake_mcp.calls == [("secret_query_balance", {"address": "secret1abc"})]
+    tool_results = [m["content"] for m in completions.calls[-1]["messages"] if m["content"].startswith("Tool results:")]
+    assert "missing required argument(s): address" in tool_results[0]
+
+
+def test_chat_stream_flushes_partial_marker(monkeypatch):
+    """Text that only looks like the start of a marker is still delivered."""
+    service, _, fake_mcp = make_service(["Use the USE_ key"], monkeypatch)
+
+    text = "".join(asyncio.run(collect(service.chat_stream("hello"))))
+
+    assert text == "Use the USE_ key"
+    assert fake_mcp.calls == []
+
+
+def test_chat_stream_shortcut(monkeypatch):
+    """Pre-fetched balances are answered without calling the LLM."""
+    service, completions, _ = make_service([], monkeypatch)
+
+    chunks = asyncio.run(collect(service.chat_stream(
+        "what is my scrt balance",
+        scrt_balance={"success": True, "formatted": "1.500000"}
+    )))
+
+    assert chunks == ["Your SCRT balance is 1.500000 SCRT"]
+    assert completions.calls == []
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("hello", 0),
+    ("hello U", 1),
+    ("hello use_t", 5),
+    ("USE_TOOL", 8),
+    ("USE_TOOL:", 0),
+])
+def test_partial_marker_length(text, expected):
+    assert secret_ai_module._partial_marker_length(text) == expected
+
+
+def test_tool_calls_run_concurrently_in_order(monkeypatch):
+    """Independent tool calls overlap but results keep the requested order."""
+    service = SecretAIService()
+    delays = {"slow": 0.2, "fast": 0.01}
+
+    class SlowMCPClient:
+        async def call_tool(self, tool_name, arguments):
+            await asyncio.sleep(delays[tool_name])
+            return {"tool": tool_name}
+
+    monkeypatch.setattr(secret_ai_module, "mcp_client", SlowMCPClient())
+    monkeypatch.setattr(secret_ai_module.settings, "TOOL_CALL_CONCURRENCY", 4)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        message = await service._execute_tool_calls([
+            {"name": "slow", "arguments": {}},
+            {"name": "fast", "arguments": {}},
+            {"name": "slow", "arguments": {}},
+        ])
+        return message, loop.time() - start
+
+    message, elapsed = asyncio.run(run())
+
+    assert elapsed < 0.35
+    assert message.splitlines()[1:] == [
+        'slow: {"tool": "slow"}',
+        'fast: {"tool": "fast"}',
+        'slow: {"tool": "slow"}',
+    ]
+
+
+def test_tool_call_timeout(monkeypatch):
+    """A hung tool call is reported as an error instead of stalling the turn."""
+    service = SecretAIService()
+
+    class HungMCPClient:
+        async def call_tool(self, tool_name, arguments):
+            await asyncio.sleep(10)
+
+    monkeypatch.setattr(secret_ai_module, "mcp_client", HungMCPClient())
+    monkeypatch.setattr(secret_ai_module.settings, "TOOL_CALL_TIMEOUT", 0.05)
+
+    message = asyncio.run(service._execute_tool_calls([{"name": "hung", "arguments": {}}]))
+
+    assert "timed out" in message
+
+
+def test_system_prompt_prefix_is_cached_and_stable(monkeypatch):
+    """The static prompt is rendered once; wallet context only appends to it."""
+    service, _, _ = make_service([], monkeypatch)
+
+    plain = service._build_system_prompt()
+    with_wallet = service._build_system_prompt("secret1abc")
+
+    assert with_wallet.startswith(plain)
+    assert with_wallet.endswith("address: secret1abc. You can help them with Secret Network transactions, balance queries, and other blockchain operations.")
+    assert service.get_prompt_cache_stats()["renders"] == 1
+    assert service.get_prompt_cache_stats()["hits"] == 1
+
+    service._tools = []
+    service._invalidate_system_prompt()
+    assert service._build_system_prompt("secret1abc") == "You are a helpful AI assistant."
+    assert service.get_prompt_cache_stats()["renders"] == 2
+
+
+def mixed_model_pool(first, second):
+    """Two endpoints serving different models; the first is preferred until busy."""
+    endpoints = [
+        LLMEndpoint("http://a.test/v1", "model-a", SimpleNamespace(chat=SimpleNamespace(completions=first))),
+        LLMEndpoint("http://b.test/v1", "model-b", SimpleNamespace(chat=SimpleNamespace(completions=second)))
+    ]
+    return LLMPool(endpoints), endpoints
+
+
+def test_native_fallback_is_recorded_for_the_rejecting_endpoint_model(monkeypatch):
+    monkeypatch.setattr(secret_ai_module.settings, "NATIVE_TOOL_CALLING", "auto")
+    service, _, _ = make_service([], monkeypatch)
+    rejection = BadRequestError(
+        "model-a does not support tools",
+        response=httpx.Response(400, request=httpx.Request("POST", "http://a.test/v1/chat/completions")),
+        body=None
+    )
+    first = NativeFakeCompletions([rejection, SimpleNamespace(content="Hello.")])
+    second = NativeFakeCompletions([])
+    service.llm_pool, _ = mixed_model_pool(first, second)
+
+    assert asyncio.run(service.chat("hi")) == "Hello."
+    # The whole turn, including the text-protocol retry, stayed on model-a
+    assert [call["model"] for call in first.calls] == ["model-a", "model-a"]
+    assert service._native_unsupported_models == {"model-a"}
+    assert service._use_native_tools("model-b") is True
+
+
+def test_response_cache_is_keyed_by_endpoint_model(monkeypatch):
+    monkeypatch.setattr(secret_ai_module.settings, "RESPONSE_CACHE_ENABLED", True)
+    service, _, _ = make_service([], monkeypatch)
+    first = FakeCompletions(["Answer from model-a."])
+    second = FakeCompletions(["Answer from model-b."])
+    service.llm_pool, endpoints = mixed_model_pool(first, second)
+
+    assert asyncio.run(service.chat("What is Secret Network?")) == "Answer from model-a."
+    endpoints[0].outstanding = 1   # Next turn starts on model-b
+    assert asyncio.run(service.chat("What is Secret Network?")) == "Answer from model-b."
+    endpoints[0].outstanding, endpoints[1].outstanding = 0, 1
+    assert asyncio.run(service.chat("What is Secret Network?")) == "Answer from model-a."
+    assert len(first.calls) == len(second.calls) == 1
+
+
+def test_response_cache_serves_repeated_questions(monkeypatch):
+    """Identical wallet-free turns are answered once, deterministically."""
+    monkeypatch.setattr(secret_ai_module.settings, "RESPONSE_CACHE_ENABLED", True)
+    service, completions, _ = make_service(["Secret Network is a privacy chain."], monkeypatch)
+
+    first = asyncio.run(service.chat("What is Secret Network?"))
+    second = asyncio.run(service.chat("  what is secret   network "))
+
+    assert first == second == "Secret Network is a privacy chain."
+    assert len(completions.calls) == 1
+    assert completions.calls[0]["temperature"] == 0.0
+    assert service.get_response_cache_stats()["hits"] == 1
+
+
+def test_response_cache_skips_wallet_and_tool_turns(monkeypatch):
+    monkeypatch.setattr(secret_ai_module.settings, "RESPONSE_CACHE_ENABLED", True)
+    service, completions, _ = make_service([
+        "USE_TOOL: secret_query_block with arguments {}",
+        "Block 42.",
+        "USE_TOOL: secret_query_block with arguments {}",
+        "Block 43.",
+        "Hi there.",
+        "Hi again.",
+    ], monkeypatch)
+
+    # Tool-backed answers are live data
+    assert asyncio.run(service.chat("latest block")) == "Block 42."
+    assert asyncio.run(service.chat("latest block")) == "Block 43."
+    # Wallet context makes the turn user-specific
+    assert asyncio.run(service.chat("hello", wallet_address="secret1abc")) == "Hi there."
+    assert asyncio.run(service.chat("hello", wallet_address="secret1abc")) == "Hi again."
+    assert completions.calls[-1]["temperature"] == 0.7
+
+
+@pytest.mark.parametrize("replies, final", [
+    (["Secret Network is a privacy chain."], True),
+    (["USE_TOOL: secret_query_block with arguments {}", "Block 42."], True),
+    (["USE_TOOL: secret_query_block with arguments {}"] * 3, False),
+])
+def test_stream_marks_final_answers_like_chat(monkeypatch, replies, final):
+    turns = []
+    for stream in (False, True):
+        service, _, _ = make_service(replies, monkeypatch)
+        messages, _ = service._build_messages("latest block?", None, None, False)
+        turn = {"used_tools": False, "final": False, "model": "model-a"}
+        if stream:
+            asyncio.run(collect(service._stream_tool_loop(messages, 0.7, turn)))
+        else:
+            asyncio.run(service._tool_loop(messages, 0.7, False, turn))
+        turns.append(turn)
+
+    assert turns[0] == turns[1]
+    assert turns[1]["final"] is final
+
+
+def test_response_cache_serves_repeated_streamed_questions(monkeypatch):
+    monkeypatch.setattr(secret_ai_module.settings, "RESPONSE_CACHE_ENABLED", True)
+    service, completions, _ = make_service(["Secret Network is a privacy chain."], monkeypatch)
+
+    first = "".join(asyncio.run(collect(service.chat_stream("What is Secret Network?"))))
+    second = "".join(asyncio.run(collect(service.chat_stream("What is Secret Network?"))))
+
+    assert first == second == "Secret Network is a privacy chain."
+    assert len(completions.calls) == 1
+
+
+class NativeFakeCompletions:
+    """Returns scripted messages; a reply may be an exception to raise."""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append({**kwargs, "messages": list(kwargs["messages"])})
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return SimpleNamespace(choices=[SimpleNamespace(message=reply)])
+
+
+def native_tool_call(call_id, name, arguments):
+    return SimpleNamespace(id=call_id, function=SimpleNamespace(name=name, arguments=arguments))
+
+
+def test_native_tool_calling(monkeypatch):
+    """Tools are sent natively and results come back as role=tool messages."""
+    monkeypatch.setattr(secret_ai_module.settings, "NATIVE_TOOL_CALLING", "on")
+    service, _, fake_mcp = make_service([], monkeypatch)
+    completions = NativeFakeCompletions([
+        SimpleNamespace(content=None, tool_calls=[native_tool_call("call_1", "secret_query_block", "{}")]),
+        SimpleNamespace(content="The latest block is 42.", tool_calls=None),
+    ])
+    service.llm_pool = fake_pool(completions)
+
+    response = asyncio.run(service.chat("latest block?"))
+
+    assert response == "The latest block is 42."
+    assert fake_mcp.calls == [("secret_query_block", {})]
+    first, second = completions.calls
+    assert first["tools"][0]["function"]["name"] == "secret_query_block"
+    assert "USE_TOOL" not in first["messages"][0]["content"]
+    assert second["messages"][-2]["tool_calls"][0]["id"] == "call_1"
+    assert second["messages"][-1] == {"role": "tool", "tool_call_id": "call_1", "content": '{"height": 42}'}
+
+
+def test_native_tool_calling_falls_back_per_model(monkeypatch):
+    """In auto mode a model rejecting tools is switched to the text protocol for good."""
+    monkeypatch.setattr(secret_ai_module.settings, "NATIVE_TOOL_CALLING", "auto")
+    service, _, fake_mcp = make_service([], monkeypatch)
+    rejection = BadRequestError(
+        "gemma3:4b does not support tools",
+        response=httpx.Response(400, request=httpx.Request("POST", "http://llm/v1/chat/completions")),
+        body=None
+    )
+    completions = NativeFakeCompletions([
+        rejection,
+        SimpleNamespace(content="USE_TOOL: secret_query_block with arguments {}"),
+        SimpleNamespace(content="The latest block is 42."),
+    ])
+    service.llm_pool = fake_pool(completions)
+
+    response = asyncio.run(service.chat("latest block?"))
+
+    assert response == "The latest block is 42."
+    assert fake_mcp.calls == [("secret_query_block", {})]
+    assert "tools" in completions.calls[0]
+    assert "tools" not in completions.calls[1]
+    assert "USE_TOOL" in completions.calls[1]["messages"][0]["content"]
+    assert service._use_native_tools() is False
+
+
+def test_native_tool_calling_stream(monkeypatch):
+    """Streamed tool-call fragments are assembled and executed; text is forwarded as-is."""
+    monkeypatch.setattr(secret_ai_module.settings, "NATIVE_TOOL_CALLING", "on")
+    service, _, fake_mcp = make_service([], monkeypatch)
+
+    def chunk(content=None, tool_calls=None):
+        delta = SimpleNamespace(content=content, tool_calls=tool_calls)
+        return SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+    def fragment(index, call_id=None, name=None, arguments=None):
+        return SimpleNamespace(index=index, id=call_id, function=SimpleNamespace(name=name, arguments=arguments))
+
+    async def stream(chunks):
+        for item in chunks:
+            yield item
+
+    scripted = [
+        [chunk("Checking."), chunk(tool_calls=[fragment(0, "call_1", "secret_query_", '{"a')]),
+         chunk(tool_calls=[fragment(0, name="block", arguments='": 1}')])],
+        [chunk("Block 42.")],
+    ]
+    service._tools[0]["parameters"] = {"type": "object", "properties": {"a": {"type": "integer"}}}
+
+    async def create(**kwargs):
+        return stream(scripted.pop(0))
+
+    service.llm_pool = fake_pool(SimpleNamespace(create=create))
+
+    text = "".join(asyncio.run(collect(service.chat_stream("latest block?"))))
+
+    assert text == "Checking.\n\nBlock 42."
+    assert fake_mcp.calls == [("secret_query_block", {"a": 1})]
+
+
+def test_template_answer_skips_follow_up_completion(monkeypatch):
+    """A templated read-only tool result is answered without a second completion."""
+    service, completions, fake_mcp = make_service([
+        "Let me check. USE_TOOL: secret_query_block with arguments {}",
+    ], monkeypatch)
+    service._answer_templates = {"secret_query_block"}
+
+    text = "".join(asyncio.run(collect(service.chat_stream("What is the latest block?"))))
+
+    assert text == "Let me check. \n\nThe latest Secret Network block is #42."
+    assert len(completions.calls) == 1
+    assert fake_mcp.calls == [("secret_query_block", {})]
+
+
+def test_repeated_tool_call_forces_final_answer(monkeypatch):
+    """Repeating a call whose result is already known asks for an answer instead of re-running it."""
+    service, completions, fake_mcp = make_service([
+        "USE_TOOL: secret_query_block with arguments {}",
+        "USE_TOOL: secret_query_block with arguments {}",
+        "The latest block is 42.",
+    ], monkeypatch)
+
+    response = asyncio.run(service.chat("What is the latest block?"))
+
+    assert response == "The latest block is 42."
+    assert fake_mcp.calls == [("secret_query_block", {})]
+    assert completions.calls[2]["messages"][-1]["content"] == secret_ai_module.FINAL_ANSWER_PROMPT
+
+
+def test_repeated_tool_call_after_final_prompt_stops(monkeypatch):
+    service, completions, fake_mcp = make_service(
+        ["USE_TOOL: secret_query_block with arguments {}"] * 3, monkeypatch
+    )
+
+    response = asyncio.run(service.chat("What is the latest block?"))
+
+    assert response == secret_ai_module.MAX_ITERATIONS_MESSAGE
+    assert len(completions.calls) == 3
+    assert len(fake_mcp.calls) == 1
+
+
+def test_follow_up_completion_is_shorter_and_cooler(monkeypatch):
+    monkeypatch.setattr(secret_ai_module.settings, "TOOL_FOLLOWUP_MAX_TOKENS", 128)
+    monkeypatch.setattr(secret_ai_module.settings, "TOOL_FOLLOWUP_TEMPERATURE", 0.2)
+    service, completions, _ = make_service([
+        "USE_TOOL: secret_query_block with arguments {}",
+        "The latest block is 42.",
+    ], monkeypatch)
+
+    asyncio.run(service.chat("What is the latest block?"))
+
+    first, follow_up = completions.calls
+    assert first["max_tokens"] == secret_ai_module.COMPLETION_MAX_TOKENS
+    assert (follow_up["max_tokens"], follow_up["temperature"]) == (128, 0.2)
+
+
+class CatalogMCPClient:
+    """Serves a scripted sequence of tool catalogs; an exception entry is raised."""
+
+    def __init__(self, catalogs):
+        self.catalogs = list(catalogs)
+
+    def tools_available(self):
+        return True
+
+    async def list_tools(self, raise_on_error=False):
+        catalog = self.catalogs.pop(0)
+        if isinstance(catalog, Exception):
+            raise catalog
+        return catalog
+
+
+def test_tool_refresh_swaps_catalog_and_invalidates_prompt(monkeypatch):
+    block = {"name": "secret_query_block", "description": "Latest block"}
+    contract = {"name": "secret_query_contract", "description": "Query a contract"}
+    monkeypatch.setattr(secret_ai_module, "mcp_client", CatalogMCPClient([
+        [block], [block], httpx.ConnectError("down"), [block, contract]
+    ]))
+    service = SecretAIService()
+
+    assert asyncio.run(service._load_tools()) is True
+    prompt = service._build_system_prompt()
+    assert "secret_query_contract" not in prompt
+
+    asyncio.run(service._load_tools())   # Unchanged: rendered prompt is kept
+    assert service._system_prompt_prefixes
+    assert service.get_tool_catalog_stats()["version"] == 1
+
+    assert asyncio.run(service._load_tools()) is False
+    assert [tool["name"] for tool in service._tools] == ["secret_query_block"]
+    assert service.get_tool_catalog_stats()["last_error"] == "down"
+
+    asyncio.run(service._load_tools())
+    stats = service.get_tool_catalog_stats()
+    assert (stats["version"], stats["tools"], stats["last_error"]) == (2, 2, None)
+    assert "secret_query_contract" in service._build_system_prompt()
+
+
+def test_tool_refresh_backoff(monkeypatch):
+    monkeypatch.setattr(secret_ai_module.settings, "MCP_TOOLS_REFRESH_INTERVAL", 300.0)
+    monkeypatch.setattr(secret_ai_module.settings, "MCP_TOOLS_REFRESH_MIN_BACKOFF", 5.0)
+    monkeypatch.setattr(secret_ai_module.settings, "MCP_TOOLS_REFRESH_MAX_BACKOFF", 60.0)
+    delay = SecretAIService._tool_refresh_delay
+
+    assert [delay(n) for n in range(6)] == [300.0, 5.0, 10.0, 20.0, 40.0, 60.0]
+
+    monkeypatch.setattr(secret_ai_module.settings, "MCP_TOOLS_REFRESH_INTERVAL", 0)
+    assert delay(0) is None
+    assert delay(1) == 5.0
+
+
+def test_background_init_retries_until_success(monkeypatch):
+    monkeypatch.setattr(secret_ai_module.settings, "SECRET_AI_API_KEY", "")
+    monkeypatch.setattr(secret_ai_module.settings, "ENABLE_SECRET_NETWORK", False)
+    monkeypatch.setattr(secret_ai_module.settings, "STARTUP_RETRY_MIN_BACKOFF", 0.01)
+    service = SecretAIService()
+
+    async def run():
+        service.start_background_init()
+        await asyncio.sleep(0.05)
+        assert service.initializing() and not service._initialized
+        assert "SECRET_AI_API_KEY" in service._last_error
+
+        monkeypatch.setattr(secret_ai_module.settings, "SECRET_AI_API_KEY", "key")
+        await asyncio.wait_for(service._init_task, 1)
+        await service.close()
+
+    asyncio.run(run())
+    assert service._last_error is None
+
+
+def test_concurrent_initialize_runs_once(monkeypatch):
+    monkeypatch.setattr(secret_ai_module.settings, "SECRET_AI_API_KEY", "key")
+    monkeypatch.setattr(secret_ai_module.settings, "ENABLE_SECRET_NETWORK", False)
+    service = SecretAIService()
+    clients = []
+    monkeypatch.setattr("app.services.llm_pool.AsyncOpenAI", lambda **kwargs: clients.append(kwargs) or SimpleNamespace())
+
+    async def run():
+        await asyncio.gather(*(service.initialize() for _ in range(5)))
+
+    asyncio.run(run())
+    assert len(clients) == 1
+
+
+def test_tools_leave_the_prompt_while_mcp_is_unavailable(monkeypatch):
+    service, _, fake_mcp = make_service([], monkeypatch)
+    monkeypatch.setattr(secret_ai_module.settings, "NATIVE_TOOL_CALLING", "on")
+
+    assert "secret_query_block" in service._build_system_prompt(native=False)
+    assert service._use_native_tools() is True
+
+    fake_mcp.available = False
+    prompt = service._build_system_prompt("secret1abc", native=False)
+
+    assert "USE_TOOL" not in prompt
+    assert "secret1abc" not in prompt
+    assert service._use_native_tools() is False
+
+
+def test_closing_chat_stream_releases_the_llm_slot(monkeypatch):
+    """A consumer that stops early (client gone) closes the upstream completion right away."""
+    service, _, _ = make_service(["The latest block is forty-two, give or take."], monkeypatch)
+    cancelled = secret_ai_module.metrics.UPSTREAM_CALLS_CANCELLED_TOTAL.value(kind="llm")
+
+    async def run():
+        stream = service.chat_stream("latest block?")
+        first = await anext(stream)
+        assert service.admission.stats()["in_flight"] == 1
+        await stream.aclose()
+        return first
+
+    assert asyncio.run(run()) == "The"
+    assert service.admission.stats()["in_flight"] == 0
+    assert secret_ai_module.metrics.UPSTREAM_CALLS_CANCELLED_TOTAL.value(kind="llm") == cancelled + 1
+
+
+def test_cancelled_chat_cancels_pending_tool_calls(monkeypatch):
+    service, _, fake_mcp = make_service(["USE_TOOL: secret_query_block with arguments {}"], monkeypatch)
+    started = asyncio.Event()
+
+    async def hanging_call(tool_name, arguments):
+        started.set()
+        await asyncio.sleep(60)
+
+    fake_mcp.call_tool = hanging_call
+    cancelled = secret_ai_module.metrics.UPSTREAM_CALLS_CANCELLED_TOTAL.value(kind="mcp")
+
+    async def run():
+        task = asyncio.ensure_future(service.chat("latest block?"))
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert secret_ai_module.metrics.UPSTREAM_CALLS_CANCELLED_TOTAL.value(kind="mcp") == cancelled + 1
+    assert service.admission.stats()["in_flight"] == 0
+
+
+def test_streamed_completions_record_upstream_usage(monkeypatch):
+    """Streams ask for usage and count the prompt tokens reported in the final chunk."""
+    service, completions, _ = make_service(["Hello there."], monkeypatch)
+    original_stream = completions._stream
+
+    async def stream_with_usage(text):
+        async for chunk in original_stream(text):
+            yield chunk
+        details = SimpleNamespace(cached_tokens=30)
+        usage = SimpleNamespace(prompt_tokens=40, prompt_tokens_details=details)
+        yield SimpleNamespace(choices=[], usage=usage)
+
+    completions._stream = stream_with_usage
+
+    assert "".join(asyncio.run(collect(service.chat_stream("hi")))) == "Hello there."
+    assert completions.calls[0]["stream_options"] == {"include_usage": True}
+    stats = service.get_prompt_cache_stats()
+    assert stats["upstream_prompt_tokens"] == 40
+    assert stats["upstream_cached_tokens"] == 30
+    assert stats["upstream_cached_ratio"] == 0.75
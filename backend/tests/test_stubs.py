@@ -0,0 +1,28 @@
+"""Tests for the benchmark stub servers."""
+from fastapi.testclient import TestClient
+
+from benchmarks.stubs import LLMStubConfig, MCPStubConfig, create_llm_stub, create_mcp_stub
+
+
+def test_llm_stub_calls_tool_then_answers():
+    client = TestClient(create_llm_stub(LLMStubConfig(ttft=0, token_rate=0, answer_tokens=5)))
+    messages = [{"role": "user", "content": "What is the latest block height?"}]
+
+    first = client.post("/v1/chat/completions", json={"messages": messages}).json()
+    assert first["choices"][0]["message"]["content"].startswith("USE_TOOL: secret_query_block")
+
+    messages.append({"role": "user", "content": "Tool results:\nsecret_query_block: {}"})
+    second = client.post("/v1/chat/completions", json={"messages": messages, "stream": True})
+    events = [line for line in second.text.splitlines() if line.startswith("data: ")]
+    assert events[-1] == "data: [DONE]"
+    assert len(events) == 5 + 2
+
+
+def test_mcp_stub_tools():
+    client = TestClient(create_mcp_stub(MCPStubConfig(latency=0)))
+
+    tools = client.get("/api/mcp/tools/list").json()["tools"]
+    assert {tool["name"] for tool in tools} == {"secret_query_block", "secret_query_balance"}
+
+    result = client.post("/api/mcp/tools/call", json={"name": "secret_query_block", "arguments": {}}).json()
+    assert result["isError"] is False
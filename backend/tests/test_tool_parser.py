@@ -0,0 +1,67 @@
+"""Tests for the prompt-based tool-call parser."""
+from app.services.tool_parser import ToolCallParser, parse_tool_calls, validate_arguments
+
+BALANCE_SCHEMA = {
+    "type": "object",
+    "properties": {"address": {"type": "string"}, "limit": {"type": "integer"}},
+    "required": ["address"]
+}
+
+
+def test_parses_nested_arguments():
+    calls = parse_tool_calls(
+        'Let me check. USE_TOOL: secret_query_balance with arguments '
+        '{"address": "secret1abc", "options": {"denom": "uscrt", "tags": ["a", "}"]}}'
+    )
+    assert calls == [{
+        "name": "secret_query_balance",
+        "arguments": {"address": "secret1abc", "options": {"denom": "uscrt", "tags": ["a", "}"]}}
+    }]
+
+
+def test_parses_relaxed_json():
+    calls = parse_tool_calls("USE_TOOL: secret_query_balance with arguments {address: 'secret1abc', limit: 5,}")
+    assert calls == [{"name": "secret_query_balance", "arguments": {"address": "secret1abc", "limit": 5}}]
+
+
+def test_multiple_and_bare_calls():
+    calls = parse_tool_calls("use_tool: secret_query_block\nUSE_TOOL: secret_query_block with arguments {}")
+    assert calls == [
+        {"name": "secret_query_block", "arguments": {}},
+        {"name": "secret_query_block", "arguments": {}}
+    ]
+
+
+def test_tool_name_on_the_line_after_the_marker():
+    assert parse_tool_calls("USE_TOOL:\nsecret_query_block with arguments {}") == [
+        {"name": "secret_query_block", "arguments": {}}
+    ]
+
+    parser = ToolCallParser()
+    assert parser.feed("USE_TOOL:\n") == []
+    assert parser.feed("secret_query_block with arguments {}") == [{"name": "secret_query_block", "arguments": {}}]
+
+
+def test_malformed_arguments_are_reported():
+    [call] = parse_tool_calls('USE_TOOL: secret_query_balance with arguments {"address": ')
+    assert call["name"] == "secret_query_balance"
+    assert call["error"] == "unterminated arguments"
+
+
+def test_incremental_feed_reports_calls_once_complete():
+    parser = ToolCallParser()
+    chunks = ["Checking USE_", "TOOL: secret_query_balance with", ' arguments {"address": ', '"secret1abc"}', " now"]
+
+    results = [parser.feed(chunk) for chunk in chunks]
+
+    assert results[:3] == [[], [], []]
+    assert results[3] == [{"name": "secret_query_balance", "arguments": {"address": "secret1abc"}}]
+    assert results[4] == []
+    assert parser.finish() == []
+
+
+def test_validate_arguments():
+    assert validate_arguments({"address": "secret1abc"}, BALANCE_SCHEMA) is None
+    assert validate_arguments({}, BALANCE_SCHEMA) == "missing required argument(s): address"
+    assert validate_arguments({"address": "secret1abc", "limit": "5"}, BALANCE_SCHEMA) == "argument 'limit' must be integer"
+    assert validate_arguments({"address": "secret1abc", "limit": True}, BALANCE_SCHEMA) == "argument 'limit' must be integer"
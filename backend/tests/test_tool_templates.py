@@ -0,0 +1,45 @@
+"""Tests for templated answers to read-only tool results."""
+import json
+
+from app.services.tool_templates import render_tool_answer
+
+
+def mcp_result(payload, is_error=False):
+    return json.dumps({"content": [{"type": "text", "text": json.dumps(payload)}], "isError": is_error})
+
+
+def test_block_answer():
+    answer = render_tool_answer(
+        [{"name": "secret_query_block", "arguments": {}}],
+        [mcp_result({"block": {"header": {"height": "123", "chain_id": "secret-4"}}})]
+    )
+
+    assert answer == "The latest Secret Network block is #123 on secret-4."
+
+
+def test_balance_answer_converts_uscrt():
+    answer = render_tool_answer(
+        [{"name": "secret_query_balance", "arguments": {"address": "secret1abc"}}],
+        [mcp_result({"balances": [{"denom": "uscrt", "amount": "1500000"}]})]
+    )
+
+    assert answer == "The SCRT balance of secret1abc is 1.500000 SCRT."
+
+
+def test_falls_back_to_llm_when_any_call_is_not_templated():
+    calls = [
+        {"name": "secret_query_block", "arguments": {}},
+        {"name": "secret_query_contract", "arguments": {}},
+    ]
+    results = [mcp_result({"height": 1}), mcp_result({"ok": True})]
+
+    assert render_tool_answer(calls, results) is None
+    assert render_tool_answer(calls[:1], results[:1], enabled=set()) is None
+
+
+def test_errors_and_unexpected_shapes_are_not_templated():
+    call = [{"name": "secret_query_block", "arguments": {}}]
+
+    assert render_tool_answer(call, [mcp_result({"height": 1}, is_error=True)]) is None
+    assert render_tool_answer(call, [json.dumps({"error": "timed out"})]) is None
+    assert render_tool_answer(call, [mcp_result({"status": "syncing"})]) is None
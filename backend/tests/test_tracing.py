@@ -0,0 +1,113 @@
+"""Tests for request tracing."""
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app.services import mcp_client as mcp_client_module
+from app.services import secret_ai as secret_ai_module
+from app.services.llm_pool import LLMEndpoint, LLMPool
+from app.services.mcp_client import MCPClient
+from app.services.secret_ai import SecretAIService
+from app.services.tracing import InMemoryExporter, Tracer, _BackgroundExporter, parse_traceparent
+
+
+class FakeCompletions:
+    def __init__(self, replies):
+        self.replies = list(replies)
+
+    async def create(self, **kwargs):
+        message = SimpleNamespace(content=self.replies.pop(0))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+class FakeMCPClient:
+    def tools_available(self):
+        return True
+
+    async def call_tool(self, tool_name, arguments):
+        return {"height": 42}
+
+
+def test_parse_traceparent():
+    parsed = parse_traceparent("00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01")
+    assert parsed == {
+        "trace_id": "0af7651916cd43dd8448eb211c80319c",
+        "parent_id": "b7ad6b7169203331",
+        "sampled": True
+    }
+    assert parse_traceparent("garbage") is None
+    assert parse_traceparent("00-" + "0" * 32 + "-b7ad6b7169203331-01") is None
+
+
+def test_chat_turn_records_stage_spans(monkeypatch):
+    exporter = InMemoryExporter()
+    tracer = Tracer(exporter)
+    monkeypatch.setattr(secret_ai_module, "tracer", tracer)
+    monkeypatch.setattr(secret_ai_module, "mcp_client", FakeMCPClient())
+
+    service = SecretAIService()
+    service._initialized = True
+    service._tools = [{"name": "secret_query_block", "description": "Latest block", "parameters": {}}]
+    service._answer_templates = set()
+    client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions([
+        "USE_TOOL: secret_query_block with arguments {}",
+        "The latest block is 42."
+    ])))
+    service.llm_pool = LLMPool([LLMEndpoint("http://llm.test/v1", service.model, client)])
+
+    async def run():
+        with tracer.span("chat.request"):
+            return await service.chat("What is the latest block?")
+
+    assert asyncio.run(run()) == "The latest block is 42."
+
+    [trace] = exporter.recent_traces()
+    assert trace["name"] == "chat.request"
+    spans = trace["spans"]
+    assert [s["name"] for s in spans] == [
+        "chat.request", "intent.detect", "prompt.build", "llm.iteration", "llm.iteration"
+    ]
+    root_id = spans[0]["span_id"]
+    assert all(s["parent_id"] == root_id for s in spans[1:])
+    assert spans[3]["attributes"]["tool_calls"] == 1
+    assert spans[4]["attributes"]["iteration"] == 2
+
+
+def test_mcp_call_propagates_traceparent(monkeypatch):
+    tracer = Tracer(InMemoryExporter())
+    monkeypatch.setattr(mcp_client_module, "tracer", tracer)
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers.get("traceparent"))
+        return httpx.Response(200, json={"content": []})
+
+    client = MCPClient()
+    client._initialized = True
+    client.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    async def run():
+        try:
+            with tracer.span("chat.request") as root:
+                await client.call_tool("secret_send", {"amount": "1"})
+            return root
+        finally:
+            await client.client.aclose()
+
+    root = asyncio.run(run())
+
+    [trace] = tracer.exporter.recent_traces()
+    call_span = trace["spans"][1]
+    assert call_span["name"] == "mcp.call_tool"
+    assert call_span["attributes"] == {"tool": "secret_send", "source": "upstream"}
+    assert seen == [f"00-{root.trace_id}-{call_span['span_id']}-01"]
+
+
+def test_background_exporters_must_write_spans():
+    class Incomplete(_BackgroundExporter):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,158 @@
+"""Tests for the batched wallet balance service and endpoint."""
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.routes import wallet as wallet_routes
+from app.services import wallet as wallet_module
+from app.services.wallet import WalletBalanceService, format_amount
+
+ADDRESS = "secret1ap26qrlp8mcq2pg6r47w43l0y8zkqm8a450s03"
+
+
+def mcp_result(payload):
+    return {"content": [{"type": "text", "text": json.dumps(payload)}], "isError": False}
+
+
+class BalanceMCPClient:
+    """Answers balance queries after a delay, tracking peak concurrency."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+
+    async def call_tool(self, tool_name, arguments):
+        self.calls.append((tool_name, arguments))
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        if tool_name == "secret_query_balance":
+            return mcp_result({"balances": [{"denom": "uscrt", "amount": "2500000"}]})
+        return mcp_result({"balance": {"amount": "123456789"}})
+
+
+def test_format_amount():
+    assert format_amount("123456789", 8) == "1.234568"
+    assert format_amount("1000000", 6) == "1.00"
+    assert format_amount("1234567891234", 6) == "1,234,567.891234"
+
+
+def test_balances_are_queried_concurrently_and_cached(monkeypatch):
+    fake = BalanceMCPClient()
+    monkeypatch.setattr(wallet_module, "mcp_client", fake)
+    service = WalletBalanceService(tokens=["shd", "silk", "sscrt"])
+    keys = {"SHD": "api_key_one", "silk": "api_key_two"}
+
+    async def run():
+        started = asyncio.get_running_loop().time()
+        first = await service.get_balances(ADDRESS, keys)
+        elapsed = asyncio.get_running_loop().time() - started
+        second = await service.get_balances(ADDRESS, keys)
+        return first, second, elapsed
+
+    first, second, elapsed = asyncio.run(run())
+
+    assert elapsed < 0.1
+    assert fake.peak == 3        # SCRT + two tokens with viewing keys, all at once
+    assert first["scrt"] == {"success": True, "amount": "2500000", "formatted": "2.500000", "denom": "uscrt"}
+    assert first["snip20"]["shd"]["formatted"] == "1.234568"
+    assert first["snip20"]["silk"]["token"] == "SILK"
+    assert first["snip20"]["sscrt"] == {"success": False, "error": "No viewing key available for sSCRT"}
+    assert first["cached"] is False
+    assert second["cached"] is True
+    assert len(fake.calls) == 3
+
+
+def test_only_requested_tokens_are_queried(monkeypatch):
+    fake = BalanceMCPClient(delay=0)
+    monkeypatch.setattr(wallet_module, "mcp_client", fake)
+    service = WalletBalanceService(tokens=["shd", "silk", "sscrt"])
+    keys = {"shd": "api_key_one", "silk": "api_key_two"}
+
+    result = asyncio.run(service.get_balances(ADDRESS, keys, tokens=["SHD"]))
+
+    assert list(result["snip20"]) == ["shd"]
+    queried_keys = [args["query"]["balance"]["key"] for tool, args in fake.calls if "query" in args]
+    assert queried_keys == ["api_key_one"]
+
+    scrt_only = asyncio.run(service.get_balances(ADDRESS, keys, snip20=False))
+    assert scrt_only["snip20"] == {}
+    assert scrt_only["scrt"]["success"] is True
+
+    fake.calls.clear()
+    snip20_only = asyncio.run(service.get_balances(ADDRESS, keys, tokens=["silk"], scrt=False))
+    assert snip20_only["scrt"] is None
+    assert snip20_only["snip20"]["silk"]["success"] is True
+    assert [tool for tool, _ in fake.calls] == [wallet_module.settings.SNIP20_BALANCE_TOOL]
+
+
+def test_balance_endpoint(monkeypatch):
+    monkeypatch.setattr(wallet_module, "mcp_client", BalanceMCPClient(delay=0))
+    monkeypatch.setattr(wallet_routes, "wallet_service", WalletBalanceService(tokens=["shd"]))
+    monkeypatch.setattr(wallet_routes.settings, "ENABLE_SECRET_NETWORK", True)
+    monkeypatch.setattr(wallet_routes.secret_ai_service, "_tools", [{"name": wallet_routes.settings.SNIP20_BALANCE_TOOL}])
+    client = TestClient(app)
+
+    response = client.post(f"/api/wallet/balance/{ADDRESS}", json={"viewing_keys": {"shd": "api_key_one"}})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["success"] is True
+    assert data["balance"] == {"amount": "2500000", "denom": "uscrt"}
+    assert data["snip20"]["shd"]["success"] is True
+    assert data["snip20_supported"] is True
+
+    assert client.get("/api/wallet/balance/not-an-address").status_code == 400
+
+
+def test_balance_endpoint_skips_snip20_without_the_query_tool(monkeypatch):
+    fake = BalanceMCPClient(delay=0)
+    monkeypatch.setattr(wallet_module, "mcp_client", fake)
+    monkeypatch.setattr(wallet_routes, "wallet_service", WalletBalanceService(tokens=["shd"]))
+    monkeypatch.setattr(wallet_routes.settings, "ENABLE_SECRET_NETWORK", True)
+    monkeypatch.setattr(wallet_routes.secret_ai_service, "_tools", [{"name": "secret_query_balance"}])
+    client = TestClient(app)
+
+    response = client.post(
+        f"/api/wallet/balance/{ADDRESS}",
+        json={"tokens": ["shd"], "viewing_keys": {"shd": "api_key_one"}}
+    )
+    data = response.json()
+    assert data["snip20_supported"] is False
+    assert data["snip20"] == {}
+    assert [tool for tool, _ in fake.calls] == ["secret_query_balance"]
+
+
+def test_config_reports_snip20_support(monkeypatch):
+    monkeypatch.setattr(wallet_routes.settings, "ENABLE_SECRET_NETWORK", True)
+    monkeypatch.setattr(wallet_routes.secret_ai_service, "_tools", [{"name": "secret_query_balance"}])
+    client = TestClient(app)
+    assert client.get("/api/config").json()["snip20_supported"] is False
+
+    monkeypatch.setattr(wallet_routes.secret_ai_service, "_tools", [{"name": wallet_routes.settings.SNIP20_BALANCE_TOOL}])
+    assert client.get("/api/config").json()["snip20_supported"] is True
+
+
+def test_balance_endpoint_can_skip_scrt(monkeypatch):
+    fake = BalanceMCPClient(delay=0)
+    monkeypatch.setattr(wallet_module, "mcp_client", fake)
+    monkeypatch.setattr(wallet_routes, "wallet_service", WalletBalanceService(tokens=["shd"]))
+    monkeypatch.setattr(wallet_routes.settings, "ENABLE_SECRET_NETWORK", True)
+    monkeypatch.setattr(wallet_routes.secret_ai_service, "_tools", [{"name": wallet_routes.settings.SNIP20_BALANCE_TOOL}])
+    client = TestClient(app)
+
+    response = client.post(
+        f"/api/wallet/balance/{ADDRESS}",
+        json={"tokens": ["shd"], "viewing_keys": {"shd": "api_key_one"}, "scrt": False}
+    )
+    data = response.json()
+    assert data["success"] is True
+    assert data["scrt"] is None and data["balance"] is None
+    assert data["snip20"]["shd"]["success"] is True
+    assert [tool for tool, _ in fake.calls] == [wallet_routes.settings.SNIP20_BALANCE_TOOL]